@@ -24,6 +24,7 @@ from AI.tools.api import (
 from AI.utils.display import print_backtest_results, format_backtest_row
 from typing_extensions import Callable
 from AI.utils.ollama import ensure_ollama_and_model
+from utils.equity_curve import EQUITY_CURVE_POINTS, downsample_curve
 from utils.logger import logger
 
 init(autoreset=True)
@@ -41,6 +42,7 @@ class Backtester:
         model_provider: str = "OpenAI",
         selected_analysts: list[str] = [],
         initial_margin_requirement: float = 0.0,
+        equity_points: int = EQUITY_CURVE_POINTS,
     ):
         """
         :param agent: 交易代理 (Callable)
@@ -52,6 +54,7 @@ class Backtester:
         :param model_provider: LLM提供商 (OpenAI等)
         :param selected_analysts: 要纳入的分析师名称或ID列表
         :param initial_margin_requirement: 保证金比率 (例如 0.5 = 50%)
+        :param equity_points: 返回的资金曲线点数上限
         """
         self.agent = agent
         self.tickers = tickers
@@ -61,6 +64,7 @@ class Backtester:
         self.model_name = model_name
         self.model_provider = model_provider
         self.selected_analysts = selected_analysts
+        self.equity_points = equity_points
 
         # 初始化投资组合，支持做多/做空头寸
         self.portfolio_values = []
@@ -307,7 +311,12 @@ class Backtester:
             logger.error(f"解析操作出错: {agent_output}")
             return {"action": "hold", "quantity": 0}
 
-    def run_backtest(self):
+    def run_backtest(self, progress_callback=None):
+        """逐个交易日运行代理并撮合交易
+        Args:
+            progress_callback: 可选，每个交易日开始前调用 progress_callback(已完成天数, 总天数, 日期)，
+                回调中抛出异常可中止回测
+        """
         # 在开始时预取所有数据
         self.prefetch_data()
 
@@ -330,7 +339,9 @@ class Backtester:
         else:
             self.portfolio_values = []
 
-        for current_date in dates:
+        for i, current_date in enumerate(dates):
+            if progress_callback is not None:
+                progress_callback(i, len(dates), current_date.strftime("%Y-%m-%d"))
             lookback_start = (current_date - timedelta(days=30)).strftime("%Y-%m-%d")
             current_date_str = current_date.strftime("%Y-%m-%d")
             previous_date_str = (current_date - timedelta(days=1)).strftime("%Y-%m-%d")
@@ -502,6 +513,15 @@ class Backtester:
             if len(self.portfolio_values) > 3:
                 self._update_performance_metrics(performance_metrics)
 
+        # 逐日盯市的资金曲线，按点数上限保留极值降采样后返回
+        if self.portfolio_values:
+            values_df = pd.DataFrame(self.portfolio_values).drop_duplicates("Date", keep="last")
+            performance_metrics["equity_curve"] = downsample_curve(
+                values_df["Date"].values.astype("datetime64[ns]"),
+                values_df["Portfolio Value"].to_numpy(dtype=np.float64),
+                self.equity_points
+            )
+
         # 存储最终性能指标以供analyze_performance参考
         self.performance_metrics = performance_metrics
         return performance_metrics
@@ -0,0 +1,135 @@
+import os
+import threading
+from typing import Set
+
+from sqlalchemy import MetaData, create_engine, event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from config import settings
+from utils.logger import logger
+
+# 后端目录：SQLite 的相对路径按它解析，从 tools/ 等其他目录启动的脚本与服务访问同一个数据库
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _resolve_url(url: str) -> str:
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:') \
+            and not os.path.isabs(url.database):
+        url = url.set(database=os.path.normpath(os.path.join(BACKEND_DIR, url.database)))
+    return url.render_as_string(hide_password=False)
+
+DATABASE_URL = _resolve_url(settings.DATABASE_URL or "sqlite:///trading.db")
+# 连接池：常驻连接数和高峰时额外允许的连接数
+DB_POOL_SIZE = 10
+DB_MAX_OVERFLOW = 20
+# SQLite 写锁被占用时等待的毫秒数，超时才报 database is locked
+SQLITE_BUSY_TIMEOUT_MS = 30000
+# WAL 模式下 NORMAL 不会损坏数据库，掉电时最多丢失最后提交的事务，写入比 FULL 快得多
+SQLITE_SYNCHRONOUS = 'NORMAL'
+
+# 异步访问使用的驱动，接口中的查询通过它们访问数据库而不阻塞事件循环
+ASYNC_DRIVERS = {'sqlite': 'aiosqlite', 'postgresql': 'asyncpg', 'mysql': 'aiomysql'}
+
+def _install_sqlite_pragmas(engine, in_memory: bool) -> None:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL 模式下读不阻塞写，新闻入库、回测缓存等写入与信号写入只在提交时短暂互斥
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+def _create_engine():
+    url = make_url(DATABASE_URL)
+    if url.get_backend_name() != 'sqlite':
+        return create_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+
+    in_memory = url.database in (None, '', ':memory:')
+    engine = create_engine(
+        url,
+        # 连接在线程池的线程之间复用
+        connect_args={'check_same_thread': False, 'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000},
+        **({} if in_memory else {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW})
+    )
+    _install_sqlite_pragmas(engine, in_memory)
+    return engine
+
+def _create_async_engine():
+    """与同步引擎指向同一个数据库，驱动换成对应的异步驱动"""
+    url = make_url(DATABASE_URL)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"不支持异步访问的数据库: {backend}")
+    url = url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+    if backend != 'sqlite':
+        return create_async_engine(url, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
+
+    in_memory = url.database in (None, '', ':memory:')
+    engine = create_async_engine(
+        url,
+        connect_args={'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000},
+        **({} if in_memory else {'pool_size': DB_POOL_SIZE, 'max_overflow': DB_MAX_OVERFLOW})
+    )
+    _install_sqlite_pragmas(engine.sync_engine, in_memory)
+    return engine
+
+# 进程内共享的数据库引擎和会话工厂，所有服务通过它们访问数据库
+engine = _create_engine()
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# 异步会话：提交后对象不过期，返回给接口时不会再触发查询
+async_engine = _create_async_engine()
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+_created: Set[int] = set()
+_schema_lock = threading.Lock()
+
+def migrate_indexes(metadata: MetaData) -> int:
+    """为已存在的表补建模型中新增的索引（create_all 不会修改已有的表），返回新建的索引数"""
+    inspector = inspect(engine)
+    created = 0
+    for table in metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(engine, checkfirst=True)
+                logger.info(f"新建索引: {table.name}.{index.name}")
+                created += 1
+    return created
+
+def ensure_schema(metadata: MetaData) -> None:
+    """建表并补建索引，每个 metadata 在进程内只执行一次"""
+    if id(metadata) in _created:
+        return
+    with _schema_lock:
+        if id(metadata) not in _created:
+            metadata.create_all(engine)
+            migrate_indexes(metadata)
+            _created.add(id(metadata))
+
+async def dispose_engines() -> None:
+    """关闭时释放连接池"""
+    await async_engine.dispose()
+    engine.dispose()
+
+def init_db() -> None:
+    """启动时一次性创建全部数据表"""
+    from models.account import Base as AccountBase
+    from models.core_factor import Base as CoreFactorBase
+    from models.fundamental import Base as FundamentalBase
+    from models.position import Base as PositionBase
+    from models.signals import Base as SignalBase
+    from models.soybean import Base as SoybeanBase
+    from models.trading_strategy import Base as TradingStrategyBase
+    from services.backtest_cache import Base as BacktestCacheBase
+    from services.backtest_jobs import Base as BacktestJobBase
+    from services.news_service import Base as NewsBase
+    from services.trading import Base as TradingBase
+
+    for base in (AccountBase, CoreFactorBase, FundamentalBase, PositionBase, SignalBase, SoybeanBase,
+                 TradingStrategyBase, BacktestCacheBase, BacktestJobBase, NewsBase, TradingBase):
+        ensure_schema(base.metadata)
+    logger.info("数据库表初始化完成")
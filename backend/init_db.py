@@ -1,14 +1,5 @@
-from models.soybean import Base
-from models.trading_strategy import Base as TradingStrategyBase
-from config import settings
-from sqlalchemy import create_engine
-
-def init_db():
-    """初始化数据库表"""
-    engine = create_engine(settings.DATABASE_URL or "sqlite:///./trading.db")
-    Base.metadata.create_all(bind=engine)
-    TradingStrategyBase.metadata.create_all(bind=engine)
-    print("数据库表初始化完成")
+from database import init_db
 
 if __name__ == "__main__":
-    init_db() 
\ No newline at end of file
+    init_db()
+    print("数据库表初始化完成")
\ No newline at end of file
@@ -6,8 +6,13 @@ import os
 # 添加项目根目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from routers import market_data, trading, fundamental, core_factor, arbitrage, trend_follow, dual_ma, obv_adx_ema, news, ai, signals, account, grid, support_resistance, soybean, stockfutures, holding_analysis
+from routers import market_data, trading, fundamental, core_factor, arbitrage, trend_follow, dual_ma, obv_adx_ema, news, ai, signals, account, grid, support_resistance, soybean, stockfutures, holding_analysis, jobs, robustness, portfolio, simulator, continuous, batch
 from config import settings
+from database import dispose_engines, init_db
+from services.ledger import ledger
+from services.trade_processor import trade_processor
+from services.valuation import valuation_service
+from services.backtest_cache import backtest_cache
 from utils.logger import logger
 
 app = FastAPI(
@@ -145,11 +150,56 @@ app.include_router(
 )
 logger.info("持仓变化分析路由注册完成")
 
+app.include_router(
+    jobs.router,
+    prefix=f"{settings.API_V1_STR}/jobs",
+    tags=["jobs"]
+)
+logger.info("回测任务路由注册完成")
+
+app.include_router(
+    robustness.router,
+    prefix=f"{settings.API_V1_STR}/robustness",
+    tags=["robustness"]
+)
+logger.info("回测稳健性分析路由注册完成")
+
+app.include_router(
+    portfolio.router,
+    prefix=f"{settings.API_V1_STR}/portfolio",
+    tags=["portfolio"]
+)
+logger.info("组合回测路由注册完成")
+
+app.include_router(
+    simulator.router,
+    prefix=f"{settings.API_V1_STR}/simulator",
+    tags=["simulator"]
+)
+logger.info("分块回测路由注册完成")
+
+app.include_router(
+    continuous.router,
+    prefix=f"{settings.API_V1_STR}/continuous",
+    tags=["continuous"]
+)
+logger.info("连续合约路由注册完成")
+
+app.include_router(
+    batch.router,
+    prefix=f"{settings.API_V1_STR}/batch",
+    tags=["batch"]
+)
+logger.info("批量回测路由注册完成")
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("应用启动")
     logger.info(f"项目名称: {settings.PROJECT_NAME}")
     logger.info(f"API版本: {settings.API_V1_STR}")
+    init_db()
+    # 启动时即加载账本并取得账本目录锁，多进程部署时第二个进程在这里直接失败
+    ledger.get_account()
 
     # 检查 Tushare Token
     if not settings.TUSHARE_TOKEN:
@@ -158,6 +208,12 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    # 先处理完已排队的交易，再把账本中尚未写库的变更全部写入
+    await valuation_service.close()
+    trade_processor.close()
+    ledger.close()
+    backtest_cache.flush()
+    await dispose_engines()
     logger.info("应用关闭")
 
 @app.get("/")
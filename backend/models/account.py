@@ -2,7 +2,7 @@ from sqlalchemy import Column, Integer, String, DateTime, Float, func
 from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 Base = declarative_base()
 
@@ -38,4 +38,31 @@ class Account(AccountBase):
     updated_at: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class PositionValuation(BaseModel):
+    symbol: str
+    side: int  # 1 多头，-1 空头
+    quantity: int
+    cost_price: float
+    last_price: Optional[float] = None  # 未取到行情时为空
+    quote_time: Optional[datetime] = None
+    multiplier: float
+    market_value: Optional[float] = None  # 名义价值：最新价*数量*乘数
+    unrealized_pnl: Optional[float] = None
+    margin: Optional[float] = None  # 名义价值中期货按保证金比例、股票按全额占用
+
+class AccountValuation(BaseModel):
+    """按最新行情对持仓逐日盯市的估值"""
+    time: datetime
+    available_balance: float
+    current_balance: float
+    realized_profit: float
+    unrealized_pnl: float
+    equity: float  # 当前资产加浮动盈亏
+    margin_used: float
+    margin_ratio: Optional[float] = None  # 占用保证金 / 权益
+    gross_exposure: float
+    net_exposure: float
+    positions: List[PositionValuation]
+    missing_quotes: List[str] = []
@@ -0,0 +1,123 @@
+from pydantic import BaseModel, Field
+from typing import List, Dict, Optional, Union
+
+class ParamRange(BaseModel):
+    """参数取值范围，闭区间[start, stop]，或直接给出取值列表"""
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    step: float = 1
+    values: Optional[List[Union[bool, int, float]]] = None
+
+class HeatmapSpec(BaseModel):
+    """热力图的横纵轴参数"""
+    x: str
+    y: str
+
+class SweepRequest(BaseModel):
+    data_period: str = Field(default='daily', description="数据周期: daily/weekly/30min")
+    param_ranges: Dict[str, ParamRange] = Field(..., description="参数名 -> 取值范围")
+    rank_by: str = Field(default='sharpe_ratio', description="排序指标: sharpe_ratio/total_returns/annual_returns/win_rate/max_drawdown")
+    top_n: int = Field(default=50, ge=1, le=5000, description="返回排名前N的参数组合")
+    heatmap: Optional[HeatmapSpec] = None
+    max_workers: Optional[int] = Field(default=None, ge=1, le=64, description="进程数，默认使用CPU核数")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "data_period": "daily",
+                "param_ranges": {
+                    "fast_period": {"start": 4, "stop": 20, "step": 2},
+                    "slow_period": {"start": 20, "stop": 60, "step": 5}
+                },
+                "rank_by": "sharpe_ratio",
+                "top_n": 20,
+                "heatmap": {"x": "fast_period", "y": "slow_period"}
+            }
+        }
+
+class WalkForwardRequest(BaseModel):
+    data_period: str = Field(default='daily', description="数据周期: daily/weekly/30min")
+    param_ranges: Dict[str, ParamRange] = Field(..., description="参数名 -> 取值范围")
+    rank_by: str = Field(default='sharpe_ratio', description="样本内优化指标")
+    in_sample_bars: int = Field(default=500, ge=20, description="样本内窗口K线数")
+    out_of_sample_bars: int = Field(default=120, ge=5, description="样本外窗口K线数，同时为窗口滚动步长")
+    anchored: bool = Field(default=False, description="是否固定样本内起点（扩张窗口）")
+    max_workers: Optional[int] = Field(default=None, ge=1, le=64, description="进程数，默认使用CPU核数")
+
+class MonteCarloRequest(BaseModel):
+    returns: Optional[List[float]] = Field(default=None, description="逐笔或逐K线收益率，与 pnls 二选一")
+    pnls: Optional[List[float]] = Field(default=None, description="逐笔盈亏（元），按 initial_capital 复利换算为收益率")
+    initial_capital: float = Field(default=100000.0, gt=0, description="换算逐笔盈亏时使用的初始资金")
+    n_paths: int = Field(default=10000, ge=100, le=100000, description="重采样路径数")
+    method: str = Field(default='bootstrap', description="重采样方法: bootstrap/block")
+    block_size: int = Field(default=5, ge=2, le=250, description="块自助法的块长度")
+    percentiles: List[float] = Field(default=[5, 25, 50, 75, 95], description="返回的分位点")
+    periods_per_year: Optional[float] = Field(default=None, gt=0, description="每年的收益期数，用于年化夏普比率")
+    seed: Optional[int] = Field(default=None, description="随机种子")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "pnls": [1200.0, -800.0, 560.0, 2300.0, -1500.0],
+                "initial_capital": 100000.0,
+                "n_paths": 10000,
+                "method": "block",
+                "block_size": 3
+            }
+        }
+
+class PortfolioBacktestRequest(BaseModel):
+    strategy: str = Field(default='dual_ma', description="策略名称: dual_ma/grid")
+    contracts: List[str] = Field(..., min_items=1, description="合约代码列表")
+    data_period: str = Field(default='daily', description="数据周期")
+    params: Dict[str, Union[bool, int, float]] = Field(default={}, description="策略参数，所有合约共用")
+    weights: Optional[Dict[str, float]] = Field(default=None, description="合约 -> 资金权重，默认等权")
+    initial_capital: float = Field(default=1000000.0, gt=0, description="组合初始资金")
+    max_workers: Optional[int] = Field(default=None, ge=1, le=64, description="进程数，默认使用CPU核数")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "strategy": "dual_ma",
+                "contracts": ["M2401", "M2405", "M2409", "M2501"],
+                "data_period": "daily",
+                "params": {"fast_period": 8, "slow_period": 21}
+            }
+        }
+
+class SimulationRequest(BaseModel):
+    contract: str = Field(default='M2501', description="合约代码")
+    data_period: str = Field(default='5min', description="数据周期")
+    strategy: str = Field(default='dual_ma', description="流式策略名称: dual_ma")
+    params: Dict[str, Union[int, float]] = Field(default={}, description="策略参数")
+    initial_capital: float = Field(default=100000.0, gt=0, description="初始资金")
+    commission_rate: float = Field(default=0.0, ge=0, le=0.01, description="手续费率（按成交额）")
+    chunk_size: int = Field(default=50000, ge=1000, le=1000000, description="每次读取的K线数")
+    max_points: int = Field(default=2000, ge=10, le=20000, description="资金曲线最大点数")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "contract": "M2501",
+                "data_period": "5min",
+                "strategy": "dual_ma",
+                "params": {"fast_period": 8, "slow_period": 21, "stop_atr": 2.0, "take_profit_atr": 1.1}
+            }
+        }
+
+class BatchBacktestRequest(BaseModel):
+    contract: str = Field(default='M2501', description="合约代码，只给品种代码时使用日线连续合约")
+    data_period: str = Field(default='60min', description="主周期，所有策略共用同一份数据")
+    strategies: Optional[List[str]] = Field(default=None, min_items=1, description="参与评估的策略，默认全部注册策略")
+    params: Dict[str, Dict[str, Union[bool, int, float]]] = Field(default={}, description="策略名 -> 参数覆盖")
+    equity_points: int = Field(default=1000, ge=10, le=20000, description="资金曲线点数（保留极值的降采样）")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "contract": "M2501",
+                "data_period": "60min",
+                "strategies": ["dual_ma", "grid", "obv_adx_ema", "support_resistance", "trend_follow"],
+                "params": {"dual_ma": {"use_atr_tp": True}, "grid": {"grid_levels": 8}}
+            }
+        }
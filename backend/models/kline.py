@@ -20,4 +20,7 @@ class SignalRequest(BaseModel):
     type: Optional[str] = None
     page: int = 1
     page_size: int = 10
-    klines: List[KLineData] 
\ No newline at end of file
+    klines: List[KLineData]
+    # 增量模式：incremental=True 时返回游标；之后带上游标只需提交新增的K线（可重发最后几根未走完的K线）
+    incremental: bool = False
+    cursor: Optional[str] = None 
\ No newline at end of file
@@ -1,5 +1,7 @@
+from sqlalchemy import Column, String, DateTime, Float, Integer, Index, Enum as SQLEnum, func
+from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 import uuid
@@ -15,6 +17,34 @@ class SignalStatus(str, Enum):
     CLOSED = "closed"
     PARTIAL_CLOSED = "partial_closed"
 
+Base = declarative_base()
+
+class SignalDB(Base):
+    __tablename__ = "signals"
+
+    id = Column(String, primary_key=True)
+    date = Column(DateTime, nullable=False)
+    symbol = Column(String, nullable=False)
+    type = Column(SQLEnum(SignalType), nullable=False)
+    price = Column(Float, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    status = Column(SQLEnum(SignalStatus), nullable=False, default=SignalStatus.OPEN)
+    reason = Column(String, nullable=False)  # 开平仓原因
+    close_date = Column(DateTime, nullable=True)
+    close_price = Column(Float, nullable=True)
+    profit = Column(Float, nullable=False, default=0.0)
+    created_at = Column(DateTime, default=func.current_timestamp())
+    updated_at = Column(DateTime, default=func.current_timestamp(), onupdate=func.current_timestamp())
+
+    __table_args__ = (
+        # 信号列表按时间倒序分页，可按类型或状态筛选
+        Index('ix_signals_date_id', 'date', 'id'),
+        Index('ix_signals_type_date', 'type', 'date'),
+        Index('ix_signals_status_date', 'status', 'date'),
+        # 平仓时查找同品种未平的开仓信号
+        Index('ix_signals_symbol_type_status', 'symbol', 'type', 'status'),
+    )
+
 class SignalBase(BaseModel):
     date: datetime
     symbol: str
@@ -43,4 +73,19 @@ class Signal(SignalBase):
     updated_at: datetime
 
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True 
+
+class SignalBatchCreate(BaseModel):
+    signals: List[SignalCreate]  # 按信号时间顺序处理，与提交顺序无关
+
+class SignalOutcome(BaseModel):
+    index: int  # 信号在请求中的位置
+    signal: Signal
+    applied: bool  # 是否更新了持仓和账户
+    message: Optional[str] = None
+    position_quantity: int = 0  # 处理后该品种的持仓数量
+
+class SignalBatchResult(BaseModel):
+    outcomes: List[SignalOutcome]  # 按处理顺序排列
+    available_balance: float
+    total_commission: float
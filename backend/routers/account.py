@@ -1,11 +1,41 @@
-from fastapi import APIRouter, Depends
-from services.account import AccountService
-from models.account import Account
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+import json
+from services.ledger import ledger
+from services.valuation import valuation_service
+from models.account import Account, AccountValuation
+from utils.logger import logger
 
 router = APIRouter()
 
 @router.get("/account", response_model=Account)
 async def get_account():
-    """获取账户信息"""
-    account_service = AccountService()
-    return account_service.get_account() 
\ No newline at end of file
+    """获取账户信息（读取进程内账本，不访问数据库）"""
+    return ledger.get_account()
+
+@router.get("/valuation", response_model=AccountValuation)
+async def get_valuation():
+    """按最新行情估值持仓，刷新间隔内直接返回最近一次估值"""
+    try:
+        return await valuation_service.latest()
+    except Exception as e:
+        logger.error(f"持仓估值失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def stream_valuations(request: Request):
+    """每次行情刷新后推送一条估值，客户端断开后取消订阅"""
+    queue = valuation_service.subscribe()
+    try:
+        while True:
+            valuation = await queue.get()
+            if await request.is_disconnected():
+                logger.info("客户端断开持仓估值连接")
+                break
+            yield f"data: {json.dumps(valuation.dict(), default=str, ensure_ascii=False)}\n\n"
+    finally:
+        valuation_service.unsubscribe(queue)
+
+@router.get("/valuation/events")
+async def valuation_events(request: Request):
+    """以SSE方式推送持仓估值"""
+    return StreamingResponse(stream_valuations(request), media_type="text/event-stream")
@@ -11,6 +11,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from AI.AIService import run_hedge_fund
 from AI.backtester import Backtester
+from services.backtest_jobs import JobContext, backtest_jobs, report_progress
+from models.job import JobSubmitted
+import asyncio
 
 router = APIRouter()
 
@@ -24,6 +27,49 @@ class BacktestRequest(BaseModel):
     model_name: str = "bot-20250329163710-8zcqm"
     model_provider: str = "OpenAI"
 
+def execute_backtest(request: BacktestRequest, job: Optional[JobContext] = None):
+    """运行对冲基金分析和逐日回测，job 不为空时按交易日汇报进度"""
+    # 运行对冲基金分析
+    logger.info("开始运行对冲基金分析...")
+    report_progress(job, 0, "运行对冲基金分析")
+    result = run_hedge_fund(
+        tickers=request.tickers,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        portfolio=request.portfolio,
+        selected_analysts=request.selected_analysts,
+        model_name=request.model_name,
+        model_provider=request.model_provider
+    )
+    logger.info("对冲基金分析完成")
+    
+    # 初始化回测器
+    logger.info("初始化回测器...")
+    report_progress(job, 10, "初始化回测器")
+    backtester = Backtester(
+        agent=run_hedge_fund,
+        tickers=request.tickers,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        initial_capital=request.initial_capital,
+        model_name=request.model_name,
+        model_provider=request.model_provider,
+        selected_analysts=request.selected_analysts
+    )
+    
+    # 运行回测，分析之后的进度按交易日折算到10%-100%
+    logger.info("开始运行回测...")
+    progress_callback = None
+    if job is not None:
+        progress_callback = lambda done, total, day: job.report(10 + 90 * done / max(total, 1), f"回测 {day}")
+    backtest_results = backtester.run_backtest(progress_callback=progress_callback)
+    logger.info("回测完成")
+    
+    return {
+        "analysis": result,
+        "backtest": backtest_results
+    }
+
 @router.post("/backtest")
 async def run_backtest(request: BacktestRequest):
     """
@@ -39,46 +85,21 @@ async def run_backtest(request: BacktestRequest):
     logger.info(f"回测参数: 初始资金={request.initial_capital}, 模型={request.model_name}, 提供商={request.model_provider}")
     
     try:
-        # 运行对冲基金分析
-        logger.info("开始运行对冲基金分析...")
-        result = run_hedge_fund(
-            tickers=request.tickers,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            portfolio=request.portfolio,
-            selected_analysts=request.selected_analysts,
-            model_name=request.model_name,
-            model_provider=request.model_provider
-        )
-        logger.info("对冲基金分析完成")
-        
-        # 初始化回测器
-        logger.info("初始化回测器...")
-        backtester = Backtester(
-            agent=run_hedge_fund,
-            tickers=request.tickers,
-            start_date=request.start_date,
-            end_date=request.end_date,
-            initial_capital=request.initial_capital,
-            model_name=request.model_name,
-            model_provider=request.model_provider,
-            selected_analysts=request.selected_analysts
-        )
-        
-        # 运行回测
-        logger.info("开始运行回测...")
-        backtest_results = backtester.run_backtest()
-        logger.info("回测完成")
-        
-        logger.info(f"回测成功: 股票数量={len(request.tickers)}, 回测结果={backtest_results}")
-        
-        return {
-            "analysis": result,
-            "backtest": backtest_results
-        }
+        result = await asyncio.to_thread(execute_backtest, request)
+        logger.info(f"回测成功: 股票数量={len(request.tickers)}, 回测结果={result['backtest']}")
+        return result
         
     except Exception as e:
         logger.error(f"回测失败: {str(e)}")
         import traceback
         logger.error(f"异常堆栈: {traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/backtest/jobs", response_model=JobSubmitted)
+async def submit_backtest_job(request: BacktestRequest):
+    """提交异步回测任务，AI回测耗时较长，建议使用该接口并通过 /jobs/{job_id}/events 获取进度"""
+    try:
+        job = backtest_jobs.submit('ai_backtest', request.dict(), lambda ctx: execute_backtest(request, ctx))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitted(job_id=job.id, status=job.status)
@@ -3,6 +3,7 @@ from typing import List, Optional, Dict
 from datetime import datetime, timedelta
 from services.market_data import MarketDataService
 from models.market_data import FuturesData
+from services.dataset_registry import load_dataset
 import pandas as pd
 import numpy as np
 import os
@@ -145,11 +146,12 @@ def load_kline_data(symbol: str) -> pd.DataFrame:
             logger.error(f"数据文件不存在: {file_path}")
             raise HTTPException(status_code=500, detail=f"Data file not found: {file_path}")
             
-        df = pd.read_csv(file_path)
-        logger.info(f"成功读取CSV文件: {symbol}, 数据行数: {len(df)}")
+        df = load_dataset(file_path)
+        logger.info(f"成功读取数据集: {symbol}, 数据行数: {len(df)}")
         
-        df['datetime'] = pd.to_datetime(df['date'])
-        df.set_index('datetime', inplace=True)
+        df = df.set_index(pd.DatetimeIndex(df['date'], name='datetime'))
+        # 比价和压榨利润涉及小数系数，收盘价转为float64计算
+        df['close'] = df['close'].astype(np.float64)
         logger.info(f"数据处理完成: {symbol}, 时间范围: {df.index.min()} 到 {df.index.max()}")
         
         return df
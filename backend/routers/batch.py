@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+import asyncio
+from models.backtest import BatchBacktestRequest
+from models.job import JobSubmitted
+from services.backtest_jobs import JobContext, backtest_jobs
+from services.batch_backtest import batch_backtest
+from services.strategy_registry import STRATEGY_REGISTRY
+from utils.logger import logger
+
+router = APIRouter()
+
+def execute_batch(request: BatchBacktestRequest, job: Optional[JobContext] = None):
+    return batch_backtest.run(
+        contract=request.contract,
+        data_period=request.data_period,
+        strategies=request.strategies,
+        params=request.params,
+        equity_points=request.equity_points,
+        job=job
+    )
+
+@router.get("/strategies")
+async def list_strategies():
+    """列出可批量评估的策略及其默认参数"""
+    return [
+        {
+            'name': spec.name,
+            'title': spec.title,
+            'params': {**spec.signal_params, **spec.backtest_params},
+        }
+        for spec in STRATEGY_REGISTRY.values()
+    ]
+
+@router.post("/backtest")
+async def run_batch_backtest(request: BatchBacktestRequest):
+    """在同一份数据上一次评估多个策略，共享数据加载和指标计算"""
+    try:
+        logger.info(f"收到批量回测请求，contract={request.contract}, period={request.data_period}, strategies={request.strategies}")
+        return await asyncio.to_thread(execute_batch, request)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_msg = f"批量回测失败: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.post("/backtest/jobs", response_model=JobSubmitted)
+async def submit_batch_job(request: BatchBacktestRequest):
+    """提交异步批量回测任务，按已完成的策略数汇报进度"""
+    try:
+        job = backtest_jobs.submit('batch_backtest', request.dict(), lambda ctx: execute_batch(request, ctx))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitted(job_id=job.id, status=job.status)
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+import asyncio
+import numpy as np
+import pandas as pd
+from services.continuous_contract import continuous_contracts, roll_events
+from utils.logger import logger
+
+router = APIRouter()
+
+def load_continuous(symbol: str, roll: str, adjust: str, months_before: int) -> pd.DataFrame:
+    try:
+        return continuous_contracts.get(symbol, roll, adjust, months_before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/{symbol}")
+async def get_continuous_contract(
+    symbol: str,
+    roll: str = Query(default='oi', description="主力合约规则: oi/volume/calendar"),
+    adjust: str = Query(default='ratio', description="复权方式: none/difference/ratio"),
+    months_before: int = Query(default=1, ge=0, le=6, description="日历规则下交割月前几个月换月"),
+    start_date: Optional[str] = Query(default=None, description="开始日期 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(default=None, description="结束日期 YYYY-MM-DD")
+):
+    """获取复权连续合约日线及换月记录"""
+    logger.info(f"收到连续合约请求: symbol={symbol}, roll={roll}, adjust={adjust}")
+    df = await asyncio.to_thread(load_continuous, symbol, roll, adjust, months_before)
+    rolls = roll_events(df)
+
+    mask = np.ones(len(df), dtype=bool)
+    if start_date:
+        mask &= df['date'] >= pd.Timestamp(start_date)
+    if end_date:
+        mask &= df['date'] <= pd.Timestamp(end_date)
+    df = df[mask]
+
+    columns = [c for c in ('open', 'high', 'low', 'close', 'vol', 'oi', 'adjustment') if c in df.columns]
+    bars = [
+        {'date': d, 'contract': c, **{k: float(v) for k, v in zip(columns, values)}}
+        for d, c, values in zip(df['date'].dt.strftime('%Y-%m-%d'), df['contract'], df[columns].to_numpy(dtype=np.float64))
+    ]
+    return {
+        'symbol': symbol,
+        'roll': roll,
+        'adjust': adjust,
+        'bars': bars,
+        'rolls': [r for r in rolls if (not start_date or r['date'] >= start_date) and (not end_date or r['date'] <= end_date)],
+    }
+
+@router.get("/{symbol}/rolls")
+async def get_roll_events(
+    symbol: str,
+    roll: str = Query(default='oi', description="主力合约规则: oi/volume/calendar"),
+    adjust: str = Query(default='ratio', description="复权方式: none/difference/ratio"),
+    months_before: int = Query(default=1, ge=0, le=6, description="日历规则下交割月前几个月换月")
+):
+    """获取连续合约的换月记录"""
+    df = await asyncio.to_thread(load_continuous, symbol, roll, adjust, months_before)
+    return roll_events(df)
@@ -2,19 +2,41 @@ from fastapi import APIRouter, HTTPException
 from pathlib import Path
 import pandas as pd
 import numpy as np
-import talib
+from utils.indicator_cache import cached_indicator
 from utils.logger import logger
 from datetime import datetime
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Union
 from strategies.dual_ma_strategy import DualMAStrategy
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from utils.equity_curve import EQUITY_CURVE_MAX_POINTS, EQUITY_CURVE_MIN_POINTS, EQUITY_CURVE_POINTS
+from models.backtest import SweepRequest, WalkForwardRequest
+from services.param_sweep import ParamSweepService
+from services.walk_forward import WalkForwardService
+from services.dataset_registry import load_dataset
+from services.backtest_cache import backtest_cache
+from services.backtest_jobs import JobContext, backtest_jobs, report_progress
+from models.job import JobSubmitted
+import asyncio
 
 class BacktestRequest(BaseModel):
     use_atr_tp: bool = False
     data_period: str = 'weekly'  # 新增数据周期参数
+    equity_points: int = Field(default=EQUITY_CURVE_POINTS, ge=EQUITY_CURVE_MIN_POINTS, le=EQUITY_CURVE_MAX_POINTS,
+                               description="资金曲线点数（保留极值的降采样）")
 
 router = APIRouter()
 
+# 各数据周期对应的回测数据文件
+BACKTEST_DATA_FILES = {
+    'weekly': 'data/159985.SZ_fund_weekly_20190101_20251231.csv',
+    'daily': 'data/159985.SZ_fund_daily_20190101_20251231.csv',
+    '30min': 'data/159985.SZ_fund_30min_20190101_20251231.csv'
+}
+
+def backtest_data_file(data_period: str) -> str:
+    """数据周期对应的数据文件，未知周期使用30分钟数据"""
+    return BACKTEST_DATA_FILES.get(data_period, BACKTEST_DATA_FILES['30min'])
+
 def load_and_process_data(file_path):
     try:
         logger.info(f"开始加载数据文件: {file_path}")
@@ -24,29 +46,12 @@ def load_and_process_data(file_path):
             logger.error(error_msg)
             raise HTTPException(status_code=404, detail=error_msg)
             
-        df = pd.read_csv(file_path)
-        logger.info(f"成功读取CSV文件，总数据行数: {len(df)}")
-        
-        logger.debug("开始处理时间列")
-        # 根据文件名判断数据周期
-        if '30min' in str(file_path):
-            # 30分钟数据字段映射
-            df = df.rename(columns={
-                '时间': 'date',
-                '开盘': 'open',
-                '收盘': 'close',
-                '最高': 'high',
-                '最低': 'low',
-                '成交量': 'vol',
-                '成交额': 'amount'
-            })
-        else:
-            # 周线和日线数据保持原有字段名
-            df['date'] = pd.to_datetime(df['date'])
+        df = load_dataset(file_path)
+        logger.info(f"成功读取数据集，总数据行数: {len(df)}")
     
         logger.debug("开始计算EMA指标")
-        df['ema_short'] = talib.EMA(df['close'], timeperiod=8)
-        df['ema_long'] = talib.EMA(df['close'], timeperiod=21)
+        df['ema_short'] = cached_indicator(df, 'EMA', timeperiod=8)
+        df['ema_long'] = cached_indicator(df, 'EMA', timeperiod=21)
         # 处理NaN和Infinity值
         df = df.replace([np.inf, -np.inf], np.nan)
         df['ema_short'] = df['ema_short'].fillna(method='ffill').fillna(method='bfill')
@@ -87,44 +92,39 @@ async def get_weekly_data():
     logger.debug(f"周线数据文件路径: {data_path.absolute()}")
     return load_and_process_data(data_path)
 
+def load_backtest_data(data_period: str) -> pd.DataFrame:
+    """按数据周期加载回测用行情数据"""
+    # 从数据集注册表读取，字段名和日期格式已统一
+    df = load_dataset(backtest_data_file(data_period))
+    return df
+
+def execute_backtest(request: BacktestRequest, job: Optional[JobContext] = None):
+    """计算信号并回测，相同参数和数据版本的结果直接从缓存返回"""
+    def run():
+        report_progress(job, 10, "加载数据")
+        df = load_backtest_data(request.data_period)
+        # 使用策略类计算信号和执行回测
+        report_progress(job, 30, "计算交易信号")
+        strategy = DualMAStrategy()
+        df_with_signals = strategy.calculate_signals(df, use_atr_tp=request.use_atr_tp)
+        report_progress(job, 60, "执行回测")
+        return strategy.run_backtest(df_with_signals, use_atr_tp=request.use_atr_tp, equity_points=request.equity_points)
+
+    return backtest_cache.get_or_run(
+        'dual_ma',
+        {'use_atr_tp': request.use_atr_tp, 'data_period': request.data_period, 'equity_points': request.equity_points},
+        [backtest_data_file(request.data_period)],
+        DualMAStrategy,
+        run
+    )
+
 @router.post("/backtest")
 async def backtest_strategy(request: BacktestRequest):
     """执行策略回测"""
     try:
         logger.info(f"收到回测请求，use_atr_tp={request.use_atr_tp}, data_period={request.data_period}")
         
-        # 根据选择的周期加载对应的数据文件
-        if request.data_period == 'weekly':
-            data_path = Path("data/159985.SZ_fund_weekly_20190101_20251231.csv")
-        elif request.data_period == 'daily':
-            data_path = Path("data/159985.SZ_fund_daily_20190101_20251231.csv")
-        else:  # 30min
-            data_path = Path("data/159985.SZ_fund_30min_20190101_20251231.csv")
-            
-        # 读取并处理数据
-        df = pd.read_csv(data_path)
-        
-        # 根据文件名判断数据周期并处理字段名
-        if '30min' in str(data_path):
-            # 30分钟数据字段映射
-            df = df.rename(columns={
-                '时间': 'date',
-                '开盘': 'open',
-                '收盘': 'close',
-                '最高': 'high',
-                '最低': 'low',
-                '成交量': 'vol',
-                '成交额': 'amount'
-            })
-            df['date'] = pd.to_datetime(df['date'])
-        else:
-            # 转换日期格式
-            df['date'] = pd.to_datetime(df['date'], format='%Y%m%d')
-        
-        # 使用策略类计算信号和执行回测
-        strategy = DualMAStrategy()
-        df_with_signals = strategy.calculate_signals(df, use_atr_tp=request.use_atr_tp)
-        result = strategy.run_backtest(df_with_signals, use_atr_tp=request.use_atr_tp)
+        result = await asyncio.to_thread(execute_backtest, request)
         
         logger.info("回测完成")
         return result
@@ -132,4 +132,64 @@ async def backtest_strategy(request: BacktestRequest):
     except Exception as e:
         error_msg = f"回测过程中发生错误: {str(e)}"
         logger.error(error_msg, exc_info=True)
-        raise HTTPException(status_code=500, detail=error_msg) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.post("/backtest/jobs", response_model=JobSubmitted)
+async def submit_backtest_job(request: BacktestRequest):
+    """提交异步回测任务，通过 /jobs/{job_id}/events 获取进度"""
+    try:
+        job = backtest_jobs.submit('dual_ma_backtest', request.dict(), lambda ctx: execute_backtest(request, ctx))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitted(job_id=job.id, status=job.status)
+
+@router.post("/sweep")
+async def sweep_strategy(request: SweepRequest):
+    """参数扫描：多进程并行回测所有参数组合，返回排名结果"""
+    try:
+        logger.info(f"收到参数扫描请求，data_period={request.data_period}, params={list(request.param_ranges)}")
+        df = load_backtest_data(request.data_period)
+        service = ParamSweepService(max_workers=request.max_workers)
+        return await asyncio.to_thread(
+            service.run_sweep,
+            'dual_ma',
+            {'bars': df},
+            request.param_ranges,
+            request.rank_by,
+            request.top_n,
+            request.heatmap.dict() if request.heatmap else None
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_msg = f"参数扫描过程中发生错误: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.post("/walk_forward")
+async def walk_forward_strategy(request: WalkForwardRequest):
+    """前向分析：滚动窗口样本内并行寻优，样本外检验并拼接资金曲线"""
+    try:
+        logger.info(f"收到前向分析请求，data_period={request.data_period}, params={list(request.param_ranges)}")
+        df = load_backtest_data(request.data_period)
+        service = WalkForwardService(max_workers=request.max_workers)
+        return await asyncio.to_thread(
+            service.run,
+            'dual_ma',
+            {'bars': df},
+            request.param_ranges,
+            request.in_sample_bars,
+            request.out_of_sample_bars,
+            request.rank_by,
+            request.anchored
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_msg = f"前向分析过程中发生错误: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_msg)
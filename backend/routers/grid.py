@@ -4,14 +4,25 @@ import pandas as pd
 import numpy as np
 from utils.logger import logger
 from datetime import datetime
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Union
 from strategies.grid_strategy import GridStrategy
 from pydantic import BaseModel, Field
+from utils.equity_curve import EQUITY_CURVE_MAX_POINTS, EQUITY_CURVE_MIN_POINTS, EQUITY_CURVE_POINTS
+from models.backtest import SweepRequest, WalkForwardRequest
+from services.param_sweep import ParamSweepService
+from services.walk_forward import WalkForwardService
+from services.dataset_registry import load_dataset
+from services.backtest_cache import backtest_cache
+from services.backtest_jobs import JobContext, backtest_jobs, report_progress
+from models.job import JobSubmitted
+import asyncio
 
 class BacktestRequest(BaseModel):
     grid_levels: int = Field(default=10, ge=2, le=50, description="网格数量，范围2-50")
     atr_period: int = Field(default=14, ge=5, le=30, description="ATR周期，范围5-30")
     data_period: str = Field(default='daily', description="数据周期: daily/weekly/30min")
+    equity_points: int = Field(default=EQUITY_CURVE_POINTS, ge=EQUITY_CURVE_MIN_POINTS, le=EQUITY_CURVE_MAX_POINTS,
+                               description="资金曲线点数（保留极值的降采样）")
 
     class Config:
         schema_extra = {
@@ -24,33 +35,29 @@ class BacktestRequest(BaseModel):
 
 router = APIRouter()
 
+# 各数据周期对应的数据文件
+BACKTEST_DATA_FILES = {
+    'weekly': 'data/M2501.DCE_future_daily_20240101_20251231.csv',
+    'daily': 'data/M2501.DCE_future_daily_20240101_20251231.csv',
+    '30min': 'data/M2501.DCE_future_daily_20240101_20251231.csv'
+}
+
 def load_and_process_data(file_path: Path) -> pd.DataFrame:
     """加载并处理数据"""
     try:
-        # 读取CSV文件
-        df = pd.read_csv(file_path)
-        logger.info(f"成功读取CSV文件，总数据行数: {len(df)}")
+        # 从数据集注册表读取，日期已解析为datetime
+        df = load_dataset(file_path)
+        logger.info(f"成功读取数据集，总数据行数: {len(df)}")
         
         # 确保必要的列存在
         required_columns = ['date', 'open', 'high', 'low', 'close']
         if not all(col in df.columns for col in required_columns):
             raise ValueError(f"CSV文件缺少必要的列: {required_columns}")
         
-        # 转换日期格式
-        df['date'] = pd.to_datetime(df['date'], format='%Y%m%d')
-        
         # 处理NaN和Infinity值
         df = df.replace([np.inf, -np.inf], np.nan)
         df = df.fillna(method='ffill').fillna(method='bfill')
         
-        # 按日期排序
-        df = df.sort_values('date')
-        
-        # 确保数值列是浮点数类型
-        numeric_columns = ['open', 'high', 'low', 'close']
-        for col in numeric_columns:
-            df[col] = df[col].astype(float)
-        
         logger.info(f"数据处理完成，时间范围: {df['date'].min()} 至 {df['date'].max()}")
         return df
         
@@ -59,26 +66,26 @@ def load_and_process_data(file_path: Path) -> pd.DataFrame:
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
-@router.post("/backtest")
-async def run_backtest(request: BacktestRequest):
-    try:
-        logger.info("开始网格策略回测")
-        logger.info(f"参数: grid_levels={request.grid_levels}, atr_period={request.atr_period}, data_period={request.data_period}")
-        
-        # 根据数据周期选择数据文件
-        data_file = {
-            'weekly': 'data/M2501.DCE_future_daily_20240101_20251231.csv',
-            'daily': 'data/M2501.DCE_future_daily_20240101_20251231.csv',
-            '30min': 'data/M2501.DCE_future_daily_20240101_20251231.csv'
-        }.get(request.data_period)
-        
-        if not data_file:
-            raise HTTPException(status_code=400, detail=f"不支持的数据周期: {request.data_period}")
-        
+def load_backtest_data(data_period: str) -> pd.DataFrame:
+    """根据数据周期选择数据文件并加载"""
+    data_file = BACKTEST_DATA_FILES.get(data_period)
+    if not data_file:
+        raise HTTPException(status_code=400, detail=f"不支持的数据周期: {data_period}")
+    return load_and_process_data(Path(data_file))
+
+def execute_backtest(request: BacktestRequest, job: Optional[JobContext] = None):
+    """计算网格信号并回测，相同参数和数据版本的结果直接从缓存返回"""
+    data_file = BACKTEST_DATA_FILES.get(request.data_period)
+    if not data_file:
+        raise HTTPException(status_code=400, detail=f"不支持的数据周期: {request.data_period}")
+
+    def run():
         # 加载数据
-        df = load_and_process_data(Path(data_file))
+        report_progress(job, 10, "加载数据")
+        df = load_backtest_data(request.data_period)
         
         # 计算交易信号
+        report_progress(job, 30, "计算交易信号")
         df_with_signals = GridStrategy.calculate_signals(
             df=df,
             grid_levels=request.grid_levels,
@@ -86,10 +93,29 @@ async def run_backtest(request: BacktestRequest):
         )
         
         # 执行回测
-        backtest_results = GridStrategy.run_backtest(
+        report_progress(job, 60, "执行回测")
+        return GridStrategy.run_backtest(
             df=df_with_signals,
-            grid_levels=request.grid_levels
+            grid_levels=request.grid_levels,
+            equity_points=request.equity_points
         )
+
+    return backtest_cache.get_or_run(
+        'grid',
+        {'grid_levels': request.grid_levels, 'atr_period': request.atr_period, 'data_period': request.data_period,
+         'equity_points': request.equity_points},
+        [data_file],
+        GridStrategy,
+        run
+    )
+
+@router.post("/backtest")
+async def run_backtest(request: BacktestRequest):
+    try:
+        logger.info("开始网格策略回测")
+        logger.info(f"参数: grid_levels={request.grid_levels}, atr_period={request.atr_period}, data_period={request.data_period}")
+        
+        backtest_results = await asyncio.to_thread(execute_backtest, request)
         
         logger.info("网格策略回测完成")
         return {
@@ -112,6 +138,68 @@ async def run_backtest(request: BacktestRequest):
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
 
+@router.post("/backtest/jobs", response_model=JobSubmitted)
+async def submit_backtest_job(request: BacktestRequest):
+    """提交异步回测任务，通过 /jobs/{job_id}/events 获取进度"""
+    if request.data_period not in BACKTEST_DATA_FILES:
+        raise HTTPException(status_code=400, detail=f"不支持的数据周期: {request.data_period}")
+    try:
+        job = backtest_jobs.submit('grid_backtest', request.dict(), lambda ctx: execute_backtest(request, ctx))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitted(job_id=job.id, status=job.status)
+
+@router.post("/sweep")
+async def sweep_strategy(request: SweepRequest):
+    """参数扫描：多进程并行回测所有网格参数组合，返回排名结果"""
+    try:
+        logger.info(f"收到网格策略参数扫描请求，data_period={request.data_period}, params={list(request.param_ranges)}")
+        df = load_backtest_data(request.data_period)
+        service = ParamSweepService(max_workers=request.max_workers)
+        return await asyncio.to_thread(
+            service.run_sweep,
+            'grid',
+            {'bars': df},
+            request.param_ranges,
+            request.rank_by,
+            request.top_n,
+            request.heatmap.dict() if request.heatmap else None
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_msg = f"参数扫描失败: {str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.post("/walk_forward")
+async def walk_forward_strategy(request: WalkForwardRequest):
+    """前向分析：滚动窗口样本内并行寻优，样本外检验并拼接资金曲线"""
+    try:
+        logger.info(f"收到前向分析请求，data_period={request.data_period}, params={list(request.param_ranges)}")
+        df = load_backtest_data(request.data_period)
+        service = WalkForwardService(max_workers=request.max_workers)
+        return await asyncio.to_thread(
+            service.run,
+            'grid',
+            {'bars': df},
+            request.param_ranges,
+            request.in_sample_bars,
+            request.out_of_sample_bars,
+            request.rank_by,
+            request.anchored
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_msg = f"前向分析过程中发生错误: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_msg)
+
 @router.get("/data")
 async def get_grid_data():
     """获取网格策略的最新数据"""
@@ -129,7 +217,7 @@ async def get_grid_data():
         result = []
         for _, row in df_with_signals.iterrows():
             # 获取当前网格的价格
-            grid_price = row['grids'][row['current_grid']] if not pd.isna(row['current_grid']) else None
+            grid_price = row['grid_price'] if not pd.isna(row['current_grid']) else None
             
             # 检查并处理无效的浮点数值
             def safe_float(value):
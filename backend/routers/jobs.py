@@ -0,0 +1,71 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import asyncio
+import json
+from models.job import FINISHED_STATUSES, Job
+from services.backtest_jobs import backtest_jobs
+from utils.logger import logger
+
+router = APIRouter()
+
+# SSE轮询任务状态的间隔（秒）
+EVENT_POLL_INTERVAL = 0.5
+
+@router.get("", response_model=List[Job])
+async def list_jobs(kind: Optional[str] = None, limit: int = 50):
+    """查询最近提交的回测任务"""
+    return backtest_jobs.list_jobs(kind=kind, limit=limit)
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    job = backtest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    """获取已完成任务的回测结果"""
+    job = backtest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if job.status not in FINISHED_STATUSES:
+        raise HTTPException(status_code=409, detail=f"任务尚未完成，当前状态: {job.status.value}")
+    return {"job": job, "result": backtest_jobs.get_result(job_id)}
+
+async def stream_job_events(job_id: str, request: Request):
+    """任务状态变化时推送一条事件，任务结束后关闭连接"""
+    last_version = None
+    while True:
+        if await request.is_disconnected():
+            logger.info(f"客户端断开任务进度连接: {job_id}")
+            break
+        version, job = backtest_jobs.snapshot(job_id)
+        if job is None:
+            break
+        if version != last_version:
+            last_version = version
+            yield f"data: {json.dumps({'type': 'progress', 'job': job.dict()}, default=str, ensure_ascii=False)}\n\n"
+        if job.status in FINISHED_STATUSES:
+            yield f"data: {json.dumps({'type': 'done', 'status': job.status.value})}\n\n"
+            break
+        await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """以SSE方式推送任务进度"""
+    if backtest_jobs.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return StreamingResponse(stream_job_events(job_id, request), media_type="text/event-stream")
+
+@router.post("/{job_id}/cancel", response_model=Job)
+async def cancel_job(job_id: str):
+    """取消任务：排队中的任务立即取消，运行中的任务在下一个进度检查点停止"""
+    job = backtest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if job.status in FINISHED_STATUSES:
+        raise HTTPException(status_code=409, detail=f"任务已结束，当前状态: {job.status.value}")
+    backtest_jobs.cancel(job_id)
+    return backtest_jobs.get(job_id)
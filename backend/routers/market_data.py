@@ -18,8 +18,10 @@ from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from models.trading_strategy import TradingStrategy
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
-import talib
+from database import engine
+from utils.indicator_cache import cached_indicator
+from services.dataset_registry import load_dataset
+from utils.streaming_indicators import IndicatorStream
 
 router = APIRouter()
 
@@ -29,9 +31,6 @@ client = OpenAI(
     base_url="https://ark.cn-beijing.volces.com/api/v3/bots"
 )
 
-# 创建数据库引擎
-engine = create_engine(settings.DATABASE_URL or "sqlite:///./trading.db")
-
 def get_market_data_service() -> MarketDataService:
     logger.debug("创建市场数据服务实例")
     service = MarketDataService()
@@ -463,63 +462,20 @@ async def get_support_resistance_data(period: str = "daily"):
         if not data_path.exists():
             raise HTTPException(status_code=404, detail=f"数据文件不存在: {data_path}")
             
-        # 读取数据
-        df = pd.read_csv(data_path)
+        # 从数据集注册表读取，字段名、日期格式和排序已统一
+        df = load_dataset(data_path)
         
-        # 处理字段映射
-        if "30min" in str(data_path):
-            df = df.rename(columns={
-                "时间": "date",
-                "开盘": "open",
-                "收盘": "close",
-                "最高": "high",
-                "最低": "low",
-                "成交量": "vol",
-                "成交额": "amount"
-            })
-        else:
-            df = df.rename(columns={
-                "datetime": "date",
-                "open": "open",
-                "close": "close",
-                "high": "high",
-                "low": "low",
-                "volume": "vol",
-                "amount": "amount"
-            })
-            
         # 确保数值列的类型正确
         numeric_columns = ['open', 'high', 'low', 'close', 'vol']
         for col in numeric_columns:
             df[col] = pd.to_numeric(df[col], errors='coerce')
         
-        # 处理日期列
-        if "30min" in str(data_path):
-            # 对于30分钟数据，日期格式可能不同，需要特殊处理
-            df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d %H:%M:%S')
-        else:
-            # 对于日线和周线数据，尝试不同的日期格式
-            try:
-                # 先尝试 YYYYMMDD 格式
-                df['date'] = pd.to_datetime(df['date'], format='%Y%m%d')
-            except ValueError:
-                try:
-                    # 再尝试 YYYY-MM-DD 格式
-                    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
-                except ValueError:
-                    # 如果都失败，使用混合格式解析
-                    df['date'] = pd.to_datetime(df['date'])
-            
-        # 确保数据按时间排序
-        df = df.sort_values('date')
-        df = df.reset_index(drop=True)
-        
         # 打印一些调试信息
         logger.debug(f"数据日期范围: {df['date'].min()} to {df['date'].max()}")
         
         # 计算EMA指标
-        df['ema5'] = talib.EMA(df['close'].values, timeperiod=5)
-        df['ema20'] = talib.EMA(df['close'].values, timeperiod=20)
+        df['ema5'] = cached_indicator(df, 'EMA', timeperiod=5)
+        df['ema20'] = cached_indicator(df, 'EMA', timeperiod=20)
 
         # 处理NaN值
         df['ema5'] = df['ema5'].fillna(method='ffill').fillna(method='bfill')
@@ -578,6 +534,13 @@ async def get_support_resistance_data(period: str = "daily"):
         logger.error(f"获取支撑阻力数据失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# K线接口的增量指标状态，按(合约, 周期)维护
+KLINE_INDICATORS = {
+    'ema5': ('EMA', {'timeperiod': 5}),
+    'ema20': ('EMA', {'timeperiod': 20}),
+}
+_kline_streams: Dict[tuple, IndicatorStream] = {}
+
 @router.get("/kline/{period}")
 async def get_kline_data(period: str, contract: str = "M2509"):
     """获取K线数据"""
@@ -610,9 +573,10 @@ async def get_kline_data(period: str, contract: str = "M2509"):
         df = df.sort_values('date')
         df = df.reset_index(drop=True)
 
-        # 计算EMA指标
-        df['ema5'] = talib.EMA(df['close'].values, timeperiod=5)
-        df['ema20'] = talib.EMA(df['close'].values, timeperiod=20)
+        # 增量计算EMA指标：轮询时只更新新增K线和未收盘的最后一根
+        stream = _kline_streams.setdefault((contract, period), IndicatorStream(KLINE_INDICATORS))
+        for column, values in stream.sync(df).items():
+            df[column] = values
 
         # 处理NaN值
         df['ema5'] = df['ema5'].fillna(method='ffill').fillna(method='bfill')
@@ -18,7 +18,7 @@ async def get_daily_news(
 ):
     """获取每日新闻"""
     try:
-        news = service.get_news(start_date, end_date)
+        news = await service.get_news_async(start_date, end_date)
         return news
     except Exception as e:
         logger.error(f"获取每日新闻失败: {e}")
@@ -26,24 +26,36 @@ async def get_daily_news(
 
 @router.get("/flash")
 async def get_flash_news(
+    limit: Optional[int] = Query(None, ge=1, le=500, description="每页条数，不传则返回全部快讯"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
     service: NewsService = Depends(get_news_service)
 ):
-    """获取快讯"""
+    """获取快讯，传入 limit 时按页返回 {items, next_cursor}"""
     try:
-        flash_news = service.get_flash_news()
+        if limit is not None:
+            return await service.get_flash_news_page_async(limit, cursor)
+        flash_news = await service.get_flash_news_async()
         return flash_news
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取快讯失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/articles")
 async def get_news_articles(
+    limit: Optional[int] = Query(None, ge=1, le=500, description="每页条数，不传则返回全部文章"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
     service: NewsService = Depends(get_news_service)
 ):
-    """获取资讯文章"""
+    """获取资讯文章，传入 limit 时按页返回 {items, next_cursor}"""
     try:
-        articles = service.get_news_articles()
+        if limit is not None:
+            return await service.get_news_articles_page_async(limit, cursor)
+        articles = await service.get_news_articles_async()
         return articles
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取资讯文章失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -55,7 +67,7 @@ async def get_news_analysis(
 ):
     """获取新闻分析"""
     try:
-        analysis = service.analyze_news_impact(news_date)
+        analysis = await service.analyze_news_impact_async(news_date)
         if not analysis:
             return {
                 "date": news_date,
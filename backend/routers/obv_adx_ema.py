@@ -1,12 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pathlib import Path
 import pandas as pd
 import numpy as np
-import talib
+from utils.indicator_cache import cached_indicator
+from utils.equity_curve import EQUITY_CURVE_MAX_POINTS, EQUITY_CURVE_MIN_POINTS, EQUITY_CURVE_POINTS
 from utils.logger import logger
 from datetime import datetime
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Union
 from strategies.obv_adx_ema_strategy import OBVADXEMAStrategy
+from services.dataset_registry import load_dataset
+from services.backtest_jobs import JobContext, backtest_jobs, report_progress
+from models.job import JobSubmitted
+import asyncio
 
 router = APIRouter()
 
@@ -19,19 +24,16 @@ def load_and_process_data(file_path):
             logger.error(error_msg)
             raise HTTPException(status_code=404, detail=error_msg)
             
-        df = pd.read_csv(file_path)
-        logger.info(f"成功读取CSV文件，总数据行数: {len(df)}")
-        
-        logger.debug("开始处理时间列")
-        df['date'] = pd.to_datetime(df['date'])
+        df = load_dataset(file_path)
+        logger.info(f"成功读取数据集，总数据行数: {len(df)}")
         
         # 计算技术指标
-        df['ema20'] = talib.EMA(df['close'], timeperiod=20)
-        df['ema60'] = talib.EMA(df['close'], timeperiod=60)
-        df['ema5'] = talib.EMA(df['close'], timeperiod=5)
-        df['adx'] = talib.ADX(df['high'], df['low'], df['close'], timeperiod=14)
-        df['obv'] = talib.OBV(df['close'], df['volume'])
-        df['obv_ma30'] = talib.SMA(df['obv'], timeperiod=30)
+        df['ema20'] = cached_indicator(df, 'EMA', timeperiod=20)
+        df['ema60'] = cached_indicator(df, 'EMA', timeperiod=60)
+        df['ema5'] = cached_indicator(df, 'EMA', timeperiod=5)
+        df['adx'] = cached_indicator(df, 'ADX', timeperiod=14)
+        df['obv'] = cached_indicator(df, 'OBV')
+        df['obv_ma30'] = cached_indicator(df, 'SMA', columns=('obv',), timeperiod=30)
         
         # 处理NaN和Infinity值
         df = df.replace([np.inf, -np.inf], np.nan)
@@ -48,7 +50,8 @@ def load_and_process_data(file_path):
         df = df.sort_values('date')
         logger.info(f"数据时间范围: {df['date'].min()} 至 {df['date'].max()}")
         
-        # 转换为前端需要的格式
+        # 转换为前端需要的格式，成交量字段沿用volume
+        df = df.rename(columns={'vol': 'volume'})
         columns = ['date', 'open', 'close', 'high', 'low', 'volume', 'ema20', 'ema60', 'ema5', 'adx', 'obv', 'obv_ma30']
         result = df[columns].to_dict('records')
         for item in result:
@@ -73,23 +76,30 @@ async def get_data():
     logger.debug(f"60分钟数据文件路径: {data_path.absolute()}")
     return load_and_process_data(data_path)
 
+def execute_backtest(equity_points: int = EQUITY_CURVE_POINTS, job: Optional[JobContext] = None):
+    """加载60分钟数据，计算信号并回测"""
+    # 加载数据
+    report_progress(job, 10, "加载数据")
+    data_path = Path("data/M2501.DCE_future_60min_20240101_20251231.csv")
+    
+    # 从数据集注册表读取
+    df_60min = load_dataset(data_path)
+    
+    # 使用策略类计算信号和执行回测
+    report_progress(job, 30, "计算交易信号")
+    strategy = OBVADXEMAStrategy()
+    df_with_signals = strategy.calculate_signals(df_60min)
+    report_progress(job, 60, "执行回测")
+    return strategy.run_backtest(df_with_signals, equity_points=equity_points)
+
 @router.post("/backtest")
-async def backtest_strategy():
+async def backtest_strategy(equity_points: int = Query(default=EQUITY_CURVE_POINTS, ge=EQUITY_CURVE_MIN_POINTS, le=EQUITY_CURVE_MAX_POINTS,
+                            description="资金曲线点数（保留极值的降采样）")):
     """执行策略回测"""
     try:
         logger.info("收到OBV、ADX与EMA组合策略回测请求")
         
-        # 加载数据
-        data_path = Path("data/M2501.DCE_future_60min_20240101_20251231.csv")
-        
-        # 读取并处理数据
-        df_60min = pd.read_csv(data_path)
-        df_60min['date'] = pd.to_datetime(df_60min['date'])
-        
-        # 使用策略类计算信号和执行回测
-        strategy = OBVADXEMAStrategy()
-        df_with_signals = strategy.calculate_signals(df_60min)
-        result = strategy.run_backtest(df_with_signals)
+        result = await asyncio.to_thread(execute_backtest, equity_points)
         
         logger.info("OBV、ADX与EMA组合策略回测完成")
         return result
@@ -97,4 +107,15 @@ async def backtest_strategy():
     except Exception as e:
         error_msg = f"回测过程中发生错误: {str(e)}"
         logger.error(error_msg, exc_info=True)
-        raise HTTPException(status_code=500, detail=error_msg) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.post("/backtest/jobs", response_model=JobSubmitted)
+async def submit_backtest_job(equity_points: int = Query(default=EQUITY_CURVE_POINTS, ge=EQUITY_CURVE_MIN_POINTS, le=EQUITY_CURVE_MAX_POINTS,
+                              description="资金曲线点数（保留极值的降采样）")):
+    """提交异步回测任务，通过 /jobs/{job_id}/events 获取进度"""
+    try:
+        job = backtest_jobs.submit('obv_adx_ema_backtest', {'equity_points': equity_points},
+                                   lambda ctx: execute_backtest(equity_points, ctx))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitted(job_id=job.id, status=job.status)
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+import asyncio
+from models.backtest import PortfolioBacktestRequest
+from models.job import JobSubmitted
+from services.backtest_jobs import JobContext, backtest_jobs
+from services.portfolio_backtest import PortfolioBacktestService
+from utils.logger import logger
+
+router = APIRouter()
+
+def execute_backtest(request: PortfolioBacktestRequest, job: Optional[JobContext] = None):
+    service = PortfolioBacktestService(max_workers=request.max_workers)
+    return service.run(
+        request.strategy,
+        request.contracts,
+        request.data_period,
+        request.params,
+        request.weights,
+        request.initial_capital,
+        job
+    )
+
+@router.post("/backtest")
+async def backtest_portfolio(request: PortfolioBacktestRequest):
+    """多合约组合回测：各合约并行计算信号和回测，按公共日历合成组合资金曲线"""
+    try:
+        logger.info(f"收到组合回测请求，strategy={request.strategy}, contracts={request.contracts}")
+        return await asyncio.to_thread(execute_backtest, request)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_msg = f"组合回测失败: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.post("/backtest/jobs", response_model=JobSubmitted)
+async def submit_backtest_job(request: PortfolioBacktestRequest):
+    """提交异步组合回测任务，通过 /jobs/{job_id}/events 获取进度"""
+    try:
+        job = backtest_jobs.submit('portfolio_backtest', request.dict(), lambda ctx: execute_backtest(request, ctx))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitted(job_id=job.id, status=job.status)
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException
+import asyncio
+from models.backtest import MonteCarloRequest
+from services.monte_carlo import MonteCarloService, trade_returns_from_pnl
+from utils.logger import logger
+
+router = APIRouter()
+
+@router.post("/monte-carlo")
+async def monte_carlo(request: MonteCarloRequest):
+    """回测稳健性分析：对回测的逐笔或逐K线收益率做自助法重采样，返回期末收益、最大回撤、夏普比率的分布"""
+    try:
+        if request.returns is not None:
+            returns = request.returns
+        elif request.pnls is not None:
+            returns = trade_returns_from_pnl(request.pnls, request.initial_capital)
+        else:
+            raise ValueError("returns 和 pnls 必须提供其中之一")
+
+        logger.info(f"收到蒙特卡洛分析请求，method={request.method}, n_paths={request.n_paths}, 样本数={len(returns)}")
+        return await asyncio.to_thread(
+            MonteCarloService().run,
+            returns,
+            request.n_paths,
+            request.method,
+            request.block_size,
+            request.percentiles,
+            request.periods_per_year,
+            request.seed
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_msg = f"蒙特卡洛分析失败: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_msg)
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List, Optional
 from datetime import datetime, date
-from models.signals import Signal, SignalCreate, SignalUpdate
+from models.signals import Signal, SignalCreate, SignalUpdate, SignalBatchCreate, SignalBatchResult
 from services.signals import SignalService
 from utils.logger import logger
 from models.kline import KLineData, SignalRequest
@@ -23,13 +23,15 @@ async def get_signals(
         end = datetime.strptime(request.end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
         
         # 获取信号
-        signals, total = signal_service.generate_signals(
+        signals, total, cursor = signal_service.generate_signals(
             start, 
             end, 
             request.type, 
             request.page, 
             request.page_size,
-            request.klines
+            request.klines,
+            cursor=request.cursor,
+            incremental=request.incremental
         )
         
         return {
@@ -37,24 +39,74 @@ async def get_signals(
             "total": total,
             "page": request.page,
             "page_size": request.page_size,
-            "total_pages": (total + request.page_size - 1) // request.page_size
+            "total_pages": (total + request.page_size - 1) // request.page_size,
+            "cursor": cursor
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取信号失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/signals", response_model=Signal)
+@router.get("/signals", response_model=dict)
+async def list_signals(
+    start_date: str = Query(..., description="开始日期，格式：YYYY-MM-DD"),
+    end_date: str = Query(..., description="结束日期，格式：YYYY-MM-DD"),
+    type: Optional[str] = Query(None, description="信号类型或状态"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(10, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor，给出时忽略 page"),
+    include_total: bool = Query(True, description="是否返回总数"),
+    signal_service: SignalService = Depends(get_signal_service)
+):
+    """查询已保存的交易信号，按时间倒序分页"""
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").replace(hour=0, minute=0, second=0)
+        end = datetime.strptime(end_date, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+        signals, total, next_cursor = await signal_service.get_signals_async(
+            start, end, type, page, page_size, cursor=cursor, include_total=include_total
+        )
+        return {
+            "signals": signals,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+            "next_cursor": next_cursor
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"查询信号失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# POST /signals 用于生成信号，单条创建使用独立路径
+@router.post("/signals/create", response_model=Signal)
 async def create_signal(
     signal: SignalCreate,
     signal_service: SignalService = Depends(get_signal_service)
 ):
     """创建新信号"""
     try:
-        return signal_service.create_signal(signal)
+        return await signal_service.create_signal_async(signal)
     except Exception as e:
         logger.error(f"创建信号失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/signals/batch", response_model=SignalBatchResult)
+async def create_signals_batch(
+    request: SignalBatchCreate,
+    signal_service: SignalService = Depends(get_signal_service)
+):
+    """批量创建信号：按时间顺序在同一事务中计算交易，返回每条信号的处理结果"""
+    try:
+        return await signal_service.create_signals_batch_async(request.signals)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"批量创建信号失败: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.put("/signals/{signal_id}", response_model=Signal)
 async def update_signal(
     signal_id: str,
@@ -63,7 +115,7 @@ async def update_signal(
 ):
     """更新信号"""
     try:
-        return signal_service.update_signal(signal_id, signal)
+        return await signal_service.update_signal_async(signal_id, signal)
     except Exception as e:
         logger.error(f"更新信号失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -75,7 +127,7 @@ async def delete_signal(
 ):
     """删除信号"""
     try:
-        signal_service.delete_signal(signal_id)
+        await signal_service.delete_signal_async(signal_id)
         return {"message": "信号已删除"}
     except Exception as e:
         logger.error(f"删除信号失败: {str(e)}", exc_info=True)
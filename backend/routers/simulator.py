@@ -0,0 +1,46 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+import asyncio
+from config import get_multiplier
+from models.backtest import SimulationRequest
+from models.job import JobSubmitted
+from services.backtest_jobs import JobContext, backtest_jobs
+from services.event_simulator import EventSimulator, SimBroker, STREAM_STRATEGIES
+from services.portfolio_backtest import resolve_data_file
+from utils.logger import logger
+
+router = APIRouter()
+
+def execute_simulation(request: SimulationRequest, job: Optional[JobContext] = None):
+    """按块读取合约数据并逐根K线驱动流式策略"""
+    strategy_cls = STREAM_STRATEGIES.get(request.strategy)
+    if strategy_cls is None:
+        raise ValueError(f"不支持的流式策略: {request.strategy}，可选: {list(STREAM_STRATEGIES)}")
+    data_file = resolve_data_file(request.contract, request.data_period)
+    strategy = strategy_cls(**request.params)
+    broker = SimBroker(request.initial_capital, get_multiplier(request.contract), request.commission_rate)
+    on_progress = (lambda ratio: job.report(ratio * 100, "回测中")) if job is not None else None
+    simulator = EventSimulator(chunk_size=request.chunk_size, max_points=request.max_points)
+    return simulator.run(data_file, strategy, broker, on_progress)
+
+@router.post("/backtest")
+async def run_simulation(request: SimulationRequest):
+    """分块事件驱动回测，适用于多年分钟级数据"""
+    try:
+        logger.info(f"收到分块回测请求，contract={request.contract}, period={request.data_period}, strategy={request.strategy}")
+        return await asyncio.to_thread(execute_simulation, request)
+    except (ValueError, TypeError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_msg = f"分块回测失败: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.post("/backtest/jobs", response_model=JobSubmitted)
+async def submit_simulation_job(request: SimulationRequest):
+    """提交异步分块回测任务，按已读取的数据量汇报进度"""
+    try:
+        job = backtest_jobs.submit('simulator_backtest', request.dict(), lambda ctx: execute_simulation(request, ctx))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitted(job_id=job.id, status=job.status)
@@ -2,15 +2,22 @@ from fastapi import APIRouter, HTTPException
 from pathlib import Path
 import pandas as pd
 import numpy as np
-import talib
+from utils.indicator_cache import cached_indicator
 from utils.logger import logger
 from datetime import datetime
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Union
 from strategies.support_resistance_strategy import SupportResistanceStrategy
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from utils.equity_curve import EQUITY_CURVE_MAX_POINTS, EQUITY_CURVE_MIN_POINTS, EQUITY_CURVE_POINTS
+from services.dataset_registry import load_dataset
+from services.backtest_jobs import JobContext, backtest_jobs, report_progress
+from models.job import JobSubmitted
+import asyncio
 
 class BacktestRequest(BaseModel):
     data_period: str = 'daily'  # daily, weekly, 30min
+    equity_points: int = Field(default=EQUITY_CURVE_POINTS, ge=EQUITY_CURVE_MIN_POINTS, le=EQUITY_CURVE_MAX_POINTS,
+                               description="资金曲线点数（保留极值的降采样）")
 
 router = APIRouter()
 
@@ -23,35 +30,8 @@ def load_and_process_data(file_path):
             logger.error(error_msg)
             raise HTTPException(status_code=404, detail=error_msg)
             
-        df = pd.read_csv(file_path)
-        logger.info(f"成功读取CSV文件，总数据行数: {len(df)}")
-        
-        logger.debug("开始处理时间列")
-        # 根据文件名判断数据周期
-        if '30min' in str(file_path):
-            # 30分钟数据字段映射
-            df = df.rename(columns={
-                '时间': 'date',
-                '开盘': 'open',
-                '收盘': 'close',
-                '最高': 'high',
-                '最低': 'low',
-                '成交量': 'vol',
-                '成交额': 'amount'
-            })
-            df['date'] = pd.to_datetime(df['date'])
-        else:
-            # 日线数据字段映射
-            df = df.rename(columns={
-                'datetime': 'date',
-                'open': 'open',
-                'close': 'close',
-                'high': 'high',
-                'low': 'low',
-                'volume': 'vol',
-                'amount': 'amount'
-            })
-            df['date'] = pd.to_datetime(df['date'])
+        df = load_dataset(file_path)
+        logger.info(f"成功读取数据集，总数据行数: {len(df)}")
         
         # 计算支撑位和阻力位
         window = 20  # 用于计算支撑位和阻力位的窗口大小
@@ -59,7 +39,7 @@ def load_and_process_data(file_path):
         df['resistance_level'] = df['high'].rolling(window=window).max()
         
         # 计算ATR
-        df['atr'] = talib.ATR(df['high'], df['low'], df['close'], timeperiod=14)
+        df['atr'] = cached_indicator(df, 'ATR', timeperiod=14)
         
         # 处理NaN和Infinity值
         df = df.replace([np.inf, -np.inf], np.nan)
@@ -106,61 +86,44 @@ async def get_support_resistance_data(period: str = 'daily'):
     logger.debug(f"数据文件路径: {data_path.absolute()}")
     return load_and_process_data(data_path)
 
+def execute_backtest(request: BacktestRequest, job: Optional[JobContext] = None):
+    """按数据周期加载数据，计算支撑阻力信号并回测"""
+    # 根据选择的周期加载对应的数据文件
+    if request.data_period == 'weekly':
+        data_path = Path("daily_data/M2501.DCE_future_weekly_20100101_20251231.csv")
+    elif request.data_period == '30min':
+        data_path = Path("daily_data/M2501.DCE_future_30min_20100101_20251231.csv")
+    else:  # daily
+        data_path = Path("daily_data/M2501.DCE_future_daily_20100101_20251231.csv")
+        
+    # 从数据集注册表读取，字段名和日期格式已统一
+    report_progress(job, 10, "加载数据")
+    df = load_dataset(data_path)
+    
+    # 确保数值列不包含None或NaN
+    numeric_columns = ['open', 'close', 'high', 'low', 'vol', 'amount']
+    df[numeric_columns] = df[numeric_columns].fillna(method='ffill').fillna(method='bfill')
+    
+    # 使用策略类计算信号和执行回测
+    report_progress(job, 30, "计算交易信号")
+    strategy = SupportResistanceStrategy()
+    df_with_signals = strategy.calculate_signals(df)
+    
+    # 确保信号列不包含None或NaN
+    signal_columns = ['support_level', 'resistance_level', 'signal']
+    if any(col in df_with_signals.columns for col in signal_columns):
+        df_with_signals[signal_columns] = df_with_signals[signal_columns].fillna(0)
+    
+    report_progress(job, 60, "执行回测")
+    return strategy.run_backtest(df_with_signals, equity_points=request.equity_points)
+
 @router.post("/backtest")
 async def backtest_strategy(request: BacktestRequest):
     """执行策略回测"""
     try:
         logger.info(f"收到回测请求，data_period={request.data_period}")
         
-        # 根据选择的周期加载对应的数据文件
-        if request.data_period == 'weekly':
-            data_path = Path("daily_data/M2501.DCE_future_weekly_20100101_20251231.csv")
-        elif request.data_period == '30min':
-            data_path = Path("daily_data/M2501.DCE_future_30min_20100101_20251231.csv")
-        else:  # daily
-            data_path = Path("daily_data/M2501.DCE_future_daily_20100101_20251231.csv")
-            
-        # 读取并处理数据
-        df = pd.read_csv(data_path)
-        
-        # 根据文件名判断数据周期并处理字段名
-        if '30min' in str(data_path):
-            df = df.rename(columns={
-                '时间': 'date',
-                '开盘': 'open',
-                '收盘': 'close',
-                '最高': 'high',
-                '最低': 'low',
-                '成交量': 'vol',
-                '成交额': 'amount'
-            })
-        else:
-            df = df.rename(columns={
-                'datetime': 'date',
-                'open': 'open',
-                'close': 'close',
-                'high': 'high',
-                'low': 'low',
-                'volume': 'vol',
-                'amount': 'amount'
-            })
-        
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # 确保数值列不包含None或NaN
-        numeric_columns = ['open', 'close', 'high', 'low', 'vol', 'amount']
-        df[numeric_columns] = df[numeric_columns].fillna(method='ffill').fillna(method='bfill')
-        
-        # 使用策略类计算信号和执行回测
-        strategy = SupportResistanceStrategy()
-        df_with_signals = strategy.calculate_signals(df)
-        
-        # 确保信号列不包含None或NaN
-        signal_columns = ['support_level', 'resistance_level', 'signal']
-        if any(col in df_with_signals.columns for col in signal_columns):
-            df_with_signals[signal_columns] = df_with_signals[signal_columns].fillna(0)
-        
-        result = strategy.run_backtest(df_with_signals)
+        result = await asyncio.to_thread(execute_backtest, request)
         
         logger.info("回测完成")
         return result
@@ -170,4 +133,13 @@ async def backtest_strategy(request: BacktestRequest):
         import traceback
         traceback.print_exc()
         logger.error(error_msg, exc_info=True)
-        raise HTTPException(status_code=500, detail=error_msg) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.post("/backtest/jobs", response_model=JobSubmitted)
+async def submit_backtest_job(request: BacktestRequest):
+    """提交异步回测任务，通过 /jobs/{job_id}/events 获取进度"""
+    try:
+        job = backtest_jobs.submit('support_resistance_backtest', request.dict(), lambda ctx: execute_backtest(request, ctx))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitted(job_id=job.id, status=job.status)
@@ -1,15 +1,27 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from pathlib import Path
 import pandas as pd
 import numpy as np
-import talib
+from utils.indicator_cache import cached_indicator
+from utils.equity_curve import EQUITY_CURVE_MAX_POINTS, EQUITY_CURVE_MIN_POINTS, EQUITY_CURVE_POINTS
 from utils.logger import logger
 from datetime import datetime
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Union
 from strategies.trend_follow_strategy import TrendFollowStrategy
+from models.backtest import SweepRequest, WalkForwardRequest
+from services.param_sweep import ParamSweepService
+from services.walk_forward import WalkForwardService
+from services.dataset_registry import load_dataset
+from services.backtest_cache import backtest_cache
+from services.backtest_jobs import JobContext, backtest_jobs, report_progress
+from models.job import JobSubmitted
+import asyncio
 
 router = APIRouter()
 
+# 回测使用的15分钟数据文件，60分钟K线由其合成
+BACKTEST_DATA_FILE = 'data/M2501.DCE_future_15min_20240101_20251231.csv'
+
 def load_and_process_data(file_path, is_15min=False):
     try:
         logger.info(f"开始加载数据文件: {file_path}")
@@ -19,23 +31,20 @@ def load_and_process_data(file_path, is_15min=False):
             logger.error(error_msg)
             raise HTTPException(status_code=404, detail=error_msg)
             
-        df = pd.read_csv(file_path)
-        logger.info(f"成功读取CSV文件，总数据行数: {len(df)}")
-        
-        logger.debug("开始处理时间列")
-        df['date'] = pd.to_datetime(df['date'])
+        df = load_dataset(file_path)
+        logger.info(f"成功读取数据集，总数据行数: {len(df)}")
         
         if is_15min:
             logger.debug("开始计算15分钟EMA12和EMA26指标")
-            df['ema12'] = talib.EMA(df['close'], timeperiod=12)
-            df['ema26'] = talib.EMA(df['close'], timeperiod=26)
+            df['ema12'] = cached_indicator(df, 'EMA', timeperiod=12)
+            df['ema26'] = cached_indicator(df, 'EMA', timeperiod=26)
             # 处理NaN和Infinity值
             df = df.replace([np.inf, -np.inf], np.nan)
             df['ema12'] = df['ema12'].fillna(method='ffill').fillna(method='bfill')
             df['ema26'] = df['ema26'].fillna(method='ffill').fillna(method='bfill')
         else:
             logger.debug("开始计算60分钟EMA60指标")
-            df['ema60'] = talib.EMA(df['close'], timeperiod=60)
+            df['ema60'] = cached_indicator(df, 'EMA', timeperiod=60)
             # 处理NaN和Infinity值
             df = df.replace([np.inf, -np.inf], np.nan)
             df['ema60'] = df['ema60'].fillna(method='ffill').fillna(method='bfill')
@@ -88,32 +97,45 @@ async def get_60min_data():
     logger.debug(f"60分钟数据文件路径: {data_path.absolute()}")
     return load_and_process_data(data_path, is_15min=False)
 
+def load_backtest_data():
+    """加载15分钟回测数据并计算基础指标，60分钟K线在计算信号时由15分钟数据合成"""
+    # 从数据集注册表读取
+    df_15min = load_dataset(BACKTEST_DATA_FILE)
+    
+    # 计算技术指标
+    df_15min['ema12'] = cached_indicator(df_15min, 'EMA', timeperiod=12)
+    df_15min['ema26'] = cached_indicator(df_15min, 'EMA', timeperiod=26)
+    return df_15min
+
+def execute_backtest(equity_points: int = EQUITY_CURVE_POINTS, job: Optional[JobContext] = None):
+    """计算信号并回测，数据文件未变化时直接返回缓存的结果"""
+    def run():
+        # 加载数据
+        report_progress(job, 10, "加载数据")
+        df_15min = load_backtest_data()
+        # 使用策略类计算信号和执行回测
+        report_progress(job, 30, "计算交易信号")
+        strategy = TrendFollowStrategy()
+        df_with_signals = strategy.calculate_signals(df_15min)
+        report_progress(job, 60, "执行回测")
+        return strategy.run_backtest(df_with_signals, equity_points=equity_points)
+
+    return backtest_cache.get_or_run(
+        'trend_follow',
+        {'equity_points': equity_points},
+        [BACKTEST_DATA_FILE],
+        TrendFollowStrategy,
+        run
+    )
+
 @router.post("/backtest")
-async def backtest_strategy():
+async def backtest_strategy(equity_points: int = Query(default=EQUITY_CURVE_POINTS, ge=EQUITY_CURVE_MIN_POINTS, le=EQUITY_CURVE_MAX_POINTS,
+                            description="资金曲线点数（保留极值的降采样）")):
     """执行策略回测"""
     try:
         logger.info("收到回测请求")
         
-        # 加载数据
-        data_path_15min = Path("data/M2501.DCE_future_15min_20240101_20251231.csv")
-        data_path_60min = Path("data/M2501.DCE_future_60min_20240101_20251231.csv")
-        
-        # 读取并处理数据
-        df_15min = pd.read_csv(data_path_15min)
-        df_60min = pd.read_csv(data_path_60min)
-        
-        df_15min['date'] = pd.to_datetime(df_15min['date'])
-        df_60min['date'] = pd.to_datetime(df_60min['date'])
-        
-        # 计算技术指标
-        df_15min['ema12'] = talib.EMA(df_15min['close'], timeperiod=12)
-        df_15min['ema26'] = talib.EMA(df_15min['close'], timeperiod=26)
-        df_60min['ema60'] = talib.EMA(df_60min['close'], timeperiod=60)
-        
-        # 使用策略类计算信号和执行回测
-        strategy = TrendFollowStrategy()
-        df_with_signals = strategy.calculate_signals(df_15min, df_60min)
-        result = strategy.run_backtest(df_with_signals)
+        result = await asyncio.to_thread(execute_backtest, equity_points)
         
         logger.info("回测完成")
         return result
@@ -121,4 +143,66 @@ async def backtest_strategy():
     except Exception as e:
         error_msg = f"回测过程中发生错误: {str(e)}"
         logger.error(error_msg, exc_info=True)
-        raise HTTPException(status_code=500, detail=error_msg) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.post("/backtest/jobs", response_model=JobSubmitted)
+async def submit_backtest_job(equity_points: int = Query(default=EQUITY_CURVE_POINTS, ge=EQUITY_CURVE_MIN_POINTS, le=EQUITY_CURVE_MAX_POINTS,
+                              description="资金曲线点数（保留极值的降采样）")):
+    """提交异步回测任务，通过 /jobs/{job_id}/events 获取进度"""
+    try:
+        job = backtest_jobs.submit('trend_follow_backtest', {'equity_points': equity_points},
+                                   lambda ctx: execute_backtest(equity_points, ctx))
+    except RuntimeError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitted(job_id=job.id, status=job.status)
+
+@router.post("/sweep")
+async def sweep_strategy(request: SweepRequest):
+    """参数扫描：多进程并行回测所有参数组合，返回排名结果（data_period固定为15分钟，60分钟K线由其合成）"""
+    try:
+        logger.info(f"收到趋势跟随参数扫描请求，params={list(request.param_ranges)}")
+        df_15min = load_backtest_data()
+        service = ParamSweepService(max_workers=request.max_workers)
+        return await asyncio.to_thread(
+            service.run_sweep,
+            'trend_follow',
+            {'15min': df_15min},
+            request.param_ranges,
+            request.rank_by,
+            request.top_n,
+            request.heatmap.dict() if request.heatmap else None
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_msg = f"参数扫描过程中发生错误: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+@router.post("/walk_forward")
+async def walk_forward_strategy(request: WalkForwardRequest):
+    """前向分析：滚动窗口样本内并行寻优，样本外检验并拼接资金曲线"""
+    try:
+        logger.info(f"收到前向分析请求，params={list(request.param_ranges)}")
+        df_15min = load_backtest_data()
+        service = WalkForwardService(max_workers=request.max_workers)
+        return await asyncio.to_thread(
+            service.run,
+            'trend_follow',
+            {'15min': df_15min},
+            request.param_ranges,
+            request.in_sample_bars,
+            request.out_of_sample_bars,
+            request.rank_by,
+            request.anchored
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        error_msg = f"前向分析过程中发生错误: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        raise HTTPException(status_code=500, detail=error_msg)
@@ -0,0 +1,268 @@
+import hashlib
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, String, DateTime, Integer, Text
+from sqlalchemy.ext.declarative import declarative_base
+
+from database import engine, SessionLocal, ensure_schema
+from services.dataset_registry import dataset_registry
+from utils.logger import logger
+
+# 回测引擎版本：数据预处理或结果格式变化时手动递增，使旧缓存全部失效
+BACKTEST_ENGINE_VERSION = 2
+# 进程内热缓存条数
+BACKTEST_CACHE_MEMORY_ENTRIES = 32
+# 数据库中最多保留的回测结果条数，超出时按最近访问时间淘汰
+BACKTEST_CACHE_MAX_ENTRIES = 500
+# 热缓存命中的访问记录攒批写库的间隔（秒）
+BACKTEST_CACHE_TOUCH_INTERVAL = 30.0
+
+Base = declarative_base()
+
+class BacktestResultDB(Base):
+    __tablename__ = "backtest_results"
+
+    cache_key = Column(String, primary_key=True)
+    strategy = Column(String, nullable=False, index=True)
+    params = Column(Text, nullable=False)
+    data_hash = Column(String, nullable=False)
+    engine_version = Column(String, nullable=False)
+    result = Column(Text, nullable=False)
+    hit_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.now)
+    last_accessed_at = Column(DateTime, default=datetime.now, index=True)
+
+def json_default(value: Any) -> Any:
+    """回测结果中的numpy标量、时间戳转为JSON原生类型"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (pd.Timestamp, datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value)}")
+
+def _source_hash(obj: Any) -> str:
+    """策略模块源码的哈希，策略代码修改后缓存自动失效"""
+    source_file = inspect.getsourcefile(obj)
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(Path(source_file).read_bytes() if source_file else repr(obj).encode())
+    return digest.hexdigest()
+
+class BacktestCache:
+    """回测结果缓存：按(策略, 参数, 数据内容哈希, 引擎版本)持久化到本地数据库，
+    进程内保留最近使用的结果，数据文件或策略代码变化后自动失效"""
+
+    def __init__(self, memory_entries: int = BACKTEST_CACHE_MEMORY_ENTRIES,
+                 max_entries: int = BACKTEST_CACHE_MAX_ENTRIES):
+        self.engine = engine
+        ensure_schema(Base.metadata)
+        self.SessionLocal = SessionLocal
+        self.logger = logger
+        self.memory_entries = memory_entries
+        self.max_entries = max_entries
+        self._memory: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        # 正在使用的键锁：键 -> [锁, 使用者数]，最后一个使用者退出时移除
+        self._key_locks: Dict[str, List[Any]] = {}
+        self._hits = 0
+        self._misses = 0
+        # 热缓存命中尚未写库的访问记录：键 -> (命中次数, 最近访问时间)
+        self._pending_touches: Dict[str, Tuple[int, datetime]] = {}
+        self._touched_at = time.monotonic()
+
+    def make_key(self, strategy: str, params: Dict[str, Any], data_files: Sequence[Union[str, Path]],
+                 engine: Hashable) -> Dict[str, str]:
+        """生成缓存键，数据版本取各数据文件的内容哈希"""
+        params_json = json.dumps(params, sort_keys=True, default=json_default)
+        data_hash = hashlib.blake2b(
+            '|'.join(dataset_registry.content_hash(f) for f in data_files).encode(), digest_size=16
+        ).hexdigest()
+        engine_version = f"{BACKTEST_ENGINE_VERSION}-{_source_hash(engine)}"
+        cache_key = hashlib.blake2b(
+            f"{strategy}|{params_json}|{data_hash}|{engine_version}".encode(), digest_size=16
+        ).hexdigest()
+        return {
+            'cache_key': cache_key,
+            'strategy': strategy,
+            'params': params_json,
+            'data_hash': data_hash,
+            'engine_version': engine_version,
+        }
+
+    @contextmanager
+    def _key_lock(self, cache_key: str) -> Iterator[None]:
+        """持有同一键的互斥锁；锁按使用者计数，用完即移除，锁表大小不超过并发请求数"""
+        with self._lock:
+            entry = self._key_locks.setdefault(cache_key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[cache_key]
+
+    def _remember(self, cache_key: str, result: Any) -> None:
+        with self._lock:
+            self._memory[cache_key] = result
+            self._memory.move_to_end(cache_key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def _load(self, cache_key: str) -> Optional[Any]:
+        db = self.SessionLocal()
+        try:
+            row = db.query(BacktestResultDB).filter(BacktestResultDB.cache_key == cache_key).first()
+            if row is None:
+                return None
+            row.hit_count += 1
+            row.last_accessed_at = datetime.now()
+            db.commit()
+            return json.loads(row.result)
+        finally:
+            db.close()
+
+    def _touch(self, cache_key: str) -> None:
+        """记录一次热缓存命中，超过攒批间隔时才写库"""
+        with self._lock:
+            hits, _ = self._pending_touches.get(cache_key, (0, None))
+            self._pending_touches[cache_key] = (hits + 1, datetime.now())
+            due = time.monotonic() - self._touched_at >= BACKTEST_CACHE_TOUCH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self) -> None:
+        """把攒下的命中次数和访问时间一次事务写库"""
+        with self._lock:
+            pending, self._pending_touches = self._pending_touches, {}
+            self._touched_at = time.monotonic()
+        if not pending:
+            return
+        db = self.SessionLocal()
+        try:
+            for cache_key, (hits, accessed_at) in pending.items():
+                db.query(BacktestResultDB).filter(BacktestResultDB.cache_key == cache_key).update({
+                    BacktestResultDB.hit_count: BacktestResultDB.hit_count + hits,
+                    BacktestResultDB.last_accessed_at: accessed_at,
+                })
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"回测缓存访问记录写入失败: {e}")
+        finally:
+            db.close()
+
+    def _store(self, key: Dict[str, str], result_json: str) -> None:
+        # 淘汰按最近访问时间排序，先写入攒下的访问记录
+        self.flush()
+        db = self.SessionLocal()
+        try:
+            db.merge(BacktestResultDB(**key, result=result_json, hit_count=0,
+                                      created_at=datetime.now(), last_accessed_at=datetime.now()))
+            db.flush()
+            overflow = db.query(BacktestResultDB).count() - self.max_entries
+            if overflow > 0:
+                stale = (db.query(BacktestResultDB.cache_key)
+                         .order_by(BacktestResultDB.last_accessed_at.asc())
+                         .limit(overflow).all())
+                db.query(BacktestResultDB).filter(
+                    BacktestResultDB.cache_key.in_([k for (k,) in stale])
+                ).delete(synchronize_session=False)
+                self.logger.info(f"回测缓存淘汰 {overflow} 条结果")
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def get_or_run(self, strategy: str, params: Dict[str, Any], data_files: Sequence[Union[str, Path]],
+                   engine: Hashable, run: Callable[[], Any]) -> Any:
+        """命中缓存直接返回，否则执行回测并写入缓存
+        Args:
+            strategy: 策略名称
+            params: 影响回测结果的全部参数
+            data_files: 回测使用的数据文件
+            engine: 策略类，其源码参与引擎版本计算
+            run: 实际执行回测的函数
+        Returns:
+            回测结果（JSON原生类型），多个请求可能共享同一对象，调用方不要原地修改
+        """
+        key = self.make_key(strategy, params, data_files, engine)
+        cache_key = key['cache_key']
+
+        # 同一键的并发请求只回测一次，其余等待后直接命中
+        with self._key_lock(cache_key):
+            with self._lock:
+                result = self._memory.get(cache_key)
+                if result is not None:
+                    self._memory.move_to_end(cache_key)
+                    self._hits += 1
+            if result is not None:
+                self._touch(cache_key)
+                return result
+
+            result = self._load(cache_key)
+            if result is not None:
+                with self._lock:
+                    self._hits += 1
+                self._remember(cache_key, result)
+                self.logger.info(f"回测缓存命中: 策略={strategy}, 参数={key['params']}")
+                return result
+
+            with self._lock:
+                self._misses += 1
+            result_json = json.dumps(run(), default=json_default)
+            self._store(key, result_json)
+            # 与命中时的返回值保持同样的类型
+            result = json.loads(result_json)
+            self._remember(cache_key, result)
+            return result
+
+    def clear(self, strategy: Optional[str] = None) -> int:
+        """清除全部或指定策略的缓存，返回删除的条数"""
+        with self._lock:
+            self._memory.clear()
+        self.flush()
+        db = self.SessionLocal()
+        try:
+            query = db.query(BacktestResultDB)
+            if strategy:
+                query = query.filter(BacktestResultDB.strategy == strategy)
+            deleted = query.delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def stats(self) -> Dict[str, int]:
+        self.flush()
+        db = self.SessionLocal()
+        try:
+            stored = db.query(BacktestResultDB).count()
+        finally:
+            db.close()
+        with self._lock:
+            return {
+                'memory_entries': len(self._memory),
+                'stored_entries': stored,
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+            }
+
+# 进程内共享的回测缓存实例
+backtest_cache = BacktestCache()
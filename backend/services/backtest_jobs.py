@@ -0,0 +1,257 @@
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, String, DateTime, Float, Text
+from sqlalchemy.ext.declarative import declarative_base
+
+from database import engine, SessionLocal, ensure_schema
+from models.job import FINISHED_STATUSES, Job, JobStatus
+from services.backtest_cache import json_default
+from utils.logger import logger
+
+# 同时运行的回测任务数，独立于接口线程池，长任务不会占满交互接口的工作线程
+BACKTEST_JOB_CONCURRENCY = 2
+# 排队中的任务上限，超出时拒绝提交
+BACKTEST_JOB_MAX_PENDING = 20
+# 内存中保留的已结束任务数，更早的任务只能从数据库查询
+BACKTEST_JOB_MEMORY_ENTRIES = 200
+
+Base = declarative_base()
+
+class BacktestJobDB(Base):
+    __tablename__ = "backtest_jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False, index=True)
+    params = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default=JobStatus.PENDING.value)
+    progress = Column(Float, nullable=False, default=0.0)
+    message = Column(String, nullable=False, default="")
+    error = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.now, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class JobCancelled(Exception):
+    """任务被取消，由 JobContext.report 在检查点抛出"""
+
+class JobContext:
+    """传给任务函数的上下文，用于汇报进度和协作式取消"""
+
+    def __init__(self, service: 'BacktestJobService', job_id: str, cancel_event: threading.Event):
+        self.service = service
+        self.job_id = job_id
+        self._cancel_event = cancel_event
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def report(self, progress: float, message: str = "") -> None:
+        """汇报进度（0-100），同时作为取消检查点"""
+        self.check_cancelled()
+        self.service._update(self.job_id, progress=max(0.0, min(100.0, float(progress))), message=message)
+
+def report_progress(job: Optional[JobContext], progress: float, message: str = "") -> None:
+    """同步接口调用时 job 为 None，此时不做任何事"""
+    if job is not None:
+        job.report(progress, message)
+
+def _to_model(row: BacktestJobDB) -> Job:
+    return Job(
+        id=row.id,
+        kind=row.kind,
+        params=json.loads(row.params),
+        status=JobStatus(row.status),
+        progress=row.progress,
+        message=row.message,
+        error=row.error,
+        created_at=row.created_at,
+        started_at=row.started_at,
+        finished_at=row.finished_at,
+    )
+
+class BacktestJobService:
+    """异步回测任务队列：提交后立即返回任务ID，在独立线程池中执行，
+    进度保存在内存中供SSE推送，任务状态和结果持久化到数据库"""
+
+    def __init__(self, concurrency: int = BACKTEST_JOB_CONCURRENCY, max_pending: int = BACKTEST_JOB_MAX_PENDING):
+        self.engine = engine
+        ensure_schema(Base.metadata)
+        self.SessionLocal = SessionLocal
+        self.logger = logger
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="backtest-job")
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._recover()
+
+    def _recover(self) -> None:
+        """上次进程退出时未完成的任务标记为失败"""
+        db = self.SessionLocal()
+        try:
+            count = db.query(BacktestJobDB).filter(
+                BacktestJobDB.status.in_([JobStatus.PENDING.value, JobStatus.RUNNING.value])
+            ).update({
+                BacktestJobDB.status: JobStatus.FAILED.value,
+                BacktestJobDB.error: "服务重启，任务中断",
+                BacktestJobDB.finished_at: datetime.now(),
+            }, synchronize_session=False)
+            db.commit()
+            if count:
+                self.logger.warning(f"{count} 个回测任务因服务重启被中断")
+        finally:
+            db.close()
+
+    def _persist(self, job: Job, result_json: Optional[str] = None) -> None:
+        db = self.SessionLocal()
+        try:
+            row = db.query(BacktestJobDB).filter(BacktestJobDB.id == job.id).first()
+            if row is None:
+                row = BacktestJobDB(id=job.id, kind=job.kind, params=json.dumps(job.params, default=json_default),
+                                    created_at=job.created_at)
+                db.add(row)
+            row.status = job.status.value
+            row.progress = job.progress
+            row.message = job.message
+            row.error = job.error
+            row.started_at = job.started_at
+            row.finished_at = job.finished_at
+            if result_json is not None:
+                row.result = result_json
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.logger.error(f"保存回测任务状态失败: {job.id}, {str(e)}")
+        finally:
+            db.close()
+
+    def _update(self, job_id: str, **changes) -> Job:
+        with self._lock:
+            job = self._jobs[job_id].copy(update=changes)
+            self._jobs[job_id] = job
+            self._versions[job_id] = self._versions.get(job_id, 0) + 1
+            return job
+
+    def _finish(self, job_id: str, status: JobStatus, result_json: Optional[str] = None, **changes) -> None:
+        job = self._update(job_id, status=status, finished_at=datetime.now(), **changes)
+        self._persist(job, result_json)
+        with self._lock:
+            self._cancel_events.pop(job_id, None)
+            self._futures.pop(job_id, None)
+            finished = [k for k, v in self._jobs.items() if v.status in FINISHED_STATUSES]
+            for stale in finished[:max(0, len(finished) - BACKTEST_JOB_MEMORY_ENTRIES)]:
+                self._jobs.pop(stale, None)
+                self._versions.pop(stale, None)
+        self.logger.info(f"回测任务结束: {job_id}, 状态={status.value}")
+
+    def submit(self, kind: str, params: Dict[str, Any], func: Callable[[JobContext], Any]) -> Job:
+        """提交任务
+        Args:
+            kind: 任务类型，如 dual_ma_backtest
+            params: 任务参数，仅用于展示和持久化
+            func: 任务函数，接收 JobContext，返回可JSON序列化的结果
+        Raises:
+            RuntimeError: 排队任务数已达上限
+        """
+        with self._lock:
+            pending = sum(1 for job in self._jobs.values() if job.status == JobStatus.PENDING)
+            if pending >= self.max_pending:
+                raise RuntimeError(f"排队中的回测任务已达上限: {self.max_pending}")
+            job = Job(id=str(uuid.uuid4()), kind=kind, params=params, created_at=datetime.now(), message="排队中")
+            self._jobs[job.id] = job
+            self._versions[job.id] = 0
+            cancel_event = threading.Event()
+            self._cancel_events[job.id] = cancel_event
+        self._persist(job)
+        with self._lock:
+            self._futures[job.id] = self._executor.submit(self._run, job.id, func, cancel_event)
+        self.logger.info(f"提交回测任务: {job.id}, 类型={kind}")
+        return job
+
+    def _run(self, job_id: str, func: Callable[[JobContext], Any], cancel_event: threading.Event) -> None:
+        if cancel_event.is_set():
+            self._finish(job_id, JobStatus.CANCELLED, message="任务已取消")
+            return
+
+        job = self._update(job_id, status=JobStatus.RUNNING, started_at=datetime.now(), message="运行中")
+        self._persist(job)
+        try:
+            result = func(JobContext(self, job_id, cancel_event))
+            result_json = json.dumps(result, default=json_default)
+            self._finish(job_id, JobStatus.SUCCEEDED, result_json, progress=100.0, message="完成")
+        except JobCancelled:
+            self._finish(job_id, JobStatus.CANCELLED, message="任务已取消")
+        except Exception as e:
+            self.logger.error(f"回测任务失败: {job_id}, {str(e)}", exc_info=True)
+            self._finish(job_id, JobStatus.FAILED, error=str(e), message="任务失败")
+
+    def cancel(self, job_id: str) -> bool:
+        """请求取消任务，排队中的任务立即取消，运行中的任务在下一个检查点停止"""
+        with self._lock:
+            cancel_event = self._cancel_events.get(job_id)
+            future = self._futures.get(job_id)
+        if cancel_event is None:
+            return False
+        cancel_event.set()
+        if future is not None and future.cancel():
+            self._finish(job_id, JobStatus.CANCELLED, message="任务已取消")
+        return True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        db = self.SessionLocal()
+        try:
+            row = db.query(BacktestJobDB).filter(BacktestJobDB.id == job_id).first()
+            return _to_model(row) if row else None
+        finally:
+            db.close()
+
+    def snapshot(self, job_id: str) -> Tuple[int, Optional[Job]]:
+        """返回任务的状态版本号和当前状态，版本号变化表示有新进度"""
+        with self._lock:
+            if job_id in self._jobs:
+                return self._versions.get(job_id, 0), self._jobs[job_id]
+        return -1, self.get(job_id)
+
+    def get_result(self, job_id: str) -> Optional[Any]:
+        db = self.SessionLocal()
+        try:
+            row = db.query(BacktestJobDB).filter(BacktestJobDB.id == job_id).first()
+            if row is None or row.result is None:
+                return None
+            return json.loads(row.result)
+        finally:
+            db.close()
+
+    def list_jobs(self, kind: Optional[str] = None, limit: int = 50) -> List[Job]:
+        db = self.SessionLocal()
+        try:
+            query = db.query(BacktestJobDB)
+            if kind:
+                query = query.filter(BacktestJobDB.kind == kind)
+            rows = query.order_by(BacktestJobDB.created_at.desc()).limit(limit).all()
+        finally:
+            db.close()
+        with self._lock:
+            # 运行中的任务以内存中的进度为准
+            return [self._jobs.get(row.id) or _to_model(row) for row in rows]
+
+# 进程内共享的任务队列
+backtest_jobs = BacktestJobService()
@@ -0,0 +1,105 @@
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from services.backtest_cache import backtest_cache
+from services.backtest_jobs import JobContext, report_progress
+from services.dataset_registry import load_dataset
+from services.portfolio_backtest import resolve_data_file
+from services.strategy_registry import STRATEGY_REGISTRY, compute_indicators, get_strategy
+from utils.equity_curve import EQUITY_CURVE_POINTS
+from utils.logger import logger
+
+class BatchBacktestService:
+    """一次请求评估多个注册策略：数据集只加载一次，各策略所需指标取并集后统一计算一次，
+    所有策略在同一份数据上回测；单个策略的结果仍经回测缓存，未变化的策略直接命中"""
+
+    def __init__(self):
+        self.logger = logger
+
+    def run(self, contract: str = 'M2501', data_period: str = '60min', strategies: Optional[List[str]] = None,
+            params: Optional[Dict[str, Dict[str, Any]]] = None, equity_points: Optional[int] = EQUITY_CURVE_POINTS,
+            job: Optional[JobContext] = None) -> Dict[str, Any]:
+        """
+        Args:
+            contract: 合约代码，只给品种代码时使用日线连续合约
+            data_period: 主周期
+            strategies: 参与评估的策略，默认全部注册策略
+            params: 策略名 -> 参数覆盖，未给出的参数使用策略默认值
+            equity_points: 资金曲线点数
+        Returns:
+            results 为各策略完整回测结果，summary 为统一口径后的核心指标对比（收益率为小数、最大回撤为正数），
+            errors 为失败策略的错误信息，skipped 为不适用于该数据而未评估的策略及原因
+        """
+        names = list(strategies or STRATEGY_REGISTRY)
+        params = params or {}
+        unknown = set(params) - set(names)
+        if unknown:
+            raise ValueError(f"参数中包含未参与评估的策略: {sorted(unknown)}")
+        specs = [get_strategy(name) for name in names]
+        split = {spec.name: spec.split_params(params.get(spec.name, {})) for spec in specs}
+        skipped: Dict[str, str] = {}
+        for spec in specs:
+            # 股票/ETF代码为数字，期货合约和连续合约以品种字母开头
+            if contract[:1].isalpha() and not spec.futures:
+                skipped[spec.name] = "策略按ETF每手100股下单，不适用于期货合约"
+            elif spec.period_params is not None:
+                try:
+                    split[spec.name][0].update(spec.period_params(data_period))
+                except ValueError as e:
+                    skipped[spec.name] = str(e)
+        specs = [spec for spec in specs if spec.name not in skipped]
+
+        data_file = resolve_data_file(contract, data_period)
+        shared: Dict[str, pd.DataFrame] = {}
+
+        def shared_bars() -> pd.DataFrame:
+            """首个未命中缓存的策略触发加载和指标计算，之后的策略直接复用"""
+            if not shared:
+                started = time.perf_counter()
+                shared['bars'] = load_dataset(data_file)
+                requirements = [req for spec in specs for req in spec.indicators(split[spec.name][0])]
+                count = compute_indicators(shared['bars'], requirements)
+                self.logger.info(f"批量回测共享数据准备完成: 指标{count}个, 耗时{time.perf_counter() - started:.3f}s")
+            return shared['bars']
+
+        results: Dict[str, Any] = {}
+        errors: Dict[str, str] = {}
+        for i, spec in enumerate(specs):
+            report_progress(job, 100 * i / len(specs), f"回测 {spec.title}")
+            signal_params, backtest_params = split[spec.name]
+
+            def run(spec=spec, signal_params=signal_params, backtest_params=backtest_params):
+                # 策略会在K线上添加信号列，每个策略使用各自的副本
+                df_with_signals = spec.signals(shared_bars().copy(), signal_params)
+                return spec.backtest(df_with_signals, backtest_params, equity_points)
+
+            try:
+                results[spec.name] = backtest_cache.get_or_run(
+                    spec.name,
+                    {'batch': True, 'contract': contract, 'data_period': data_period,
+                     **signal_params, **backtest_params, 'equity_points': equity_points},
+                    [data_file],
+                    spec.strategy_class,
+                    run
+                )
+            except Exception as e:
+                self.logger.error(f"批量回测中策略 {spec.name} 失败: {str(e)}", exc_info=True)
+                errors[spec.name] = str(e)
+
+        self.logger.info(f"批量回测完成: 合约={contract}, 周期={data_period}, 成功{len(results)}个, "
+                         f"失败{len(errors)}个, 跳过{len(skipped)}个")
+        return {
+            'contract': contract,
+            'data_period': data_period,
+            'data_file': str(Path(data_file)),
+            'summary': [{'strategy': name, **get_strategy(name).summarize(result)} for name, result in results.items()],
+            'results': results,
+            'errors': errors,
+            'skipped': skipped,
+        }
+
+# 进程内共享的批量回测服务
+batch_backtest = BatchBacktestService()
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from database import BACKEND_DIR
+from services.dataset_registry import dataset_registry, load_dataset
+from utils.logger import logger
+
+# 主力合约的选择规则：按持仓量、按成交量、按固定日历
+ROLL_RULES = ['oi', 'volume', 'calendar']
+# 换月价差的复权方式：不复权、差值（加减价差）、比例（乘以价格比）。
+# 长历史下差值复权的早期价格可能为负，收益率类计算应使用比例复权
+ADJUST_METHODS = ['none', 'difference', 'ratio']
+# 单月合约日线数据目录
+CONTRACT_DATA_DIR = 'daily_data'
+# 连续合约物化文件的目录
+CONTINUOUS_CACHE_DIR = os.path.join(BACKEND_DIR, 'cache', 'continuous')
+# 构建逻辑版本：选择或复权算法变化时递增，使已物化的文件失效
+CONTINUOUS_BUILD_VERSION = 1
+# 复权的价格列；成交量、持仓量不复权
+ADJUSTED_COLUMNS = ('open', 'high', 'low', 'close', 'settle', 'pre_close', 'pre_settle')
+
+_CONTRACT_PATTERN = re.compile(r'^([A-Za-z]+)(\d{2})(\d{2})$')
+
+def parse_contract(code: str) -> Tuple[str, int, int]:
+    """解析合约代码，如 M2501 -> ('M', 2025, 1)；两位年份小于50视为20xx年"""
+    match = _CONTRACT_PATTERN.match(code)
+    if not match:
+        raise ValueError(f"无法解析合约代码: {code}")
+    symbol, year, month = match.group(1), int(match.group(2)), int(match.group(3))
+    return symbol, (2000 if year < 50 else 1900) + year, month
+
+def list_contracts(symbol: str, data_dir: str = CONTRACT_DATA_DIR) -> List[Tuple[str, Path]]:
+    """列出品种的所有单月合约日线文件，按到期先后排序"""
+    contracts = []
+    for path in Path(data_dir).glob(f"{symbol}[0-9][0-9][0-9][0-9].*_daily_*.csv"):
+        code = path.name.split('.')[0]
+        contracts.append((parse_contract(code)[1:], code, path))
+    contracts.sort()
+    return [(code, path) for _, code, path in contracts]
+
+def calendar_roll_dates(codes: List[str], months_before: int = 1) -> np.ndarray:
+    """固定日历规则下各合约的换出日期：交割月之前 months_before 个月的1日"""
+    dates = []
+    for code in codes:
+        _, year, month = parse_contract(code)
+        dates.append(pd.Timestamp(year=year, month=month, day=1) - pd.DateOffset(months=months_before))
+    return pd.DatetimeIndex(dates).values.astype('datetime64[ns]')
+
+def select_active(dates: np.ndarray, available: np.ndarray, metric: Optional[np.ndarray], rule: str,
+                  roll_dates: Optional[np.ndarray] = None) -> np.ndarray:
+    """逐日选择主力合约，返回列下标（合约已按到期排序），两种规则都只向远月切换不回切
+    oi/volume: 当日持仓量或成交量最大的合约；按收盘数据判断，次日起生效，避免未来函数
+    calendar: 尚未到换出日期且当日有数据的最近月合约"""
+    if rule == 'calendar':
+        candidates = available & (dates[:, None] < roll_dates[None, :])
+        # 没有候选时回退到当日有数据的最远月合约
+        fallback = available.shape[1] - 1 - np.argmax(available[:, ::-1], axis=1)
+        return np.maximum.accumulate(np.where(candidates.any(axis=1), np.argmax(candidates, axis=1), fallback))
+
+    scores = np.where(available, metric, -np.inf)
+    chosen = np.maximum.accumulate(np.argmax(scores, axis=1))
+    return np.concatenate((chosen[:1], chosen[:-1]))
+
+def adjustment_factors(closes: np.ndarray, active: np.ndarray, method: str) -> np.ndarray:
+    """按换月前一日新旧合约的收盘价差计算每日的复权量：
+    difference 返回需加上的价差，ratio 返回需乘上的比例，均为该日之后所有换月的累计值"""
+    n = len(active)
+    rows = np.flatnonzero(active[1:] != active[:-1]) + 1
+    prev = rows - 1
+    new_close = closes[prev, active[rows]]
+    old_close = closes[prev, active[prev]]
+    if method == 'ratio':
+        steps = np.ones(n)
+        steps[rows] = new_close / old_close
+        # 第i天的比例 = 之后所有换月比例之积
+        return np.concatenate((np.cumprod(steps[::-1])[::-1][1:], [1.0]))
+    steps = np.zeros(n)
+    if method == 'difference':
+        steps[rows] = new_close - old_close
+    return np.concatenate((np.cumsum(steps[::-1])[::-1][1:], [0.0]))
+
+def build_continuous(symbol: str = 'M', roll: str = 'oi', adjust: str = 'ratio', months_before: int = 1,
+                     data_dir: str = CONTRACT_DATA_DIR) -> pd.DataFrame:
+    """由单月合约日线拼接连续合约
+    Returns:
+        按日期排列的K线，contract 列为当日主力合约，adjustment 列为该日的复权量（差值或比例）
+    """
+    if roll not in ROLL_RULES:
+        raise ValueError(f"不支持的主力合约规则: {roll}，可选: {ROLL_RULES}")
+    if adjust not in ADJUST_METHODS:
+        raise ValueError(f"不支持的复权方式: {adjust}，可选: {ADJUST_METHODS}")
+    contracts = list_contracts(symbol, data_dir)
+    if not contracts:
+        raise FileNotFoundError(f"目录 {data_dir} 中没有品种 {symbol} 的合约日线数据")
+    codes = [code for code, _ in contracts]
+
+    frames = {code: load_dataset(path).set_index('date') for code, path in contracts}
+    dates = pd.DatetimeIndex(sorted(set().union(*(f.index for f in frames.values()))))
+
+    def matrix(column: str, dtype=np.float64) -> np.ndarray:
+        return np.column_stack([
+            frames[code][column].reindex(dates).to_numpy(dtype=dtype) if column in frames[code].columns
+            else np.full(len(dates), np.nan, dtype=dtype)
+            for code in codes
+        ])
+
+    def panel_dtype(column: str):
+        # 各合约该列都已无损压缩为float32时，面板也用float32；换月价差用的收盘价始终为float64
+        if column in ADJUSTED_COLUMNS and column != 'close' and \
+                all(frames[code][column].dtype == np.float32 for code in codes):
+            return np.float32
+        return np.float64
+
+    closes = matrix('close')
+    available = ~np.isnan(closes)
+    metric = None if roll == 'calendar' else matrix('oi' if roll == 'oi' else 'vol')
+    roll_dates = calendar_roll_dates(codes, months_before) if roll == 'calendar' else None
+    active = select_active(dates.values, available, metric, roll, roll_dates)
+
+    rows = np.arange(len(dates))
+    keep = available[rows, active]
+    if not keep.all():
+        logger.warning(f"连续合约 {symbol}: {int((~keep).sum())} 个交易日主力合约无数据，已跳过")
+    rows, active = rows[keep], active[keep]
+    # 换月价差用换月前一日的收盘价，合约个别日期缺失时沿用最近收盘价
+    closes_filled = pd.DataFrame(closes[rows]).ffill().to_numpy()
+    factors = adjustment_factors(closes_filled, active, adjust)
+
+    result = {'date': dates.values[rows]}
+    for column in ADJUSTED_COLUMNS + ('vol', 'amount', 'oi'):
+        if all(column in f.columns for f in frames.values()):
+            values = (closes if column == 'close' else matrix(column, panel_dtype(column)))[rows, active]
+            if column in ADJUSTED_COLUMNS:
+                values = values * factors if adjust == 'ratio' else values + factors
+            result[column] = values
+    result['contract'] = pd.Categorical.from_codes(active, categories=codes)
+    result['adjustment'] = factors
+    return pd.DataFrame(result)
+
+def roll_events(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """连续合约中的换月记录"""
+    contracts = frame['contract'].astype(str).to_numpy()
+    rows = np.flatnonzero(contracts[1:] != contracts[:-1]) + 1
+    return [
+        {
+            'date': pd.Timestamp(frame['date'].iloc[i]).strftime('%Y-%m-%d'),
+            'from_contract': contracts[i - 1],
+            'to_contract': contracts[i],
+            'adjustment': float(frame['adjustment'].iloc[i - 1]),
+        }
+        for i in rows
+    ]
+
+class ContinuousContractService:
+    """连续合约：构建结果按品种、规则和源文件内容物化为CSV，之后通过数据集注册表读取，
+    源数据不变时只构建一次，长周期回测和分析直接读取一段连续的数组"""
+
+    def __init__(self, data_dir: str = CONTRACT_DATA_DIR, cache_dir: str = CONTINUOUS_CACHE_DIR):
+        self.data_dir = data_dir
+        self.cache_dir = Path(cache_dir)
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+        self.logger = logger
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _source_version(self, symbol: str) -> str:
+        digest = hashlib.blake2b(digest_size=8)
+        for code, path in list_contracts(symbol, self.data_dir):
+            digest.update(f"{code}:{dataset_registry.content_hash(path)};".encode())
+        return digest.hexdigest()
+
+    def materialize(self, symbol: str = 'M', roll: str = 'oi', adjust: str = 'ratio', months_before: int = 1) -> Path:
+        """返回物化后的连续合约文件路径，源文件内容或构建参数变化时重新生成"""
+        name = f"{symbol}_{roll}_{adjust}" + (f"_{months_before}m" if roll == 'calendar' else '')
+        version = f"v{CONTINUOUS_BUILD_VERSION}_{self._source_version(symbol)}"
+        path = self.cache_dir / f"{name}_{version}.csv"
+        with self._lock_for(name):
+            if path.exists():
+                return path
+            self.logger.info(f"构建连续合约: {name}")
+            frame = build_continuous(symbol, roll, adjust, months_before, self.data_dir)
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            frame.to_csv(tmp, index=False, date_format='%Y-%m-%d')
+            tmp.replace(path)
+            # 同一参数的旧版本文件不再使用
+            for stale in self.cache_dir.glob(f"{name}_v*.csv"):
+                if stale != path:
+                    stale.unlink(missing_ok=True)
+                    dataset_registry.invalidate(stale)
+            self.logger.info(f"连续合约物化完成: {path}, 行数: {len(frame)}")
+        return path
+
+    def get(self, symbol: str = 'M', roll: str = 'oi', adjust: str = 'ratio', months_before: int = 1) -> pd.DataFrame:
+        """读取连续合约K线（数组只读，与 load_dataset 相同）"""
+        return load_dataset(self.materialize(symbol, roll, adjust, months_before))
+
+# 进程内共享的连续合约服务
+continuous_contracts = ContinuousContractService()
@@ -3,10 +3,9 @@ import json
 import re
 from typing import Dict, Any, Optional
 from openai import OpenAI
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 from config import settings
+from database import engine, SessionLocal, ensure_schema
 from utils.logger import logger
 from models.core_factor import Base, CoreFactorAnalysisDB, CoreFactorAnalysis
 
@@ -17,9 +16,9 @@ class CoreFactorAnalyzer:
             api_key=settings.DEEPSEEK_API_KEY,
             base_url="https://ark.cn-beijing.volces.com/api/v3/bots"
         )
-        self.engine = create_engine(settings.DATABASE_URL or "sqlite:///./trading.db")
-        Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.engine = engine
+        ensure_schema(Base.metadata)
+        self.SessionLocal = SessionLocal
 
     async def _get_deepseek_response(self, prompt: str) -> Dict[str, Any]:
         """通用方法获取Deepseek响应"""
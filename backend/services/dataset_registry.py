@@ -0,0 +1,182 @@
+import hashlib
+import io
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from utils.logger import logger
+
+# 统一的列名映射：同花顺导出的中文列名、不同接口的成交量/时间列名
+COLUMN_ALIASES = {
+    '时间': 'date',
+    '开盘': 'open',
+    '收盘': 'close',
+    '最高': 'high',
+    '最低': 'low',
+    '涨跌幅': 'pct_chg',
+    '涨跌额': 'change',
+    '成交量': 'vol',
+    '成交额': 'amount',
+    '振幅': 'amplitude',
+    '换手率': 'turnover',
+    'datetime': 'date',
+    'volume': 'vol',
+}
+
+# 价格列：取值可被float32无损表示时降为float32
+BAR_PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'pre_close', 'pre_settle', 'settle')
+# 计数列：全部为整数且无缺失时转为int64
+BAR_COUNT_COLUMNS = ('vol', 'oi')
+# 取值重复度高的代码列，存为category
+BAR_CATEGORY_COLUMNS = ('ts_code', 'contract')
+# 日期列的表示：datetime64[s]，或 20240101 形式的int32（只按日比较、输出仍为YYYYMMDD字符串的场景）
+DATE_FORMATS = ('datetime', 'yyyymmdd')
+
+def _is_lossless(values: np.ndarray, dtype) -> bool:
+    return bool(np.array_equal(values.astype(dtype).astype(values.dtype), values, equal_nan=True))
+
+def _yyyymmdd(dates: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype(np.int32)
+    return pd.to_numeric(dates.astype(str).str.replace('-', '', regex=False)).astype(np.int32)
+
+def compact_bars(df: pd.DataFrame, date_format: str = 'datetime') -> pd.DataFrame:
+    """压缩K线数据的存储类型：日期为datetime64[s]（或int32的yyyymmdd），价格列在不损失精度时用float32，
+    成交量/持仓量为int64，代码列为category。不能无损转换的列保持float64，回测结果不受影响"""
+    if date_format not in DATE_FORMATS:
+        raise ValueError(f"不支持的日期格式: {date_format}，可选: {DATE_FORMATS}")
+    df = df.copy()
+    if date_format == 'yyyymmdd':
+        df['date'] = _yyyymmdd(df['date'])
+    else:
+        df['date'] = df['date'].astype('datetime64[s]')
+    for col in BAR_PRICE_COLUMNS:
+        if col in df.columns and _is_lossless(df[col].to_numpy(dtype=np.float64), np.float32):
+            df[col] = df[col].astype(np.float32)
+    for col in BAR_COUNT_COLUMNS:
+        if col in df.columns:
+            values = df[col].to_numpy(dtype=np.float64)
+            if not np.isnan(values).any() and _is_lossless(values, np.int64):
+                df[col] = df[col].astype(np.int64)
+    for col in BAR_CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+def normalize_tushare_bars(df: pd.DataFrame, date_format: str = 'yyyymmdd') -> pd.DataFrame:
+    """Tushare 行情接口（fut_daily 等）返回的数据：trade_date 列改名为 date 并按 compact_bars 压缩，
+    默认日期为int32的yyyymmdd，str() 即还原为接口原来的日期字符串。保持接口返回的行顺序"""
+    df = df.rename(columns={'trade_date': 'date'})
+    if date_format == 'datetime':
+        df['date'] = pd.to_datetime(df['date'].astype(str), format='%Y%m%d')
+    return compact_bars(df, date_format)
+
+def normalize_bars(df: pd.DataFrame) -> pd.DataFrame:
+    """把原始CSV数据转换为统一格式：date列为datetime64并升序排列，数值列按 compact_bars 压缩"""
+    df = df.rename(columns=COLUMN_ALIASES)
+    if 'date' not in df.columns:
+        raise ValueError(f"数据缺少日期列: {df.columns.tolist()}")
+
+    if pd.api.types.is_integer_dtype(df['date']):
+        # 日线、周线数据的日期为 20240101 形式的整数
+        df['date'] = pd.to_datetime(df['date'].astype(str), format='%Y%m%d')
+    else:
+        df['date'] = pd.to_datetime(df['date'])
+
+    for col in df.columns:
+        if col != 'date' and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype(np.float64)
+
+    df = df.sort_values('date', kind='mergesort').reset_index(drop=True)
+    return compact_bars(df)
+
+def _freeze(df: pd.DataFrame) -> pd.DataFrame:
+    """按列复制为只读数组重建DataFrame，任何原地写入都会抛出异常，避免请求之间相互污染"""
+    columns = {}
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # 分类列的编码数组设为只读，类别本身不可变
+            codes = df[col].cat.codes.to_numpy().copy()
+            codes.flags.writeable = False
+            columns[col] = pd.Categorical.from_codes(codes, dtype=df[col].dtype)
+            continue
+        arr = df[col].to_numpy().copy()
+        arr.flags.writeable = False
+        columns[col] = arr
+    return pd.DataFrame(columns, copy=False)
+
+def _fingerprint(path: Path) -> Tuple[int, int]:
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+class DatasetRegistry:
+    """行情CSV文件注册表：每个文件只解析一次，文件修改时间或大小变化后自动重新加载"""
+
+    def __init__(self):
+        self._datasets: Dict[Path, Tuple[Tuple[int, int], pd.DataFrame, str]] = {}
+        self._locks: Dict[Path, threading.Lock] = {}
+        self._guard = threading.Lock()
+        self.logger = logger
+
+    def _lock_for(self, key: Path) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _entry(self, path: Union[str, Path]) -> Tuple[Tuple[int, int], pd.DataFrame, str]:
+        key = Path(path).resolve()
+        if not key.exists():
+            raise FileNotFoundError(f"数据文件不存在: {path}")
+
+        with self._lock_for(key):
+            fingerprint = _fingerprint(key)
+            cached = self._datasets.get(key)
+            if cached is None or cached[0] != fingerprint:
+                self.logger.info(f"加载数据集: {path}")
+                raw = key.read_bytes()
+                content_hash = hashlib.blake2b(raw, digest_size=16).hexdigest()
+                frame = _freeze(normalize_bars(pd.read_csv(io.BytesIO(raw))))
+                cached = (fingerprint, frame, content_hash)
+                self._datasets[key] = cached
+                self.logger.info(f"数据集加载完成: {path}, 行数: {len(frame)}")
+        return cached
+
+    def get(self, path: Union[str, Path]) -> pd.DataFrame:
+        """获取数据集
+        Args:
+            path: CSV文件路径
+        Returns:
+            底层数组只读的浅拷贝，调用方可以新增或替换列，但不能原地修改已有数据
+        Raises:
+            FileNotFoundError: 文件不存在
+        """
+        return self._entry(path)[1].copy(deep=False)
+
+    def content_hash(self, path: Union[str, Path]) -> str:
+        """数据文件内容的哈希，文件变化后随之变化，可作为下游缓存的数据版本"""
+        return self._entry(path)[2]
+
+    def invalidate(self, path: Optional[Union[str, Path]] = None) -> None:
+        """清除指定文件或全部数据集的缓存"""
+        with self._guard:
+            if path is None:
+                self._datasets.clear()
+            else:
+                self._datasets.pop(Path(path).resolve(), None)
+
+    def stats(self) -> Dict[str, int]:
+        datasets = list(self._datasets.values())
+        return {
+            'datasets': len(datasets),
+            'rows': sum(len(frame) for _, frame, _ in datasets),
+            'bytes': int(sum(frame.memory_usage(deep=False).sum() for _, frame, _ in datasets)),
+        }
+
+# 进程内共享的注册表实例
+dataset_registry = DatasetRegistry()
+
+def load_dataset(path: Union[str, Path]) -> pd.DataFrame:
+    """从共享注册表读取数据集"""
+    return dataset_registry.get(path)
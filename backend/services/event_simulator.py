@@ -0,0 +1,280 @@
+import math
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from services.dataset_registry import normalize_bars
+from utils.logger import logger
+from utils.streaming_indicators import ATR, EMA
+
+# 每次从CSV读取的K线数，决定模拟器的峰值内存
+DEFAULT_CHUNK_SIZE = 50000
+# 资金曲线保留的最大点数，超出后相邻点两两合并
+EQUITY_CURVE_MAX_POINTS = 2000
+
+class Bar(NamedTuple):
+    date: pd.Timestamp
+    open: float
+    high: float
+    low: float
+    close: float
+    vol: float
+
+def iter_bar_chunks(path: Union[str, Path], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    on_progress: Optional[Callable[[float], None]] = None) -> Iterator[pd.DataFrame]:
+    """按固定行数分块读取K线CSV，每块按 normalize_bars 统一列名和类型
+    Args:
+        path: CSV文件路径，文件需按时间升序排列
+        chunk_size: 每块行数
+        on_progress: 每读完一块调用 on_progress(已读字节占比)
+    Raises:
+        ValueError: 相邻两块的时间不连续递增
+    """
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"数据文件不存在: {path}")
+    total_bytes = max(path.stat().st_size, 1)
+    last_date = None
+    with open(path, 'rb') as f:
+        for raw in pd.read_csv(f, chunksize=chunk_size):
+            chunk = normalize_bars(raw)
+            if last_date is not None and len(chunk) and chunk['date'].iloc[0] <= last_date:
+                raise ValueError(f"数据未按时间升序排列: {chunk['date'].iloc[0]} 不晚于 {last_date}")
+            if len(chunk):
+                last_date = chunk['date'].iloc[-1]
+            if on_progress is not None:
+                on_progress(min(f.tell() / total_bytes, 1.0))
+            yield chunk
+
+def iter_bars(chunk: pd.DataFrame) -> Iterator[Bar]:
+    """把一块数据转为逐根K线，价格统一为float64"""
+    vol = chunk['vol'].to_numpy(dtype=np.float64) if 'vol' in chunk.columns else np.zeros(len(chunk))
+    columns = [chunk[c].to_numpy(dtype=np.float64) for c in ('open', 'high', 'low', 'close')]
+    for values in zip(chunk['date'], *columns, vol):
+        yield Bar(*values)
+
+class EquityRecorder:
+    """固定容量的资金曲线记录器：点数超过上限时相邻两段合并，
+    每段保留起始时间、最低、最高和期末净值，长历史下内存不变且不丢失极值"""
+
+    def __init__(self, max_points: int = EQUITY_CURVE_MAX_POINTS):
+        self.max_points = max(2, max_points)
+        self.width = 1      # 每段最多包含的K线数
+        self.segments: List[List[Any]] = []     # [起始时间, 最低, 最高, 期末, K线数]
+
+    def add(self, date: pd.Timestamp, equity: float) -> None:
+        if self.segments and self.segments[-1][4] < self.width:
+            seg = self.segments[-1]
+            seg[1] = min(seg[1], equity)
+            seg[2] = max(seg[2], equity)
+            seg[3] = equity
+            seg[4] += 1
+            return
+        self.segments.append([date, equity, equity, equity, 1])
+        if len(self.segments) > self.max_points:
+            merged = []
+            for i in range(0, len(self.segments) - 1, 2):
+                a, b = self.segments[i], self.segments[i + 1]
+                merged.append([a[0], min(a[1], b[1]), max(a[2], b[2]), b[3], a[4] + b[4]])
+            if len(self.segments) % 2:
+                merged.append(self.segments[-1])
+            self.segments = merged
+            self.width *= 2
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [
+            {'date': seg[0].strftime('%Y-%m-%d %H:%M'), 'low': seg[1], 'high': seg[2], 'equity': seg[3]}
+            for seg in self.segments
+        ]
+
+class SimBroker:
+    """模拟撮合：市价单按当前K线收盘价成交，止损/止盈挂单在之后的K线内按最高/最低价触发，
+    跳空越过挂单价时按开盘价成交；同一根K线同时触及止损和止盈时保守地按止损处理"""
+
+    def __init__(self, initial_capital: float = 100000.0, multiplier: float = 1.0, commission_rate: float = 0.0):
+        self.initial_capital = initial_capital
+        self.multiplier = multiplier
+        self.commission_rate = commission_rate
+        self.cash = initial_capital         # 已实现权益
+        self.position = 0                   # 带方向的持仓手数
+        self.entry_price = 0.0
+        self.entry_date = None
+        self.stop_price: Optional[float] = None
+        self.take_profit: Optional[float] = None
+        self.trades: List[Dict[str, Any]] = []
+        self.bar: Optional[Bar] = None
+
+    def equity(self, price: float) -> float:
+        return self.cash + self.position * (price - self.entry_price) * self.multiplier
+
+    def _commission(self, price: float, qty: int) -> float:
+        return abs(qty) * price * self.multiplier * self.commission_rate
+
+    def open(self, qty: int, stop_price: Optional[float] = None, take_profit: Optional[float] = None) -> None:
+        """按当前K线收盘价开仓，qty为正做多、为负做空；已有持仓时先平仓"""
+        if qty == 0:
+            return
+        if self.position != 0:
+            self.close('reverse')
+        bar = self.bar
+        self.cash -= self._commission(bar.close, qty)
+        self.position = qty
+        self.entry_price = bar.close
+        self.entry_date = bar.date
+        self.stop_price = stop_price
+        self.take_profit = take_profit
+
+    def close(self, reason: str = 'signal', price: Optional[float] = None) -> None:
+        if self.position == 0:
+            return
+        bar = self.bar
+        price = bar.close if price is None else price
+        pnl = self.position * (price - self.entry_price) * self.multiplier
+        commission = self._commission(price, self.position)
+        self.cash += pnl - commission
+        self.trades.append({
+            'entry_date': self.entry_date.strftime('%Y-%m-%d %H:%M'),
+            'entry_price': float(self.entry_price),
+            'exit_date': bar.date.strftime('%Y-%m-%d %H:%M'),
+            'exit_price': float(price),
+            'position': 'long' if self.position > 0 else 'short',
+            'lots': abs(self.position),
+            'pnl': float(pnl),
+            'commission': float(commission),
+            'exit_type': reason,
+        })
+        self.position = 0
+        self.stop_price = None
+        self.take_profit = None
+
+    def check_orders(self, bar: Bar) -> None:
+        """在K线内检查止损止盈挂单"""
+        if self.position == 0:
+            return
+        long = self.position > 0
+        stop, tp = self.stop_price, self.take_profit
+        if stop is not None:
+            if long and bar.open <= stop or not long and bar.open >= stop:
+                self.close('stop_loss', bar.open)
+                return
+            if long and bar.low <= stop or not long and bar.high >= stop:
+                self.close('stop_loss', stop)
+                return
+        if tp is not None:
+            if long and bar.open >= tp or not long and bar.open <= tp:
+                self.close('take_profit', bar.open)
+            elif long and bar.high >= tp or not long and bar.low <= tp:
+                self.close('take_profit', tp)
+
+class StreamStrategy:
+    """事件驱动策略基类：指标使用流式指标增量更新，状态保存在实例上，跨数据块自然延续"""
+
+    def on_bar(self, bar: Bar, broker: SimBroker) -> None:
+        raise NotImplementedError
+
+class DualMAStreamStrategy(StreamStrategy):
+    """双均线流式版本：金叉开多、死叉平仓，开仓时按ATR挂止损和止盈单"""
+
+    def __init__(self, fast_period: int = 8, slow_period: int = 21, atr_period: int = 10,
+                 stop_atr: float = 2.0, take_profit_atr: float = 1.1, position_ratio: float = 0.95):
+        self.fast = EMA(timeperiod=fast_period)
+        self.slow = EMA(timeperiod=slow_period)
+        self.atr = ATR(timeperiod=atr_period)
+        self.stop_atr = stop_atr
+        self.take_profit_atr = take_profit_atr
+        self.position_ratio = position_ratio
+        self.prev_diff = math.nan
+
+    def on_bar(self, bar: Bar, broker: SimBroker) -> None:
+        fast = self.fast.update(bar.close)
+        slow = self.slow.update(bar.close)
+        atr = self.atr.update(bar.high, bar.low, bar.close)
+        diff = fast - slow
+        prev_diff, self.prev_diff = self.prev_diff, diff
+        if math.isnan(diff) or math.isnan(prev_diff):
+            return
+
+        if broker.position == 0 and diff > 0 and prev_diff <= 0:
+            lots = int(broker.equity(bar.close) * self.position_ratio / (bar.close * broker.multiplier))
+            if lots > 0 and not math.isnan(atr):
+                broker.open(lots, stop_price=bar.close - atr * self.stop_atr,
+                            take_profit=bar.close + atr * self.take_profit_atr)
+        elif broker.position > 0 and diff < 0 and prev_diff >= 0:
+            broker.close('signal')
+
+STREAM_STRATEGIES = {
+    'dual_ma': DualMAStreamStrategy,
+}
+
+class EventSimulator:
+    """分块事件驱动回测：逐块读取CSV、逐根K线驱动策略和撮合，
+    收益统计和资金曲线均为增量计算，峰值内存只与块大小有关，与历史长度无关"""
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE, max_points: int = EQUITY_CURVE_MAX_POINTS):
+        self.chunk_size = chunk_size
+        self.max_points = max_points
+        self.logger = logger
+
+    def run(self, path: Union[str, Path], strategy: StreamStrategy, broker: SimBroker,
+            on_progress: Optional[Callable[[float], None]] = None) -> Dict[str, Any]:
+        recorder = EquityRecorder(self.max_points)
+        bars = 0
+        first_date = last_date = None
+        prev_equity = broker.initial_capital
+        peak = broker.initial_capital
+        max_drawdown = 0.0
+        # Welford 增量均值和方差，用于逐K线收益率的夏普比率
+        mean = m2 = 0.0
+        n_returns = 0
+
+        for chunk in iter_bar_chunks(path, self.chunk_size, on_progress):
+            for bar in iter_bars(chunk):
+                broker.bar = bar
+                broker.check_orders(bar)
+                strategy.on_bar(bar, broker)
+
+                equity = broker.equity(bar.close)
+                recorder.add(bar.date, equity)
+                peak = max(peak, equity)
+                max_drawdown = max(max_drawdown, (peak - equity) / peak if peak > 0 else 0.0)
+                if prev_equity > 0:
+                    ret = equity / prev_equity - 1
+                    n_returns += 1
+                    delta = ret - mean
+                    mean += delta / n_returns
+                    m2 += delta * (ret - mean)
+                prev_equity = equity
+                if first_date is None:
+                    first_date = bar.date
+                last_date = bar.date
+                bars += 1
+
+        if bars == 0:
+            raise ValueError(f"数据文件为空: {path}")
+        if broker.position != 0:
+            broker.close('last_position')
+        final_equity = broker.cash
+
+        years = (last_date - first_date).days / 365.0
+        std = math.sqrt(m2 / n_returns) if n_returns > 1 else 0.0
+        periods_per_year = bars / years if years > 0 else 252.0
+        total_returns = final_equity / broker.initial_capital - 1
+        wins = sum(1 for t in broker.trades if t['pnl'] > 0)
+        self.logger.info(f"分块回测完成: 文件={path}, K线数={bars}, 交易次数={len(broker.trades)}, 总收益率={total_returns:.2%}")
+        return {
+            'bars': bars,
+            'start': first_date.strftime('%Y-%m-%d %H:%M'),
+            'end': last_date.strftime('%Y-%m-%d %H:%M'),
+            'total_returns': float(total_returns),
+            'annual_returns': float((1 + total_returns) ** (1 / years) - 1) if years > 0 and total_returns > -1 else 0.0,
+            'sharpe_ratio': float(mean / std * math.sqrt(periods_per_year)) if std > 0 else 0.0,
+            'max_drawdown': float(max_drawdown),
+            'win_rate': wins / len(broker.trades) if broker.trades else 0.0,
+            'total_profit': float(sum(t['pnl'] for t in broker.trades)),
+            'commission': float(sum(t['commission'] for t in broker.trades)),
+            'final_assets': float(final_equity),
+            'equity_curve': recorder.to_list(),
+            'trades': broker.trades,
+        }
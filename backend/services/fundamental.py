@@ -5,10 +5,9 @@ from typing import Dict, Any, Optional
 from utils.logger import logger
 from openai import OpenAI
 from config import settings
+from database import engine, SessionLocal, ensure_schema
 import json
 import re
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from models.fundamental import Base, FundamentalAnalysisDB, FundamentalAnalysis
 
 class FundamentalAnalyzer:
@@ -18,9 +17,9 @@ class FundamentalAnalyzer:
             api_key=settings.DEEPSEEK_API_KEY,
             base_url="https://ark.cn-beijing.volces.com/api/v3/bots"
         )
-        self.engine = create_engine(settings.DATABASE_URL or "sqlite:///./trading.db")
-        Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.engine = engine
+        ensure_schema(Base.metadata)
+        self.SessionLocal = SessionLocal
 
     def get_fundamental_data(self, date: str) -> Optional[FundamentalAnalysis]:
         """从数据库获取指定日期的基本面数据"""
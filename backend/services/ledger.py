@@ -0,0 +1,560 @@
+import fcntl
+import itertools
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass, field, replace
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from config import get_multiplier, is_futures
+from database import BACKEND_DIR, engine, SessionLocal, ensure_schema
+from models.account import AccountDB
+from models.position import PositionDB
+from models.signals import Base as SignalBase, Signal, SignalDB, SignalStatus
+from services.account import AccountService
+from services.backtest_cache import json_default
+from utils.logger import logger
+
+# 账本日志目录：已在内存中生效、尚未写入数据库的变更先追加到这里，进程崩溃后启动时重放。
+# 与数据库一样按后端目录解析，从其他目录重启时也能找到上次未写库的日志
+LEDGER_JOURNAL_DIR = os.path.join(BACKEND_DIR, 'journal', 'ledger')
+# 每次追加日志后是否fsync，关闭后吞吐更高，但掉电时可能丢失最后几条
+LEDGER_JOURNAL_FSYNC = True
+# 后台写库间隔（秒）
+LEDGER_FLUSH_INTERVAL = 0.5
+# 待写信号达到该条数时立即唤醒写库线程
+LEDGER_FLUSH_BATCH = 500
+# 交易手续费率
+COMMISSION_RATE = 0.0003
+# 期货保证金比例，股票需全额资金
+FUTURES_MARGIN_RATE = 0.1
+# 按id批量查询信号时每次的条数，避免超出SQLite参数个数上限
+SIGNAL_QUERY_CHUNK = 500
+
+ACTIVE_POSITION_STATUSES = ('open', 'partial_closed')
+SIGNAL_DATETIME_FIELDS = ('date', 'close_date', 'created_at', 'updated_at')
+ACCOUNT_FIELDS = ('current_balance', 'available_balance', 'total_profit', 'total_commission',
+                  'position_cost', 'position_quantity')
+
+def trade_multiplier(symbol: str) -> int:
+    """计算盈亏使用的乘数：期货为合约乘数，股票为10"""
+    return get_multiplier(symbol.split('-')[1]) if is_futures(symbol) else 10
+
+@dataclass
+class AccountState:
+    id: int
+    initial_balance: float
+    current_balance: float
+    available_balance: float
+    total_profit: float
+    total_commission: float
+    position_cost: float
+    position_quantity: int
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+@dataclass
+class PositionState:
+    symbol: str
+    price: float
+    quantity: int
+    status: str = 'open'
+    id: Optional[int] = None  # 写入数据库前为空
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+@dataclass
+class OpenSignalRef:
+    """平仓时待匹配的开仓信号"""
+    id: str
+    type: str
+    status: str
+
+class TradeOutcome(NamedTuple):
+    signal: Signal  # 计算后的信号
+    applied: bool  # 是否更新了持仓和账户
+    message: Optional[str]
+    position_quantity: int  # 处理后该品种的持仓数量
+
+@dataclass
+class _Work:
+    """一批信号的工作副本，全部计算成功后才并入账本"""
+    account: AccountState
+    positions: Dict[str, Optional[PositionState]] = field(default_factory=dict)
+    open_signals: Dict[str, Dict[str, OpenSignalRef]] = field(default_factory=dict)
+    signals: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+def _parse_signal_fields(fields: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: datetime.fromisoformat(v) if k in SIGNAL_DATETIME_FIELDS and isinstance(v, str) else v
+            for k, v in fields.items()}
+
+class Ledger:
+    """进程内账本：账户、持仓和待平的开仓信号常驻内存，读取不访问数据库。
+    交易在账户锁内计算，变更先追加到日志（预写），再由后台线程合并后在一个事务中写入数据库；
+    启动时先重放未写库的日志。账户表只有一行，一把锁即为账户锁"""
+
+    def __init__(self, journal_dir: str = LEDGER_JOURNAL_DIR):
+        self.engine = engine
+        self.SessionLocal = SessionLocal
+        self.logger = logger
+        self.journal_dir = Path(journal_dir)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._journal = None
+        self._owner_lock = None  # 账本目录的排他锁文件，持有期间本进程独占账本
+        self._seq = 0
+        self._loaded = False
+        self._account: Optional[AccountState] = None
+        self._positions: Dict[str, PositionState] = {}
+        self._open_signals: Dict[str, Dict[str, OpenSignalRef]] = {}
+        # 待写库的变更：账户是否变化、变化的持仓品种、信号id -> 字段（新信号为完整字段，状态更新只含变化字段）
+        self._account_dirty = False
+        self._dirty_positions: set = set()
+        self._pending_signals: Dict[str, Dict[str, Any]] = {}
+
+    # ---------- 读取 ----------
+
+    def get_account(self) -> AccountState:
+        with self._lock:
+            self._ensure_loaded()
+            return replace(self._account)
+
+    def get_position(self, symbol: str) -> Optional[PositionState]:
+        with self._lock:
+            self._ensure_loaded()
+            position = self._positions.get(symbol)
+            return replace(position) if position else None
+
+    def get_positions(self) -> List[PositionState]:
+        with self._lock:
+            self._ensure_loaded()
+            return [replace(p) for p in self._positions.values()]
+
+    def get_position_sides(self) -> Dict[str, int]:
+        """各持仓的方向：未平的开仓信号全部为卖出开仓时为空头(-1)，否则为多头(1)"""
+        with self._lock:
+            self._ensure_loaded()
+            sides = {}
+            for symbol in self._positions:
+                types = {ref.type for ref in self._load_open_signals(symbol).values()}
+                sides[symbol] = -1 if types == {'SELL_OPEN'} else 1
+            return sides
+
+    # ---------- 交易 ----------
+
+    def apply_signals(self, signals: List[Signal], sync: bool = True) -> List[TradeOutcome]:
+        """按给定顺序计算一批信号，规则与逐条计算时相同。
+        整批在内存中原子生效：任一信号出错时账本不变；成功后整批作为一条日志追加。
+        sync=False 时日志只写入不落盘，由调用方随后调用 sync_journal 合并落盘"""
+        with self._lock:
+            self._ensure_loaded()
+            work = _Work(account=replace(self._account))
+            outcomes = [self._apply(signal, work) for signal in signals]
+            # 批内开仓信号可能被之后的平仓信号更新了状态
+            outcomes = [o._replace(signal=o.signal.copy(update={'status': SignalStatus(work.signals[o.signal.id]['status'])}))
+                        for o in outcomes]
+            now = datetime.now()
+            work.account.updated_at = now
+            self._append_journal({
+                'account': {k: getattr(work.account, k) for k in ACCOUNT_FIELDS},
+                'positions': {s: asdict(p) if p else None for s, p in work.positions.items()},
+                'signals': work.signals,
+            }, sync)
+            self._merge(work)
+            pending = len(self._pending_signals)
+        self._start_flusher()
+        if pending >= LEDGER_FLUSH_BATCH:
+            self._wakeup.set()
+        return outcomes
+
+    def adjust_balance(self, profit: float, commission: float) -> AccountState:
+        """直接调整账户盈亏和手续费（手工平仓等不经过持仓计算的场景）"""
+        with self._lock:
+            self._ensure_loaded()
+            work = _Work(account=replace(self._account))
+            work.account.current_balance += profit
+            work.account.available_balance += profit
+            work.account.total_profit += profit
+            work.account.total_commission += commission
+            self._append_journal({'account': {k: getattr(work.account, k) for k in ACCOUNT_FIELDS},
+                                  'positions': {}, 'signals': {}})
+            self._merge(work)
+            account = replace(self._account)
+        self._start_flusher()
+        return account
+
+    def invalidate_open_signals(self, symbol: str) -> None:
+        """信号被直接修改或删除后调用，下次用到该品种时从数据库重新加载"""
+        with self._lock:
+            self._open_signals.pop(symbol, None)
+
+    def _position(self, symbol: str, work: _Work) -> Optional[PositionState]:
+        if symbol not in work.positions:
+            position = self._positions.get(symbol)
+            work.positions[symbol] = replace(position) if position else None
+        return work.positions[symbol]
+
+    def _symbol_open_signals(self, symbol: str, work: _Work) -> Dict[str, OpenSignalRef]:
+        """返回本批内该品种变化或新增的开仓信号（写时复制，不复制账本中的全部开仓信号）"""
+        self._load_open_signals(symbol)
+        return work.open_signals.setdefault(symbol, {})
+
+    def _load_open_signals(self, symbol: str) -> Dict[str, OpenSignalRef]:
+        if symbol not in self._open_signals:
+            # 同一品种的新信号都在加载之后产生，此时数据库中的开仓信号是完整的
+            db = self.SessionLocal()
+            try:
+                rows = db.query(SignalDB.id, SignalDB.type, SignalDB.status).filter(
+                    SignalDB.symbol == symbol,
+                    SignalDB.type.in_(['BUY_OPEN', 'SELL_OPEN']),
+                    SignalDB.status.in_(['open', 'partial_closed'])
+                ).all()
+            finally:
+                db.close()
+            self._open_signals[symbol] = {
+                row.id: OpenSignalRef(row.id, row.type.value, row.status.value) for row in rows
+            }
+        return self._open_signals[symbol]
+
+    def _match_open_signal(self, symbol: str, work: _Work, open_type: str,
+                           statuses: tuple) -> Optional[OpenSignalRef]:
+        """按开仓先后找到第一个可平的开仓信号，返回其在本批内的可修改副本"""
+        changed = self._symbol_open_signals(symbol, work)
+        base = self._open_signals[symbol]
+        candidates = itertools.chain((changed.get(ref_id, ref) for ref_id, ref in base.items()),
+                                     (ref for ref_id, ref in changed.items() if ref_id not in base))
+        for ref in candidates:
+            if ref.type == open_type and ref.status in statuses:
+                if ref.id not in changed:
+                    changed[ref.id] = replace(ref)
+                return changed[ref.id]
+        return None
+
+    def _apply(self, signal: Signal, work: _Work) -> TradeOutcome:
+        symbol = signal.symbol
+        account = work.account
+        position = self._position(symbol, work)
+        trade_amount = signal.price * signal.quantity
+        commission = trade_amount * COMMISSION_RATE
+        is_futures_symbol = is_futures(symbol)
+        multiplier = trade_multiplier(symbol)
+        updates: Dict[str, Any] = {}
+
+        if signal.type in ('BUY_OPEN', 'SELL_OPEN'):
+            if position:
+                # 已有持仓，更新持仓成本
+                total_quantity = position.quantity + signal.quantity
+                position.price = (position.price * position.quantity + trade_amount) / total_quantity
+                position.quantity = total_quantity
+            else:
+                position = PositionState(symbol=symbol, price=signal.price, quantity=signal.quantity)
+                work.positions[symbol] = position
+            cost = trade_amount * FUTURES_MARGIN_RATE if is_futures_symbol else trade_amount
+            account.available_balance -= (cost + commission)
+            account.total_commission += commission
+            self._symbol_open_signals(symbol, work)[signal.id] = OpenSignalRef(
+                signal.id, signal.type.value, signal.status.value)
+        elif position:
+            # 买入平仓对应卖出开仓，卖出平仓对应买入开仓
+            if signal.type == 'BUY_CLOSE':
+                profit = (position.price - signal.price) * signal.quantity * multiplier
+                open_type = 'SELL_OPEN'
+            else:
+                profit = (signal.price - position.price) * signal.quantity * multiplier
+                open_type = 'BUY_OPEN'
+            position.quantity -= signal.quantity
+            if position.quantity <= 0:
+                work.positions[symbol] = position = None
+                status = SignalStatus.CLOSED
+                matched_status = ('open', 'partial_closed')
+            else:
+                position.status = 'partial_closed'
+                status = SignalStatus.PARTIAL_CLOSED
+                matched_status = ('open',)
+            open_signal = self._match_open_signal(symbol, work, open_type, matched_status)
+            if open_signal is not None:
+                open_signal.status = status.value
+                work.signals.setdefault(open_signal.id, {})['status'] = status.value
+            updates = {'status': status, 'profit': profit, 'close_price': signal.price, 'close_date': signal.date}
+            # 平仓盈亏计入已实现盈亏和账户余额，与 adjust_balance 的口径一致
+            account.current_balance += profit
+            account.available_balance += profit
+            account.total_profit += profit
+            account.total_commission += commission
+        else:
+            result = signal.copy(update={'updated_at': datetime.now()})
+            work.signals[signal.id] = result.dict()
+            return TradeOutcome(result, False, "无对应持仓，未计算盈亏", 0)
+
+        result = signal.copy(update={**updates, 'updated_at': datetime.now()})
+        # 信号可能在同一批内先被后续平仓更新过状态，以批内最新状态为准
+        work.signals[signal.id] = {**result.dict(), **work.signals.get(signal.id, {})}
+        return TradeOutcome(result, True, None, position.quantity if position else 0)
+
+    def _merge(self, work: _Work) -> None:
+        self._account = work.account
+        self._account_dirty = True
+        for symbol, position in work.positions.items():
+            if position is None:
+                self._positions.pop(symbol, None)
+            else:
+                self._positions[symbol] = position
+            self._dirty_positions.add(symbol)
+        for symbol, refs in work.open_signals.items():
+            base = self._open_signals[symbol]
+            for ref_id, ref in refs.items():
+                if ref.status in ('open', 'partial_closed'):
+                    base[ref_id] = ref
+                else:
+                    base.pop(ref_id, None)
+        for signal_id, fields in work.signals.items():
+            self._pending_signals[signal_id] = {**self._pending_signals.get(signal_id, {}), **fields}
+
+    # ---------- 日志 ----------
+
+    def _journal_file(self) -> Path:
+        return self.journal_dir / 'journal.jsonl'
+
+    def sync_journal(self) -> None:
+        """把已追加的日志落盘"""
+        with self._lock:
+            if self._journal is not None and LEDGER_JOURNAL_FSYNC:
+                os.fsync(self._journal.fileno())
+
+    def _append_journal(self, entry: Dict[str, Any], sync: bool = True) -> None:
+        if self._journal is None:
+            self.journal_dir.mkdir(parents=True, exist_ok=True)
+            self._journal = open(self._journal_file(), 'a', encoding='utf-8')
+        self._seq += 1
+        self._journal.write(json.dumps({'seq': self._seq, **entry}, default=json_default) + '\n')
+        self._journal.flush()
+        if sync and LEDGER_JOURNAL_FSYNC:
+            os.fsync(self._journal.fileno())
+
+    def _rotate_journal(self) -> Optional[Path]:
+        """把当前日志换成分段文件，返回分段路径；该分段内的变更写库成功后删除"""
+        if self._journal is None:
+            return None
+        if LEDGER_JOURNAL_FSYNC:
+            os.fsync(self._journal.fileno())
+        self._journal.close()
+        self._journal = None
+        segment = self.journal_dir / f'journal.{self._seq:012d}.jsonl'
+        self._journal_file().replace(segment)
+        return segment
+
+    def _journal_segments(self) -> List[Path]:
+        if not self.journal_dir.exists():
+            return []
+        segments = sorted(self.journal_dir.glob('journal.*.jsonl'))
+        current = self._journal_file()
+        return segments + ([current] if current.exists() else [])
+
+    def _acquire_owner_lock(self) -> None:
+        """独占账本目录：多个进程（如 uvicorn --workers）各自持有内存账本会互相覆盖账户和持仓，
+        第二个进程取锁失败时直接报错，不能带着过期的内存状态继续交易"""
+        if self._owner_lock is not None:
+            return
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.journal_dir / 'ledger.lock', 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(f"账本已被其他进程占用: {self.journal_dir}，请以单进程方式运行后端")
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._owner_lock = lock_file
+
+    def _release_owner_lock(self) -> None:
+        if self._owner_lock is not None:
+            # 关闭文件即释放flock
+            self._owner_lock.close()
+            self._owner_lock = None
+
+    def _recover(self) -> None:
+        """重放上次运行未写库的日志；各条目都是变更后的状态，重复重放结果不变"""
+        segments = self._journal_segments()
+        if not segments:
+            return
+        account, positions, signals = None, {}, {}
+        count = 0
+        for path in segments:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 崩溃时未写完的最后一行
+                        self.logger.warning(f"跳过不完整的账本日志: {path}")
+                        continue
+                    count += 1
+                    if entry.get('account'):
+                        account = entry['account']
+                    positions.update(entry.get('positions', {}))
+                    for signal_id, fields in entry.get('signals', {}).items():
+                        signals[signal_id] = {**signals.get(signal_id, {}), **_parse_signal_fields(fields)}
+        self._write(account, positions, signals)
+        for path in segments:
+            path.unlink()
+        self.logger.info(f"账本日志重放完成: {count}条, 持仓{len(positions)}个, 信号{len(signals)}条")
+
+    # ---------- 加载与写库 ----------
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        ensure_schema(AccountDB.metadata)
+        ensure_schema(PositionDB.metadata)
+        ensure_schema(SignalBase.metadata)
+        self._acquire_owner_lock()
+        AccountService()  # 确保账户已初始化
+        self._recover()
+        db = self.SessionLocal()
+        try:
+            row = db.query(AccountDB).first()
+            self._account = AccountState(**{c: getattr(row, c) for c in AccountState.__dataclass_fields__})
+            self._positions = {}
+            for row in db.query(PositionDB).filter(PositionDB.status.in_(ACTIVE_POSITION_STATUSES)):
+                self._positions.setdefault(row.symbol, PositionState(
+                    symbol=row.symbol, price=row.price, quantity=row.quantity, status=row.status,
+                    id=row.id, created_at=row.created_at, updated_at=row.updated_at))
+        finally:
+            db.close()
+        self._loaded = True
+        self.logger.info(f"账本加载完成: 可用资金={self._account.available_balance}, 持仓{len(self._positions)}个")
+
+    def _write(self, account: Optional[Dict[str, Any]], positions: Dict[str, Optional[Dict[str, Any]]],
+               signals: Dict[str, Dict[str, Any]]) -> Dict[str, int]:
+        """在一个事务中写入账户、持仓（按品种覆盖）和信号（按id插入或更新），返回新建持仓的id"""
+        db = self.SessionLocal()
+        try:
+            if account:
+                row = db.query(AccountDB).first()
+                for k in ACCOUNT_FIELDS:
+                    setattr(row, k, account[k])
+
+            created = {}
+            if positions:
+                rows = {}
+                for row in db.query(PositionDB).filter(PositionDB.symbol.in_(list(positions)),
+                                                       PositionDB.status.in_(ACTIVE_POSITION_STATUSES)):
+                    rows.setdefault(row.symbol, row)
+                for symbol, state in positions.items():
+                    row = rows.get(symbol)
+                    if state is None:
+                        if row is not None:
+                            db.delete(row)
+                    elif row is None:
+                        created[symbol] = PositionDB(symbol=symbol, price=state['price'],
+                                                     quantity=state['quantity'], status=state['status'])
+                        db.add(created[symbol])
+                    else:
+                        row.price, row.quantity, row.status = state['price'], state['quantity'], state['status']
+
+            ids = list(signals)
+            for start in range(0, len(ids), SIGNAL_QUERY_CHUNK):
+                chunk = ids[start:start + SIGNAL_QUERY_CHUNK]
+                existing = {row.id: row for row in db.query(SignalDB).filter(SignalDB.id.in_(chunk))}
+                for signal_id in chunk:
+                    fields = signals[signal_id]
+                    row = existing.get(signal_id)
+                    if row is not None:
+                        for k, v in fields.items():
+                            if k != 'id':
+                                setattr(row, k, v)
+                    elif 'date' in fields:
+                        db.add(SignalDB(**fields))
+                    else:
+                        self.logger.warning(f"待更新的信号不存在: {signal_id}")
+
+            db.flush()
+            created_ids = {symbol: row.id for symbol, row in created.items()}
+            db.commit()
+            return created_ids
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def flush(self) -> int:
+        """把待写变更在一个事务中写入数据库，返回写入的信号条数"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._loaded or not (self._account_dirty or self._dirty_positions or self._pending_signals):
+                    return 0
+                account = {k: getattr(self._account, k) for k in ACCOUNT_FIELDS} if self._account_dirty else None
+                positions = {s: asdict(self._positions[s]) if s in self._positions else None
+                             for s in self._dirty_positions}
+                signals = self._pending_signals
+                self._account_dirty = False
+                self._dirty_positions = set()
+                self._pending_signals = {}
+                segment = self._rotate_journal()
+            try:
+                created_ids = self._write(account, positions, signals)
+            except Exception as e:
+                self.logger.error(f"账本写库失败，稍后重试: {e}", exc_info=True)
+                with self._lock:
+                    # 未写入的变更放回，期间产生的新变更优先
+                    self._account_dirty = self._account_dirty or account is not None
+                    self._dirty_positions |= set(positions)
+                    for signal_id, fields in signals.items():
+                        self._pending_signals[signal_id] = {**fields, **self._pending_signals.get(signal_id, {})}
+                raise
+            if segment is not None:
+                # 之前写库失败留下的分段已随本次写入，一并删除
+                for path in self._journal_segments():
+                    if path != self._journal_file() and path.name <= segment.name:
+                        path.unlink()
+            with self._lock:
+                for symbol, position_id in created_ids.items():
+                    if symbol in self._positions and self._positions[symbol].id is None:
+                        self._positions[symbol].id = position_id
+            return len(signals)
+
+    # ---------- 后台写库 ----------
+
+    def _start_flusher(self) -> None:
+        if self._flusher is not None or self._stopped.is_set():
+            return
+        with self._flush_lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='ledger-flusher', daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(LEDGER_FLUSH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                # 已记录日志，变更仍在内存和日志中，下个周期重试
+                pass
+
+    def close(self) -> None:
+        """停止后台线程并写入全部待写变更"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join()
+            self._flusher = None
+        self.flush()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            self._release_owner_lock()
+            self._loaded = False
+
+# 进程内共享的账本
+ledger = Ledger()
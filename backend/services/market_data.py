@@ -7,6 +7,7 @@ from typing import List, Optional, Dict
 from config import settings
 from models.market_data import FuturesData, ETFData, OptionsData, PriceRangeAnalysis, KlineData, HistoricalBottom, ContractStats
 from utils.logger import logger
+from services.dataset_registry import load_dataset, normalize_tushare_bars
 import time
 import threading
 import os
@@ -195,6 +196,7 @@ class MarketDataService:
             
             logger.info(f"成功获取期货数据，共{len(df)}条记录")
             logger.debug(f"数据示例: \n{df.head()}")
+            df = normalize_tushare_bars(df)
             
             # 处理数据
             futures_data = []
@@ -213,7 +215,7 @@ class MarketDataService:
                 
                 data = {
                     'ts_code': row['ts_code'],
-                    'trade_date': row['trade_date'],
+                    'trade_date': str(row['date']),
                     'pre_close': safe_float(row['pre_close']),
                     'pre_settle': safe_float(row['pre_settle']),
                     'open': safe_float(row['open']),
@@ -1061,7 +1063,7 @@ class MarketDataService:
                         
                         if df is not None and not df.empty:
                             # 过滤掉无效数据（价格为0的数据点）
-                            df = df[df['close'] > 0]
+                            df = normalize_tushare_bars(df[df['close'] > 0])
                             
                             if not df.empty:
                                 # 获取最新的价格数据
@@ -1070,7 +1072,7 @@ class MarketDataService:
                                 # 构建合约数据
                                 contract_data = {
                                     'ts_code': f"{historical_contract}.DCE",
-                                    'trade_date': latest_data['trade_date'],
+                                    'trade_date': str(latest_data['date']),
                                     'pre_close': safe_float(latest_data['pre_close']),
                                     'pre_settle': safe_float(latest_data['pre_settle']),
                                     'open': safe_float(latest_data['open']),
@@ -1092,10 +1094,10 @@ class MarketDataService:
                                 # 添加历史价格数据
                                 for _, row in df.iterrows():
                                     # 过滤日期：只保留10月到8月的数据
-                                    trade_month = int(row['trade_date'][4:6])  # 获取月份
+                                    trade_month = int(row['date']) // 100 % 100  # 获取月份
                                     if 1 <= trade_month <= 8 or trade_month >= 10:  # 只保留1-8月和10-12月的数据
                                         price_data = {
-                                            'date': row['trade_date'],
+                                            'date': str(row['date']),
                                             'open': safe_float(row['open']),
                                             'high': safe_float(row['high']),
                                             'low': safe_float(row['low']),
@@ -1175,7 +1177,7 @@ class MarketDataService:
                     try:
                         file_path = os.path.join(daily_data_dir, file)
                         logger.info(f"读取文件: {file_path}")
-                        df = pd.read_csv(file_path)
+                        df = load_dataset(file_path)
                         logger.info(f"文件 {file} 数据形状: {df.shape}")
                         logger.info(f"文件 {file} 列名: {df.columns.tolist()}")
                         
@@ -1183,8 +1185,6 @@ class MarketDataService:
                         contract = file.split('.')[0]  # 例如：M2401
                         df['contract'] = contract
                         
-                        # 转换日期格式
-                        df['date'] = pd.to_datetime(df['date'], format='%Y%m%d')
                         df['year'] = df['date'].dt.year
                         df['month'] = df['date'].dt.month
                         
@@ -1544,10 +1544,7 @@ class MarketDataService:
             for file in contract_files:
                 try:
                     file_path = os.path.join(daily_data_dir, file)
-                    df = pd.read_csv(file_path)
-                    
-                    # 转换日期格式
-                    df['date'] = pd.to_datetime(df['date'], format='%Y%m%d')
+                    df = load_dataset(file_path)
                     
                     # 过滤日期范围
                     mask = (df['date'] >= start_date) & (df['date'] <= end_date)
@@ -0,0 +1,114 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from utils.logger import logger
+
+MONTE_CARLO_METHODS = ['bootstrap', 'block']
+# 单个批次处理的最大元素数（路径数 x 收益序列长度），控制峰值内存
+MONTE_CARLO_CHUNK_ELEMENTS = 4_000_000
+DEFAULT_PERCENTILES = [5, 25, 50, 75, 95]
+
+def trade_returns_from_pnl(pnls: Sequence[float], initial_capital: float) -> np.ndarray:
+    """按复利把逐笔盈亏换算为收益率：每笔收益率 = 盈亏 / 该笔开仓前的资产"""
+    pnls = np.asarray(pnls, dtype=np.float64)
+    equity_before = initial_capital + np.concatenate(([0.0], np.cumsum(pnls)[:-1]))
+    if np.any(equity_before <= 0):
+        raise ValueError("资产在交易过程中降为0以下，无法换算收益率")
+    return pnls / equity_before
+
+def resample_indices(rng: np.random.Generator, n: int, n_paths: int, block_size: int = 1) -> np.ndarray:
+    """生成重采样的下标矩阵 (n_paths, n)
+    block_size 为1时是普通自助法；大于1时是循环块自助法，保留收益的短期自相关"""
+    if block_size <= 1:
+        return rng.integers(0, n, size=(n_paths, n), dtype=np.int32)
+    n_blocks = -(-n // block_size)
+    starts = rng.integers(0, n, size=(n_paths, n_blocks, 1), dtype=np.int32)
+    idx = (starts + np.arange(block_size, dtype=np.int32)) % n
+    return idx.reshape(n_paths, n_blocks * block_size)[:, :n]
+
+def path_metrics(paths: np.ndarray, periods_per_year: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """对收益率矩阵 (路径数, 期数) 逐行计算期末收益、最大回撤和夏普比率"""
+    equity = np.cumprod(1.0 + paths, axis=1)
+    # 起点净值为1，回撤需要把起点计入历史最高
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+    max_drawdown = np.max((peak - equity) / peak, axis=1)
+
+    std = paths.std(axis=1)
+    mean = paths.mean(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, mean / std, 0.0)
+    if periods_per_year:
+        sharpe = sharpe * np.sqrt(periods_per_year)
+
+    return {
+        'final_return': equity[:, -1] - 1.0,
+        'max_drawdown': max_drawdown,
+        'sharpe_ratio': sharpe,
+    }
+
+def summarize_distribution(values: np.ndarray, percentiles: Sequence[float]) -> Dict[str, float]:
+    points = np.percentile(values, percentiles)
+    summary = {f"p{p:g}": float(v) for p, v in zip(percentiles, points)}
+    summary['mean'] = float(values.mean())
+    summary['std'] = float(values.std())
+    return summary
+
+class MonteCarloService:
+    """回测结果稳健性分析：对逐笔或逐K线收益率做自助法重采样，
+    所有路径在一次矩阵运算中完成，返回各指标的分位数分布"""
+
+    def __init__(self):
+        self.logger = logger
+
+    def run(self, returns: Sequence[float], n_paths: int = 10000, method: str = 'bootstrap',
+            block_size: int = 5, percentiles: Optional[List[float]] = None,
+            periods_per_year: Optional[float] = None, seed: Optional[int] = None) -> Dict[str, Any]:
+        """执行重采样
+        Args:
+            returns: 收益率序列（逐笔交易或逐K线）
+            n_paths: 重采样路径数
+            method: bootstrap 普通自助法 / block 循环块自助法
+            block_size: 块自助法的块长度
+            percentiles: 返回的分位点
+            periods_per_year: 年化夏普比率用的每年期数，为空时返回未年化的夏普比率
+            seed: 随机种子，便于结果复现
+        """
+        if method not in MONTE_CARLO_METHODS:
+            raise ValueError(f"不支持的重采样方法: {method}，可选: {MONTE_CARLO_METHODS}")
+        returns = np.asarray(returns, dtype=np.float64)
+        if returns.ndim != 1 or len(returns) < 2:
+            raise ValueError("收益率序列至少需要2个数据点")
+        if not np.all(np.isfinite(returns)):
+            raise ValueError("收益率序列包含NaN或无穷值")
+        if np.any(returns <= -1):
+            raise ValueError("收益率不能小于等于-100%")
+        percentiles = percentiles or DEFAULT_PERCENTILES
+
+        n = len(returns)
+        block = block_size if method == 'block' else 1
+        rng = np.random.default_rng(seed)
+        chunk = max(1, MONTE_CARLO_CHUNK_ELEMENTS // n)
+        collected: Dict[str, List[np.ndarray]] = {}
+        for start in range(0, n_paths, chunk):
+            size = min(chunk, n_paths - start)
+            paths = returns[resample_indices(rng, n, size, block)]
+            for name, values in path_metrics(paths, periods_per_year).items():
+                collected.setdefault(name, []).append(values)
+        metrics = {name: np.concatenate(parts) for name, parts in collected.items()}
+
+        original = {name: float(values[0]) for name, values in path_metrics(returns[None, :], periods_per_year).items()}
+        self.logger.info(f"蒙特卡洛分析完成: 方法={method}, 路径数={n_paths}, 样本数={n}")
+        return {
+            'method': method,
+            'n_paths': n_paths,
+            'n_returns': n,
+            'block_size': block,
+            'original': original,
+            'distributions': {name: summarize_distribution(values, percentiles) for name, values in metrics.items()},
+            'probability_of_loss': float(np.mean(metrics['final_return'] < 0)),
+            # 原始回测指标在重采样分布中的分位，明显偏高说明回测结果可能过于乐观
+            'original_percentile': {
+                name: float(np.mean(metrics[name] <= original[name]) * 100) for name in metrics
+            },
+        }
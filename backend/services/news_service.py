@@ -1,13 +1,15 @@
+import asyncio
 import tushare as ts
 import pandas as pd
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 import logging
 from config import settings
+from database import engine, SessionLocal, AsyncSessionLocal, ensure_schema
 from utils.logger import logger
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
+from utils.pagination import keyset_query, keyset_result
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index, select, update
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from models.news import FlashNews, NewsArticle
 import json
 from openai import OpenAI
@@ -24,6 +26,10 @@ class FlashNewsDB(Base):
     analysis = Column(Text)
     remarks = Column(Text)
 
+    __table_args__ = (
+        Index('ix_flash_news_datetime_id', 'datetime', 'id'),
+    )
+
 class NewsArticleDB(Base):
     """资讯数据库表"""
     __tablename__ = "news_article"
@@ -35,6 +41,12 @@ class NewsArticleDB(Base):
     analysis = Column(Text)
     remarks = Column(Text)
 
+    __table_args__ = (
+        Index('ix_news_article_datetime_id', 'datetime', 'id'),
+        # 爬虫按标题去重
+        Index('ix_news_article_title', 'title'),
+    )
+
 class NewsService:
     """新闻数据服务"""
     
@@ -51,9 +63,9 @@ class NewsService:
                 logger.info("新闻数据服务初始化完成")
                 
             # 初始化数据库连接
-            self.engine = create_engine(settings.DATABASE_URL or "sqlite:///./trading.db")
-            Base.metadata.create_all(self.engine)
-            self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+            self.engine = engine
+            ensure_schema(Base.metadata)
+            self.SessionLocal = SessionLocal
             logger.info("新闻数据库连接初始化完成")
         except Exception as e:
             logger.error(f"新闻数据服务初始化失败: {e}")
@@ -319,12 +331,12 @@ class NewsService:
         finally:
             db.close()
 
-    def analyze_news_impact(self, news_date: str) -> Dict[str, Any]:
-        """分析新闻对期货价格的影响
-        
+    async def analyze_news_impact_async(self, news_date: str) -> Dict[str, Any]:
+        """分析新闻对期货价格的影响，查询走异步会话
+
         Args:
             news_date: 新闻日期，格式：YYYYMMDD
-            
+
         Returns:
             分析结果
         """
@@ -332,146 +344,144 @@ class NewsService:
             if self.engine is None:
                 logger.error("数据库未初始化，无法分析新闻影响")
                 return {}
-                
-            # 转换日期格式
-            start_date = datetime.strptime(news_date, '%Y%m%d')
-            end_date = start_date + timedelta(days=1)
-            
-            # 转换为字符串格式，用于数据库查询
-            start_date_str = start_date.strftime('%Y-%m-%d %H:%M:%S')
-            end_date_str = end_date.strftime('%Y-%m-%d %H:%M:%S')
 
-            logger.info(f"开始分析{start_date_str}到{end_date_str}的新闻影响")
-                
-            # 从数据库获取指定日期的新闻数据
-            db = self.SessionLocal()
-            news_articles = db.query(NewsArticleDB).filter(
-                NewsArticleDB.datetime >= start_date_str,
-                NewsArticleDB.datetime < end_date_str
-            ).order_by(NewsArticleDB.datetime.desc()).all()
-            
-            # 如果当天没有数据，尝试获取前一天的数据
-            if not news_articles:
-                logger.warning(f"未找到{news_date}的新闻数据，尝试获取前一天的数据")
-                start_date = start_date - timedelta(days=1)
-                end_date = end_date - timedelta(days=1)
-                start_date_str = start_date.strftime('%Y-%m-%d %H:%M:%S')
-                end_date_str = end_date.strftime('%Y-%m-%d %H:%M:%S')
-                news_articles = db.query(NewsArticleDB).filter(
-                    NewsArticleDB.datetime >= start_date_str,
-                    NewsArticleDB.datetime < end_date_str
-                ).order_by(NewsArticleDB.datetime.desc()).all()
-                
+            start_date = datetime.strptime(news_date, '%Y%m%d')
+            async with AsyncSessionLocal() as db:
+                news_articles = await self._articles_between_async(db, start_date, start_date + timedelta(days=1))
+                # 如果当天没有数据，尝试获取前一天的数据
                 if not news_articles:
-                    logger.warning(f"未找到前一天{start_date.strftime('%Y%m%d')}的新闻数据")
-                    return {}
-                
-                # 更新 news_date 为实际找到的日期
-                news_date = start_date.strftime('%Y%m%d')
-                
-            # 分析新闻影响
-            result = {
-                'date': news_date,
-                'news_count': len(news_articles),
-                'price_change': None,
-                'volume_change': None,
-                'analysis': []
-            }
-            
-            # 分析每条新闻
-            for article in news_articles:
-                impact = {
-                    'title': article.title,
-                    'content': article.content,
-                    'datetime': article.datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                }
-                
-                # 解析analysis字段
-                if article.analysis:
-                    try:
-                        analysis_data = json.loads(article.analysis)
-                        impact.update(analysis_data)
-                    except json.JSONDecodeError as e:
-                        logger.error(f"解析analysis字段失败: {e}")
-                        impact['analysis_error'] = "解析分析结果失败"
-                
-                result['analysis'].append(impact)
-                
-            logger.info(f"成功分析{news_date}的新闻影响，共{len(news_articles)}条新闻")
-            return result
-            
+                    logger.warning(f"未找到{news_date}的新闻数据，尝试获取前一天的数据")
+                    start_date = start_date - timedelta(days=1)
+                    news_articles = await self._articles_between_async(db, start_date, start_date + timedelta(days=1))
+                    if not news_articles:
+                        logger.warning(f"未找到前一天{start_date.strftime('%Y%m%d')}的新闻数据")
+                        return {}
+                    news_date = start_date.strftime('%Y%m%d')
+            return self._news_impact(news_date, news_articles)
         except Exception as e:
             logger.error(f"分析新闻影响失败: {e}")
             return {}
-        finally:
-            if 'db' in locals():
-                db.close()
 
-    def get_flash_news(self) -> List[Dict[str, Any]]:
+    @staticmethod
+    async def _articles_between_async(db, start_date: datetime, end_date: datetime) -> List[NewsArticleDB]:
+        return list((await db.scalars(select(NewsArticleDB).where(
+            NewsArticleDB.datetime >= start_date.strftime('%Y-%m-%d %H:%M:%S'),
+            NewsArticleDB.datetime < end_date.strftime('%Y-%m-%d %H:%M:%S')
+        ).order_by(NewsArticleDB.datetime.desc()))).all())
+
+    def _news_impact(self, news_date: str, news_articles: List[NewsArticleDB]) -> Dict[str, Any]:
+        """汇总一天新闻的分析结果"""
+        # 分析新闻影响
+        result = {
+            'date': news_date,
+            'news_count': len(news_articles),
+            'price_change': None,
+            'volume_change': None,
+            'analysis': []
+        }
+        
+        # 分析每条新闻
+        for article in news_articles:
+            impact = {
+                'title': article.title,
+                'content': article.content,
+                'datetime': article.datetime.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            
+            # 解析analysis字段
+            if article.analysis:
+                try:
+                    analysis_data = json.loads(article.analysis)
+                    impact.update(analysis_data)
+                except json.JSONDecodeError as e:
+                    logger.error(f"解析analysis字段失败: {e}")
+                    impact['analysis_error'] = "解析分析结果失败"
+            
+            result['analysis'].append(impact)
+            
+        logger.info(f"成功分析{news_date}的新闻影响，共{len(news_articles)}条新闻")
+        return result
+
+    @staticmethod
+    def _flash_news_dict(news: FlashNewsDB) -> Dict[str, Any]:
+        return {
+            'id': news.id,
+            'datetime': news.datetime.strftime('%Y-%m-%d %H:%M:%S'),
+            'content': news.content,
+            'analysis': news.analysis,
+            'remarks': news.remarks
+        }
+
+    @staticmethod
+    def _news_article_dict(article: NewsArticleDB) -> Dict[str, Any]:
+        return {
+            'id': article.id,
+            'datetime': article.datetime.strftime('%Y-%m-%d %H:%M:%S'),
+            'title': article.title,
+            'content': article.content,
+            'analysis': article.analysis,
+            'remarks': article.remarks
+        }
+
+    async def get_flash_news_async(self) -> List[Dict[str, Any]]:
         """获取快讯数据"""
         try:
             if self.engine is None:
                 logger.error("数据库未初始化，无法获取快讯数据")
                 return []
-                
-            db = self.SessionLocal()
-            flash_news = db.query(FlashNewsDB).order_by(FlashNewsDB.datetime.desc()).all()
-            
-            result = []
-            for news in flash_news:
-                result.append({
-                    'id': news.id,
-                    'datetime': news.datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                    'content': news.content,
-                    'analysis': news.analysis,
-                    'remarks': news.remarks
-                })
-            
+            async with AsyncSessionLocal() as db:
+                flash_news = (await db.scalars(select(FlashNewsDB).order_by(FlashNewsDB.datetime.desc()))).all()
+            result = [self._flash_news_dict(news) for news in flash_news]
             logger.info(f"成功获取快讯数据，共{len(result)}条记录")
             return result
         except Exception as e:
             logger.error(f"获取快讯数据失败: {e}")
             return []
-        finally:
-            if 'db' in locals():
-                db.close()
 
-    def get_news_articles(self) -> List[Dict[str, Any]]:
+    async def get_news_articles_async(self) -> List[Dict[str, Any]]:
         """获取资讯文章数据"""
         try:
             if self.engine is None:
                 logger.error("数据库未初始化，无法获取资讯文章数据")
                 return []
-                
-            db = self.SessionLocal()
-            articles = db.query(NewsArticleDB).order_by(NewsArticleDB.datetime.desc()).all()
-            
-            result = []
-            for article in articles:
-                result.append({
-                    'id': article.id,
-                    'datetime': article.datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                    'title': article.title,
-                    'content': article.content,
-                    'analysis': article.analysis,
-                    'remarks': article.remarks
-                })
-            
+            async with AsyncSessionLocal() as db:
+                articles = (await db.scalars(select(NewsArticleDB).order_by(NewsArticleDB.datetime.desc()))).all()
+            result = [self._news_article_dict(article) for article in articles]
             logger.info(f"成功获取资讯文章数据，共{len(result)}条记录")
             return result
         except Exception as e:
             logger.error(f"获取资讯文章数据失败: {e}")
             return []
-        finally:
-            if 'db' in locals():
-                db.close()
+
+    async def get_flash_news_page_async(self, limit: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """按时间倒序分页获取快讯，cursor 为上一页返回的 next_cursor"""
+        async with AsyncSessionLocal() as db:
+            rows = (await db.scalars(keyset_query(select(FlashNewsDB), FlashNewsDB.datetime, FlashNewsDB.id,
+                                                  cursor, limit, id_type=int))).all()
+        rows, next_cursor = keyset_result(rows, limit, FlashNewsDB.datetime, FlashNewsDB.id)
+        return {'items': [self._flash_news_dict(news) for news in rows], 'next_cursor': next_cursor}
+
+    async def get_news_articles_page_async(self, limit: int, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """按时间倒序分页获取资讯文章，cursor 为上一页返回的 next_cursor"""
+        async with AsyncSessionLocal() as db:
+            rows = (await db.scalars(keyset_query(select(NewsArticleDB), NewsArticleDB.datetime, NewsArticleDB.id,
+                                                  cursor, limit, id_type=int))).all()
+        rows, next_cursor = keyset_result(rows, limit, NewsArticleDB.datetime, NewsArticleDB.id)
+        return {'items': [self._news_article_dict(article) for article in rows], 'next_cursor': next_cursor}
+
+    async def get_news_async(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
+        """get_news 的异步版本：Tushare 客户端只有同步接口，拉取和入库一起放到线程中执行"""
+        return await asyncio.to_thread(self.get_news, start_date, end_date)
 
     async def analyze_news_with_deepseek(self, news_date: str) -> Dict[str, Any]:
         """使用DeepSeek分析新闻
-        
+
+        读取新闻后即关闭会话，模型调用在线程中执行，不占用数据库连接也不阻塞事件循环，
+        全部分析完成后再用新的短会话写回结果
+
         Args:
             news_date: 新闻日期，格式：YYYYMMDD
-            
+
         Returns:
             分析结果
         """
@@ -479,22 +489,15 @@ class NewsService:
             if self.engine is None:
                 logger.error("数据库未初始化，无法分析新闻")
                 return {}
-                
+
             # 转换日期格式
             start_date = datetime.strptime(news_date, '%Y%m%d')
             end_date = start_date + timedelta(days=1)
-            
-            # 转换为字符串格式，用于数据库查询
-            start_date_str = start_date.strftime('%Y-%m-%d %H:%M:%S')
-            end_date_str = end_date.strftime('%Y-%m-%d %H:%M:%S')
-                
+
             # 从数据库获取指定日期的新闻数据
-            db = self.SessionLocal()
-            news_articles = db.query(NewsArticleDB).filter(
-                NewsArticleDB.datetime >= start_date_str,
-                NewsArticleDB.datetime < end_date_str
-            ).order_by(NewsArticleDB.datetime.desc()).all()
-            
+            async with AsyncSessionLocal() as db:
+                news_articles = await self._articles_between_async(db, start_date, end_date)
+
             if not news_articles:
                 logger.warning(f"未找到{news_date}的新闻数据")
                 return {
@@ -503,39 +506,78 @@ class NewsService:
                     "analysis": [],
                     "message": "未找到该日期的新闻数据"
                 }
-            
+
             # 初始化OpenAI客户端
             client = OpenAI(
                 api_key=settings.DEEPSEEK_API_KEY,
                 base_url="https://ark.cn-beijing.volces.com/api/v3/bots"
             )
-            
-            # 分析每条新闻
+
+            # 分析每条新闻，新的分析结果按新闻id暂存，最后统一写库
             analysis_results = []
+            updates: Dict[int, str] = {}
             for article in news_articles:
                 # 检查是否已经分析过
                 if article.analysis:
                     try:
                         # 解析已有的分析结果
                         existing_analysis = json.loads(article.analysis)
-                        analysis_results.append({
-                            "title": article.title,
-                            "content": article.content,
-                            "datetime": article.datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                            **existing_analysis
-                        })
+                        analysis_results.append(self._article_analysis_dict(article, existing_analysis))
                         logger.info(f"跳过已分析的新闻: {article.title}")
                         continue
                     except json.JSONDecodeError:
                         # 如果解析失败，继续进行分析
                         logger.warning(f"已有分析结果解析失败，重新分析: {article.title}")
-                
+
                 logger.info(f"开始分析新闻: {article.title}")
-                prompt = f"""请分析以下新闻对豆粕市场的影响：
+                try:
+                    analysis = await asyncio.to_thread(
+                        self._deepseek_analyze, client, article.title, article.content, article.datetime)
+                except Exception as e:
+                    logger.error(f"分析新闻失败: {e}")
+                    continue
+                updates[article.id] = json.dumps(analysis, ensure_ascii=False)
+                analysis_results.append(self._article_analysis_dict(article, analysis))
 
-标题：{article.title}
-内容：{article.content}
-发布时间：{article.datetime.strftime('%Y-%m-%d %H:%M:%S')}
+            # 提交数据库更改
+            if updates:
+                try:
+                    async with AsyncSessionLocal() as db:
+                        for article_id, analysis in updates.items():
+                            await db.execute(update(NewsArticleDB).where(NewsArticleDB.id == article_id)
+                                             .values(analysis=analysis))
+                        await db.commit()
+                    logger.info(f"成功更新{len(updates)}条新闻的分析结果到数据库")
+                except Exception as e:
+                    logger.error(f"更新数据库失败: {e}")
+
+            return {
+                "date": news_date,
+                "news_count": len(news_articles),
+                "analysis": analysis_results
+            }
+
+        except Exception as e:
+            logger.error(f"分析新闻失败: {e}")
+            return {}
+
+    @staticmethod
+    def _article_analysis_dict(article: NewsArticleDB, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "title": article.title,
+            "content": article.content,
+            "datetime": article.datetime.strftime('%Y-%m-%d %H:%M:%S'),
+            **analysis
+        }
+
+    @staticmethod
+    def _deepseek_analyze(client: OpenAI, title: str, content: str, published: datetime) -> Dict[str, Any]:
+        """调用DeepSeek分析单条新闻（同步阻塞，需在线程中调用），返回值无法解析时返回默认结果"""
+        prompt = f"""请分析以下新闻对豆粕市场的影响：
+
+标题：{title}
+内容：{content}
+发布时间：{published.strftime('%Y-%m-%d %H:%M:%S')}
 
 请从以下几个方面进行分析：
 1. 新闻重要性（高/中/低）
@@ -550,107 +592,62 @@ class NewsService:
     "impact_level": "强/中/弱",
     "analysis": "具体分析内容"
 }}"""
-                
-                try:
-                    response = client.chat.completions.create(
-                        model="bot-20250329163710-8zcqm",
-                        messages=[
-                            {"role": "system", "content": "你是一个豆粕市场分析专家"},
-                            {"role": "user", "content": prompt}
-                        ],
-                        stream=False
-                    )
-                    
-                    content = response.choices[0].message.content
-                    # 提取JSON内容
-                    if "```json" in content:
-                        json_content = content.split("```json")[1].split("```")[0].strip()
-                    else:
-                        json_content = content.strip()
-                    
-                    # 尝试提取JSON对象
-                    try:
-                        # 查找第一个{和最后一个}之间的内容
-                        start_idx = json_content.find('{')
-                        end_idx = json_content.rfind('}')
-                        if start_idx != -1 and end_idx != -1:
-                            json_content = json_content[start_idx:end_idx+1]
-                        
-                        # 处理reference字段，将[]格式转换为字符串
-                        if '"reference": [' in json_content:
-                            # 找到reference字段的开始位置
-                            ref_start = json_content.find('"reference": [')
-                            if ref_start != -1:
-                                # 找到对应的结束位置
-                                ref_end = json_content.find(']', ref_start)
-                                if ref_end != -1:
-                                    # 提取reference内容并转换为字符串
-                                    ref_content = json_content[ref_start:ref_end+1]
-                                    # 替换为字符串格式
-                                    json_content = json_content.replace(ref_content, '"reference": "参考来源"')
-                        
-                        analysis = json.loads(json_content)
-                        
-                        # 验证必要字段
-                        required_fields = ['importance', 'sentiment', 'impact_level', 'analysis']
-                        if not all(field in analysis for field in required_fields):
-                            logger.warning(f"分析结果缺少必要字段: {analysis}")
-                            # 添加默认值
-                            for field in required_fields:
-                                if field not in analysis:
-                                    analysis[field] = "未知"
-                        
-                        # 更新数据库中的分析结果
-                        logger.info(f"更新数据库中的分析结果: {analysis}")
-                        article.analysis = json.dumps(analysis, ensure_ascii=False)
-                        db.add(article)
-                        
-                        analysis_results.append({
-                            "title": article.title,
-                            "content": article.content,
-                            "datetime": article.datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                            **analysis
-                        })
-                    except json.JSONDecodeError as e:
-                        logger.error(f"JSON解析失败: {e}, 内容: {json_content}")
-                        # 创建一个默认的分析结果
-                        default_analysis = {
-                            "importance": "未知",
-                            "sentiment": "未知",
-                            "impact_level": "未知",
-                            "analysis": "分析失败，请重试"
-                        }
-                        article.analysis = json.dumps(default_analysis, ensure_ascii=False)
-                        db.add(article)
-                        
-                        analysis_results.append({
-                            "title": article.title,
-                            "content": article.content,
-                            "datetime": article.datetime.strftime('%Y-%m-%d %H:%M:%S'),
-                            **default_analysis
-                        })
-                    
-                except Exception as e:
-                    logger.error(f"分析新闻失败: {e}")
-                    continue
-            
-            # 提交数据库更改
-            try:
-                db.commit()
-                logger.info(f"成功更新{len(analysis_results)}条新闻的分析结果到数据库")
-            except Exception as e:
-                logger.error(f"更新数据库失败: {e}")
-                db.rollback()
-            
+
+        response = client.chat.completions.create(
+            model="bot-20250329163710-8zcqm",
+            messages=[
+                {"role": "system", "content": "你是一个豆粕市场分析专家"},
+                {"role": "user", "content": prompt}
+            ],
+            stream=False
+        )
+
+        content = response.choices[0].message.content
+        # 提取JSON内容
+        if "```json" in content:
+            json_content = content.split("```json")[1].split("```")[0].strip()
+        else:
+            json_content = content.strip()
+
+        # 尝试提取JSON对象
+        try:
+            # 查找第一个{和最后一个}之间的内容
+            start_idx = json_content.find('{')
+            end_idx = json_content.rfind('}')
+            if start_idx != -1 and end_idx != -1:
+                json_content = json_content[start_idx:end_idx+1]
+
+            # 处理reference字段，将[]格式转换为字符串
+            if '"reference": [' in json_content:
+                # 找到reference字段的开始位置
+                ref_start = json_content.find('"reference": [')
+                if ref_start != -1:
+                    # 找到对应的结束位置
+                    ref_end = json_content.find(']', ref_start)
+                    if ref_end != -1:
+                        # 提取reference内容并转换为字符串
+                        ref_content = json_content[ref_start:ref_end+1]
+                        # 替换为字符串格式
+                        json_content = json_content.replace(ref_content, '"reference": "参考来源"')
+
+            analysis = json.loads(json_content)
+
+            # 验证必要字段
+            required_fields = ['importance', 'sentiment', 'impact_level', 'analysis']
+            if not all(field in analysis for field in required_fields):
+                logger.warning(f"分析结果缺少必要字段: {analysis}")
+                # 添加默认值
+                for field in required_fields:
+                    if field not in analysis:
+                        analysis[field] = "未知"
+            logger.info(f"新闻分析结果: {analysis}")
+            return analysis
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON解析失败: {e}, 内容: {json_content}")
+            # 创建一个默认的分析结果
             return {
-                "date": news_date,
-                "news_count": len(news_articles),
-                "analysis": analysis_results
-            }
-            
-        except Exception as e:
-            logger.error(f"分析新闻失败: {e}")
-            return {}
-        finally:
-            if 'db' in locals():
-                db.close()
\ No newline at end of file
+                "importance": "未知",
+                "sentiment": "未知",
+                "impact_level": "未知",
+                "analysis": "分析失败，请重试"
+            }
\ No newline at end of file
@@ -0,0 +1,280 @@
+import itertools
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from strategies.dual_ma_strategy import DualMAStrategy
+from strategies.grid_strategy import GridStrategy
+from strategies.trend_follow_strategy import TrendFollowStrategy
+from utils.logger import logger
+
+# 每个策略可扫描的参数：signal部分传给calculate_signals，backtest部分传给run_backtest
+STRATEGY_PARAMS = {
+    'dual_ma': {
+        'signal': ['use_atr_tp', 'fast_period', 'slow_period', 'atr_period', 'atr_multiplier'],
+        'backtest': ['use_atr_tp'],
+    },
+    'grid': {
+        'signal': ['grid_levels', 'atr_period'],
+        'backtest': ['grid_levels'],
+    },
+    'trend_follow': {
+        'signal': ['atr_period', 'adx_period', 'fast_period', 'slow_period'],
+        'backtest': ['take_profit_multiple', 'stop_loss_multiple', 'adx_threshold'],
+    },
+}
+
+RANK_METRICS = ['sharpe_ratio', 'total_returns', 'annual_returns', 'win_rate', 'max_drawdown']
+
+MAX_COMBINATIONS = 20000  # 单次扫描允许的最大参数组合数
+
+class SharedFrame:
+    """把DataFrame的数值列和时间列放入一块共享内存，子进程按布局信息直接映射，无需逐任务序列化"""
+
+    def __init__(self, df: pd.DataFrame):
+        columns = []
+        arrays = []
+        offset = 0
+        for col in df.columns:
+            series = df[col]
+            if pd.api.types.is_datetime64_any_dtype(series):
+                values = series.to_numpy()
+            elif pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+                values = series.to_numpy()  # 保留float32/int64等紧凑类型
+            else:
+                continue  # ts_code等字符串、分类列回测用不到
+            columns.append((col, values.dtype.str, offset))
+            arrays.append(values)
+            offset += -(-values.nbytes // 8) * 8  # 按8字节对齐
+
+        self.length = len(df)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for (col, dtype, col_offset), values in zip(columns, arrays):
+            target = np.ndarray(self.length, dtype=dtype, buffer=self.shm.buf, offset=col_offset)
+            target[:] = values
+        self.layout = {'name': self.shm.name, 'length': self.length, 'columns': columns}
+
+    def close(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+    @staticmethod
+    def attach(layout: Dict) -> Tuple[pd.DataFrame, shared_memory.SharedMemory]:
+        """在子进程中根据布局信息重建DataFrame"""
+        shm = shared_memory.SharedMemory(name=layout['name'])
+        data = {}
+        for col, dtype, col_offset in layout['columns']:
+            data[col] = np.ndarray(layout['length'], dtype=dtype, buffer=shm.buf, offset=col_offset)
+        return pd.DataFrame(data), shm
+
+def expand_param_grid(param_ranges: Dict[str, Any]) -> Tuple[List[str], List[List[Any]]]:
+    """把参数范围展开为取值列表"""
+    names = []
+    values = []
+    for name, spec in param_ranges.items():
+        if hasattr(spec, 'dict'):
+            spec = spec.dict()
+        if isinstance(spec, (list, tuple)):
+            candidates = list(spec)
+        elif spec.get('values') is not None:
+            candidates = list(spec['values'])
+        else:
+            start, stop, step = spec['start'], spec['stop'], spec.get('step', 1)
+            if start is None or stop is None or not step or step <= 0:
+                raise ValueError(f"参数 {name} 的取值范围无效")
+            count = int(math.floor((stop - start) / step + 1e-9)) + 1
+            candidates = [start + i * step for i in range(max(count, 0))]
+            if all(float(v).is_integer() for v in (start, stop, step)):
+                candidates = [int(round(v)) for v in candidates]
+            else:
+                candidates = [round(v, 10) for v in candidates]
+        if not candidates:
+            raise ValueError(f"参数 {name} 没有可用取值")
+        names.append(name)
+        values.append(candidates)
+    return names, values
+
+def split_params(strategy: str, params: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """按策略定义拆分出信号参数和回测参数"""
+    spec = STRATEGY_PARAMS[strategy]
+    signal_params = {k: v for k, v in params.items() if k in spec['signal']}
+    backtest_params = {k: v for k, v in params.items() if k in spec['backtest']}
+    return signal_params, backtest_params
+
+def calculate_strategy_signals(strategy: str, frames: Dict[str, pd.DataFrame], signal_params: Dict[str, Any]) -> pd.DataFrame:
+    """计算单组参数的交易信号"""
+    if strategy == 'dual_ma':
+        return DualMAStrategy.calculate_signals(frames['bars'].copy(), **signal_params)
+    if strategy == 'grid':
+        return GridStrategy.calculate_signals(frames['bars'].copy(), **signal_params)
+    if strategy == 'trend_follow':
+        return TrendFollowStrategy.calculate_signals(frames['15min'].copy(), **signal_params)
+    raise ValueError(f"不支持的策略: {strategy}")
+
+def run_strategy_backtest(strategy: str, df_with_signals: pd.DataFrame, backtest_params: Dict[str, Any]) -> Dict:
+    """在已计算信号的数据上执行回测"""
+    if strategy == 'dual_ma':
+        return DualMAStrategy.run_backtest(df_with_signals, **backtest_params)
+    if strategy == 'grid':
+        return GridStrategy.run_backtest(df_with_signals, **backtest_params)
+    if strategy == 'trend_follow':
+        return TrendFollowStrategy.run_backtest(df_with_signals, **backtest_params)
+    raise ValueError(f"不支持的策略: {strategy}")
+
+def _clean_metric(value: Any) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if np.isfinite(value) else None
+
+def summarize_result(result: Dict) -> Dict[str, Any]:
+    """提取排名所需的核心指标"""
+    return {
+        'sharpe_ratio': _clean_metric(result.get('sharpe_ratio')),
+        'total_returns': _clean_metric(result.get('total_returns')),
+        'annual_returns': _clean_metric(result.get('annual_returns')),
+        'max_drawdown': _clean_metric(result.get('max_drawdown')),
+        'win_rate': _clean_metric(result.get('win_rate')),
+        'trades': len(result.get('trades', [])),
+    }
+
+# 进程池的启动方式：服务进程里有事件循环、数据库连接池和后台线程，fork会把其他线程持有的锁原样复制到子进程，
+# 子进程再取这些锁时会永久阻塞；forkserver从干净的服务进程派生子进程，不继承这些状态
+WORKER_MP_CONTEXT = multiprocessing.get_context('forkserver')
+
+# 子进程内的全局状态，由_init_worker在进程启动时填充一次
+_WORKER_STATE: Dict[str, Any] = {}
+
+def _init_worker(strategy: str, layouts: Dict[str, Dict]) -> None:
+    logger.disable('strategies')  # 子进程中关闭策略内部的逐笔日志
+    frames = {}
+    handles = []
+    for key, layout in layouts.items():
+        frames[key], shm = SharedFrame.attach(layout)
+        handles.append(shm)
+    _WORKER_STATE['strategy'] = strategy
+    _WORKER_STATE['frames'] = frames
+    _WORKER_STATE['handles'] = handles
+
+def worker_context() -> Tuple[str, Dict[str, pd.DataFrame]]:
+    """返回当前子进程中的策略名称和共享行情数据"""
+    return _WORKER_STATE['strategy'], _WORKER_STATE['frames']
+
+def _evaluate(params: Dict[str, Any]) -> Dict[str, Any]:
+    strategy, frames = worker_context()
+    signal_params, backtest_params = split_params(strategy, params)
+    try:
+        df_with_signals = calculate_strategy_signals(strategy, frames, signal_params)
+        metrics = summarize_result(run_strategy_backtest(strategy, df_with_signals, backtest_params))
+        metrics['error'] = None
+    except Exception as e:
+        metrics = {metric: None for metric in RANK_METRICS}
+        metrics['trades'] = 0
+        metrics['error'] = str(e)
+    return {'params': params, **metrics}
+
+def rank_results(results: List[Dict], rank_by: str) -> List[Dict]:
+    """按指标排序，最大回撤按绝对值越小越好，缺失值排在最后"""
+    if rank_by == 'max_drawdown':
+        key = lambda r: abs(r[rank_by]) if r[rank_by] is not None else float('inf')
+    else:
+        key = lambda r: -r[rank_by] if r[rank_by] is not None else float('inf')
+    return sorted(results, key=key)
+
+def build_heatmap(results: List[Dict], x: str, y: str, metric: str) -> Dict[str, Any]:
+    """生成二维热力图矩阵，其它参数维度取最优值"""
+    x_values = sorted({r['params'][x] for r in results})
+    y_values = sorted({r['params'][y] for r in results})
+    x_index = {v: i for i, v in enumerate(x_values)}
+    y_index = {v: i for i, v in enumerate(y_values)}
+    matrix: List[List[Optional[float]]] = [[None] * len(x_values) for _ in y_values]
+    better = (lambda a, b: abs(a) < abs(b)) if metric == 'max_drawdown' else (lambda a, b: a > b)
+    for r in results:
+        value = r[metric]
+        if value is None:
+            continue
+        i, j = y_index[r['params'][y]], x_index[r['params'][x]]
+        if matrix[i][j] is None or better(value, matrix[i][j]):
+            matrix[i][j] = value
+    return {'x_param': x, 'y_param': y, 'metric': metric, 'x': x_values, 'y': y_values, 'values': matrix}
+
+class ParamSweepService:
+    """策略参数扫描服务：行情数据放入共享内存，参数组合分发到进程池并行回测"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.logger = logger
+
+    def iter_param_grid(self, strategy: str, param_ranges: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """校验参数并生成所有参数组合"""
+        if strategy not in STRATEGY_PARAMS:
+            raise ValueError(f"不支持的策略: {strategy}")
+        allowed = set(STRATEGY_PARAMS[strategy]['signal']) | set(STRATEGY_PARAMS[strategy]['backtest'])
+        unknown = [name for name in param_ranges if name not in allowed]
+        if unknown:
+            raise ValueError(f"策略 {strategy} 不支持参数: {unknown}，可选参数: {sorted(allowed)}")
+        names, values = expand_param_grid(param_ranges)
+        total = int(np.prod([len(v) for v in values])) if values else 1
+        if total > MAX_COMBINATIONS:
+            raise ValueError(f"参数组合数 {total} 超过上限 {MAX_COMBINATIONS}")
+        return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+    def map_params(self, strategy: str, frames: Dict[str, pd.DataFrame], tasks: List[Any], func) -> List[Any]:
+        """共享内存 + 进程池执行任务，func需为模块级函数，可通过worker_context获取共享数据"""
+        shared = {key: SharedFrame(df) for key, df in frames.items()}
+        try:
+            layouts = {key: frame.layout for key, frame in shared.items()}
+            workers = max(1, min(self.max_workers, len(tasks)))
+            chunksize = max(1, len(tasks) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_MP_CONTEXT,
+                                     initializer=_init_worker, initargs=(strategy, layouts)) as executor:
+                return list(executor.map(func, tasks, chunksize=chunksize))
+        finally:
+            for frame in shared.values():
+                frame.close()
+
+    def run_sweep(self, strategy: str, frames: Dict[str, pd.DataFrame], param_ranges: Dict[str, Any],
+                  rank_by: str = 'sharpe_ratio', top_n: int = 50, heatmap: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """执行参数扫描
+        Args:
+            strategy: 策略名称 dual_ma/grid/trend_follow
+            frames: 回测数据，单周期策略为{'bars': df}，趋势跟随为{'15min': df}（60分钟K线由其合成）
+            param_ranges: 参数名 -> 取值范围
+            rank_by: 排序指标
+            top_n: 返回前N个结果
+            heatmap: 热力图横纵轴参数 {'x': ..., 'y': ...}
+        """
+        if rank_by not in RANK_METRICS:
+            raise ValueError(f"不支持的排序指标: {rank_by}，可选: {RANK_METRICS}")
+        if heatmap:
+            for axis in (heatmap['x'], heatmap['y']):
+                if axis not in param_ranges:
+                    raise ValueError(f"热力图参数 {axis} 不在扫描范围内")
+
+        combos = self.iter_param_grid(strategy, param_ranges)
+        self.logger.info(f"开始参数扫描: 策略={strategy}, 组合数={len(combos)}, 进程数={min(self.max_workers, len(combos))}")
+
+        results = self.map_params(strategy, frames, combos, _evaluate)
+        ranked = rank_results(results, rank_by)
+        failed = sum(1 for r in results if r['error'])
+        if failed:
+            self.logger.warning(f"参数扫描中有 {failed} 个组合执行失败")
+        self.logger.info(f"参数扫描完成: 策略={strategy}, 组合数={len(results)}")
+
+        response = {
+            'strategy': strategy,
+            'rank_by': rank_by,
+            'total_combinations': len(results),
+            'failed_combinations': failed,
+            'results': ranked[:top_n],
+        }
+        if heatmap:
+            response['heatmap'] = build_heatmap(results, heatmap['x'], heatmap['y'], rank_by)
+        return response
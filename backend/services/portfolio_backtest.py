@@ -0,0 +1,195 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.backtest_jobs import JobContext, report_progress
+from services.continuous_contract import continuous_contracts
+from services.dataset_registry import load_dataset
+from services.param_sweep import (
+    WORKER_MP_CONTEXT,
+    calculate_strategy_signals,
+    run_strategy_backtest,
+    split_params,
+    summarize_result,
+)
+from utils.equity_curve import bar_dates, position_pnl, trade_bar_indices
+from utils.logger import logger
+
+# 组合回测支持的单周期策略
+PORTFOLIO_STRATEGIES = ['dual_ma', 'grid']
+# 单品种回测内部使用的初始资金（与策略中的设定一致），用于把盈亏换算到各品种分配的资金上
+STRATEGY_INITIAL_CAPITAL = 100000.0
+# 策略的满仓资金比例（与策略中 position_size = 资产 * 0.95 一致）
+FULL_POSITION_FRACTION = 0.95
+# 查找合约数据文件的目录，靠前的优先
+DATA_DIRS = ['daily_data', 'data']
+
+def resolve_data_file(contract: str, data_period: str) -> Path:
+    """按合约代码和周期查找数据文件，如 M2501 + daily -> daily_data/M2501.DCE_future_daily_*.csv；
+    只给品种代码（如 M）时使用按持仓量换月、比例复权的日线连续合约"""
+    if contract.isalpha() and data_period == 'daily':
+        return continuous_contracts.materialize(contract)
+    for data_dir in DATA_DIRS:
+        matches = sorted(Path(data_dir).glob(f"{contract}.*_{data_period}_*.csv"))
+        if matches:
+            return matches[0]
+    raise FileNotFoundError(f"找不到合约 {contract} 的{data_period}数据文件")
+
+def mark_to_market(dates: np.ndarray, closes: np.ndarray, trades: List[Dict[str, Any]],
+                   capital: float = STRATEGY_INITIAL_CAPITAL) -> np.ndarray:
+    """由成交记录还原逐K线的累计盈亏（已实现 + 按收盘价计算的持仓浮动盈亏）
+    每笔交易的名义敞口取 成交股数*开仓价 占 capital 的比例；策略按ETF每手100股取整，
+    期货价格下股数为0时按策略的满仓比例折算，使成交时点和方向仍能用于组合回测"""
+    if not trades:
+        return np.zeros(len(dates))
+    entry_price = np.array([t['entry_price'] for t in trades], dtype=np.float64)
+    exit_price = np.array([t['exit_price'] for t in trades], dtype=np.float64)
+    shares = np.array([t.get('shares', 0) for t in trades], dtype=np.float64)
+    sign = np.array([-1.0 if t.get('position') == 'short' else 1.0 for t in trades])
+    fraction = np.where(shares > 0, shares * entry_price / capital, FULL_POSITION_FRACTION)
+    return position_pnl(
+        closes,
+        trade_bar_indices(dates, [t['entry_date'] for t in trades]),
+        trade_bar_indices(dates, [t['exit_date'] for t in trades]),
+        sign * fraction * capital / entry_price,
+        entry_price,
+        exit_price,
+    )
+
+def _run_instrument(task: Tuple[str, str, str, Dict[str, Any]]) -> Dict[str, Any]:
+    """子进程任务：加载单个合约，计算信号、回测并生成逐K线盈亏曲线"""
+    strategy, contract, data_file, params = task
+    logger.disable('strategies')  # 子进程中关闭策略内部的逐笔日志
+    signal_params, backtest_params = split_params(strategy, params)
+    df = load_dataset(data_file)
+    df_with_signals = calculate_strategy_signals(strategy, {'bars': df}, signal_params)
+    result = run_strategy_backtest(strategy, df_with_signals, backtest_params)
+    dates = bar_dates(df_with_signals)
+    closes = df_with_signals['close'].to_numpy(dtype=np.float64)
+    return {
+        'contract': contract,
+        'dates': dates,
+        'pnl': mark_to_market(dates, closes, result.get('trades', [])),
+        'metrics': summarize_result(result),
+    }
+
+def _periods_per_year(index: pd.DatetimeIndex) -> float:
+    years = (index[-1] - index[0]).days / 365.0
+    return len(index) / years if years > 0 else 252.0
+
+class PortfolioBacktestService:
+    """多合约组合回测：各合约的信号计算和回测在进程池中并行，
+    按公共交易日历对齐后合成组合资金曲线"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.logger = logger
+
+    def run(self, strategy: str, contracts: List[str], data_period: str = 'daily',
+            params: Optional[Dict[str, Any]] = None, weights: Optional[Dict[str, float]] = None,
+            initial_capital: float = 1000000.0, job: Optional[JobContext] = None) -> Dict[str, Any]:
+        """执行组合回测
+        Args:
+            strategy: 策略名称 dual_ma/grid
+            contracts: 合约代码列表，如 ['M2501', 'M2505', 'Y2501']
+            data_period: 数据周期
+            params: 策略参数，所有合约共用
+            weights: 合约 -> 资金权重，为空时等权；权重会归一化
+            initial_capital: 组合初始资金
+            job: 异步任务上下文，用于汇报进度
+        """
+        if strategy not in PORTFOLIO_STRATEGIES:
+            raise ValueError(f"组合回测不支持的策略: {strategy}，可选: {PORTFOLIO_STRATEGIES}")
+        contracts = list(dict.fromkeys(contracts))
+        if not contracts:
+            raise ValueError("合约列表不能为空")
+        weights = weights or {c: 1.0 for c in contracts}
+        unknown = set(weights) - set(contracts)
+        if unknown:
+            raise ValueError(f"权重中包含未参与回测的合约: {sorted(unknown)}")
+        weight_arr = np.array([float(weights.get(c, 0.0)) for c in contracts])
+        if np.any(weight_arr < 0) or weight_arr.sum() <= 0:
+            raise ValueError("权重必须非负且总和大于0")
+        weight_arr = weight_arr / weight_arr.sum()
+
+        tasks = [(strategy, c, str(resolve_data_file(c, data_period)), params or {}) for c in contracts]
+        self.logger.info(f"开始组合回测: 策略={strategy}, 合约数={len(contracts)}, 周期={data_period}")
+
+        results: Dict[str, Dict[str, Any]] = {}
+        errors: Dict[str, str] = {}
+        workers = max(1, min(self.max_workers, len(tasks)))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=WORKER_MP_CONTEXT) as executor:
+            futures = {executor.submit(_run_instrument, task): task[1] for task in tasks}
+            for done, future in enumerate(as_completed(futures), start=1):
+                contract = futures[future]
+                try:
+                    results[contract] = future.result()
+                except Exception as e:
+                    errors[contract] = str(e)
+                    self.logger.error(f"合约 {contract} 回测失败: {str(e)}")
+                try:
+                    report_progress(job, 90 * done / len(tasks), f"已完成 {done}/{len(tasks)} 个合约")
+                except Exception:
+                    for pending in futures:
+                        pending.cancel()
+                    raise
+        if not results:
+            raise ValueError(f"所有合约回测均失败: {errors}")
+
+        return self._combine(strategy, contracts, weight_arr, initial_capital, results, errors)
+
+    def _combine(self, strategy: str, contracts: List[str], weight_arr: np.ndarray, initial_capital: float,
+                 results: Dict[str, Dict[str, Any]], errors: Dict[str, str]) -> Dict[str, Any]:
+        """按公共日历对齐各合约的累计盈亏：上市前为0，到期后保持最终值"""
+        series = {}
+        for contract in contracts:
+            if contract not in results:
+                continue
+            item = results[contract]
+            s = pd.Series(item['pnl'], index=pd.DatetimeIndex(item['dates']))
+            series[contract] = s[~s.index.duplicated(keep='last')]
+        pnl = pd.concat(series, axis=1).sort_index().ffill().fillna(0.0)
+
+        # 各合约按分配资金缩放单品种回测的盈亏；失败合约的资金视为闲置
+        scale = np.array([weight_arr[contracts.index(c)] * initial_capital / STRATEGY_INITIAL_CAPITAL for c in pnl.columns])
+        sleeve_pnl = pnl.to_numpy() * scale
+        equity = initial_capital + sleeve_pnl.sum(axis=1)
+
+        returns = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.array([])
+        peak = np.maximum.accumulate(equity)
+        years = (pnl.index[-1] - pnl.index[0]).days / 365.0
+        total_returns = float(equity[-1] / initial_capital - 1)
+        sharpe = float(returns.mean() / returns.std() * np.sqrt(_periods_per_year(pnl.index))) if len(returns) > 1 and returns.std() > 0 else 0.0
+        sleeve_returns = pd.DataFrame(np.diff(sleeve_pnl, axis=0), columns=pnl.columns) / initial_capital
+
+        self.logger.info(f"组合回测完成: 策略={strategy}, 成功={len(results)}, 失败={len(errors)}, 总收益率={total_returns:.2%}")
+        return {
+            'strategy': strategy,
+            'summary': {
+                'initial_capital': initial_capital,
+                'final_assets': float(equity[-1]),
+                'total_returns': total_returns,
+                'annual_returns': float((1 + total_returns) ** (1 / years) - 1) if years > 0 and total_returns > -1 else 0.0,
+                'sharpe_ratio': sharpe,
+                'max_drawdown': float(np.max((peak - equity) / peak)),
+            },
+            'instruments': [
+                {
+                    'contract': c,
+                    'weight': float(weight_arr[contracts.index(c)]),
+                    'profit': float(sleeve_pnl[-1, i]),
+                    'metrics': results[c]['metrics'],
+                }
+                for i, c in enumerate(pnl.columns)
+            ],
+            'errors': errors,
+            'correlation': sleeve_returns.corr().round(4).fillna(0.0).to_dict() if len(sleeve_returns) > 1 else {},
+            'equity_curve': [
+                {'date': d.strftime('%Y-%m-%d %H:%M'), 'equity': float(v)}
+                for d, v in zip(pnl.index, equity)
+            ],
+        }
@@ -0,0 +1,125 @@
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import akshare as ak
+
+from config import is_futures
+from utils.logger import logger
+
+# 行情缓存有效期（秒），有效期内的行情直接复用，不重复请求
+QUOTE_TTL = 3.0
+
+# 新浪期货行情返回的品种名称 -> 品种代码
+SINA_FUTURES_NAMES = {
+    '豆粕': 'M', '豆油': 'Y', '棕榈': 'P', '玉米': 'C', '豆一': 'A', '豆二': 'B',
+    '螺纹钢': 'RB', '铁矿石': 'I', '焦炭': 'J', '焦煤': 'JM',
+    '沪铜': 'CU', '沪铝': 'AL', '沪锌': 'ZN', '沪铅': 'PB', '沪金': 'AU', '沪银': 'AG',
+    '橡胶': 'RU', '燃油': 'FU', '甲醇': 'MA', '塑料': 'L',
+}
+
+def _match_futures(codes: List[str], returned: List[str]) -> List[Optional[str]]:
+    """把行情返回的 symbol 列（如 豆粕2501、PVC2501）对应到请求的合约代码。
+    品种名称不在对照表中时，按月份匹配且该月份只对应一个请求的合约；无法确定的行返回 None"""
+    requested = set(codes)
+    by_month: Dict[str, List[str]] = {}
+    for code in codes:
+        by_month.setdefault(re.sub(r'^[A-Z]+', '', code), []).append(code)
+    matched = []
+    for name in returned:
+        parts = re.match(r'^(\D*)(\d+)$', str(name).strip())
+        if parts is None:
+            matched.append(None)
+            continue
+        product, month = parts.groups()
+        code = SINA_FUTURES_NAMES.get(product, product.upper()) + month
+        if code in requested:
+            matched.append(code)
+        else:
+            candidates = by_month.get(month, [])
+            matched.append(candidates[0] if len(candidates) == 1 else None)
+    return matched
+
+class Quote(NamedTuple):
+    symbol: str
+    price: float
+    settlement: float
+    time: datetime
+
+def fetch_quotes(symbols: List[str]) -> Dict[str, Quote]:
+    """批量获取最新行情：期货合约合并为一次新浪行情请求，股票取一次全市场快照后筛选"""
+    quotes: Dict[str, Quote] = {}
+    now = datetime.now()
+
+    futures = [s for s in symbols if is_futures(s)]
+    if futures:
+        by_code = {s.split('-', 1)[1].upper(): s for s in futures}
+        codes = list(by_code)
+        df = ak.futures_zh_spot(symbol=','.join(codes), market="CF", adjust='0')
+        # 按返回的 symbol 列对应合约，个别代码无行情时不影响其他合约
+        matched = _match_futures(codes, df['symbol'].tolist())
+        for code, price, settlement in zip(matched, df['current_price'], df['last_settle_price']):
+            if code is None:
+                continue
+            price, settlement = float(price), float(settlement)
+            # 尚未成交时用昨结算价估值
+            quotes[by_code[code]] = Quote(by_code[code], price if price > 0 else settlement, settlement, now)
+        unmatched = [s for s in futures if s not in quotes]
+        if unmatched:
+            logger.warning(f"未取到期货行情: {unmatched}")
+
+    stocks = {s.split('-', 1)[-1]: s for s in symbols if not is_futures(s)}
+    if stocks:
+        df = ak.stock_zh_a_spot_em()
+        df = df[df['代码'].isin(list(stocks))]
+        for code, price, last_close in zip(df['代码'], df['最新价'], df['昨收']):
+            quotes[stocks[code]] = Quote(stocks[code], float(price), float(last_close), now)
+
+    return quotes
+
+class QuoteCache:
+    """进程内共享的行情缓存：按品种缓存最新行情，一次调用中过期或缺失的品种合并为一次批量请求。
+    没有取到行情的品种同样记录请求时间，有效期内不重复请求。
+    并发的刷新互斥执行，后到的调用复用先到调用取回的行情"""
+
+    def __init__(self, fetch: Callable[[List[str]], Dict[str, Quote]] = fetch_quotes, ttl: float = QUOTE_TTL):
+        self.fetch = fetch
+        self.ttl = ttl
+        self._quotes: Dict[str, Quote] = {}
+        self._fetched_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+
+    def _stale(self, symbols: List[str], now: float) -> List[str]:
+        with self._lock:
+            return [s for s in symbols if now - self._fetched_at.get(s, float('-inf')) >= self.ttl]
+
+    def get_many(self, symbols: List[str]) -> Dict[str, Quote]:
+        """返回各品种的最新行情，获取失败的品种沿用上次的行情，从未取到的不在结果中"""
+        symbols = list(dict.fromkeys(symbols))
+        if self._stale(symbols, time.monotonic()):
+            with self._fetch_lock:
+                now = time.monotonic()
+                stale = self._stale(symbols, now)
+                if stale:
+                    try:
+                        fetched = self.fetch(stale)
+                    except Exception as e:
+                        logger.error(f"批量获取行情失败: {e}")
+                        fetched = {}
+                    with self._lock:
+                        self._quotes.update(fetched)
+                        for symbol in stale:
+                            self._fetched_at[symbol] = now
+        with self._lock:
+            return {s: self._quotes[s] for s in symbols if s in self._quotes}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._quotes.clear()
+            self._fetched_at.clear()
+
+# 进程内共享的行情缓存
+quote_cache = QuoteCache()
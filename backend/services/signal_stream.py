@@ -0,0 +1,159 @@
+import heapq
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from models.kline import KLineData
+from models.signals import Signal, SignalStatus, SignalType
+
+# 从第 EMA_WARMUP_BARS 根K线开始判断交叉，保证均线有足够的数据
+EMA_WARMUP_BARS = 20
+# 止损价取信号前 STOP_LOSS_BARS 根K线的最低价
+STOP_LOSS_BARS = 5
+# 增量模式保留的末尾K线数：覆盖止损的回看窗口，并允许重发最近几根尚未走完的K线
+STREAM_TAIL_BARS = 64
+# 同时保留的增量状态数，超出后淘汰最久未使用的
+SIGNAL_STREAMS = 256
+
+class CrossHit(NamedTuple):
+    """一次均线信号命中，只保存生成 Signal 所需的字段"""
+    index: int
+    date: datetime
+    symbol: str
+    buy: bool
+    price: float
+    stop_loss: float
+
+def detect_crosses(bars: List[KLineData], lo: int, hi: int, offset: int = 0) -> List[CrossHit]:
+    """判断 bars[lo:hi] 中每根K线的信号，lo 之前至少要有 STOP_LOSS_BARS 根K线。
+    金叉：短期均线上穿长期均线且长期均线不下降，生成买入开仓；
+    否则收盘价跌破长期均线时生成卖出平仓。offset 为 bars[0] 在整个序列中的位置"""
+    if hi <= lo:
+        return []
+    # 只取判断范围及其回看窗口内的K线
+    start = lo - STOP_LOSS_BARS
+    window = bars[start:hi]
+    n = len(window)
+    close = np.fromiter((k.close for k in window), float, n)
+    low = np.fromiter((k.low for k in window), float, n)
+    ema5 = np.fromiter((k.ema5 for k in window), float, n)
+    ema20 = np.fromiter((k.ema20 for k in window), float, n)
+
+    cur = slice(STOP_LOSS_BARS, n)
+    prev = slice(STOP_LOSS_BARS - 1, n - 1)
+    golden = (ema5[cur] > ema20[cur]) & (ema5[prev] <= ema20[prev]) & (ema20[cur] >= ema20[prev])
+    breakdown = ~golden & (close[cur] < ema20[cur]) & (close[prev] >= ema20[prev])
+    # stop_loss[j] 为第 j 根之前 STOP_LOSS_BARS 根K线的最低价
+    stop_loss = sliding_window_view(low[:-1], STOP_LOSS_BARS).min(axis=1)
+
+    hits = []
+    for j in np.flatnonzero(golden | breakdown):
+        k = window[STOP_LOSS_BARS + j]
+        hits.append(CrossHit(
+            index=offset + lo + int(j),
+            date=k.date,
+            symbol=k.symbol,
+            buy=bool(golden[j]),
+            price=k.close,
+            stop_loss=float(stop_loss[j])
+        ))
+    return hits
+
+def materialize(hits: List[CrossHit]) -> List[Signal]:
+    """把命中转换为信号"""
+    signals = []
+    for hit in hits:
+        current_time = datetime.now()
+        signals.append(Signal(
+            id=str(uuid.uuid4()),
+            date=hit.date,
+            symbol=hit.symbol,
+            type=SignalType.BUY_OPEN if hit.buy else SignalType.SELL_CLOSE,
+            price=hit.price,
+            quantity=1,
+            status=SignalStatus.OPEN,
+            reason=(f"金叉信号：短期均线上穿长期均线，止损价：{hit.stop_loss:.2f}" if hit.buy
+                    else "平仓信号：价格跌破长期均线"),
+            close_date=None,
+            close_price=None,
+            profit=0.0,
+            created_at=current_time,
+            updated_at=current_time
+        ))
+    return signals
+
+class SignalStream:
+    """一个K线序列的信号状态：保存末尾的K线和已命中的信号，
+    追加新K线时只判断新增部分。序列最后一根K线可能尚未走完，不参与判断，
+    追加时可以重发它（或最近几根），日期不晚于已保存K线的部分会被替换"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bars: List[KLineData] = []
+        # bars[0] 在整个序列中的位置
+        self.offset = 0
+        # 位置小于 evaluated 的K线都已判断过
+        self.evaluated = 0
+        self.hits: List[CrossHit] = []
+
+    def append(self, klines: List[KLineData]) -> None:
+        if self.bars and klines:
+            first = klines[0].date
+            keep = len(self.bars)
+            while keep > 0 and self.bars[keep - 1].date >= first:
+                keep -= 1
+            if self.offset > 0 and keep < STOP_LOSS_BARS:
+                raise ValueError("重发的K线超出了增量缓存范围，请重新提交完整K线")
+            if keep < len(self.bars):
+                # 被替换的K线上的信号需要重新判断
+                cut = self.offset + keep
+                self.bars = self.bars[:keep]
+                self.evaluated = min(self.evaluated, cut)
+                while self.hits and self.hits[-1].index >= cut:
+                    self.hits.pop()
+        self.bars.extend(klines)
+
+        total_bars = self.offset + len(self.bars)
+        lo = max(self.evaluated, EMA_WARMUP_BARS)
+        hi = total_bars - 1
+        self.hits.extend(detect_crosses(self.bars, lo - self.offset, hi - self.offset, self.offset))
+        self.evaluated = max(self.evaluated, hi)
+
+        if len(self.bars) > STREAM_TAIL_BARS:
+            self.offset += len(self.bars) - STREAM_TAIL_BARS
+            self.bars = self.bars[-STREAM_TAIL_BARS:]
+
+    def latest(self, k: int) -> Tuple[List[Signal], int]:
+        """返回最新的 k 个信号和命中总数，只为这 k 个命中生成信号对象"""
+        return materialize(heapq.nlargest(k, self.hits, key=lambda hit: hit.date)), len(self.hits)
+
+class SignalStreamStore:
+    """按游标保存增量状态"""
+
+    def __init__(self, max_streams: int = SIGNAL_STREAMS):
+        self.max_streams = max_streams
+        self._streams: 'OrderedDict[str, SignalStream]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, stream: SignalStream) -> str:
+        cursor = uuid.uuid4().hex
+        with self._lock:
+            self._streams[cursor] = stream
+            while len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+        return cursor
+
+    def get(self, cursor: str) -> Optional[SignalStream]:
+        with self._lock:
+            stream = self._streams.get(cursor)
+            if stream is not None:
+                self._streams.move_to_end(cursor)
+            return stream
+
+# 进程内共享的增量信号状态
+signal_streams = SignalStreamStore()
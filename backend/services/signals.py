@@ -1,45 +1,29 @@
-from sqlalchemy import create_engine, Column, String, DateTime, Float, Integer, Enum as SQLEnum, func
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import asyncio
 from datetime import datetime, date, timedelta
 from typing import List, Optional
-from models.signals import Signal, SignalCreate, SignalUpdate, SignalType, SignalStatus
-from config import settings
+from sqlalchemy import func, select
+from models.signals import Base, SignalDB, Signal, SignalCreate, SignalUpdate, SignalType, SignalStatus, SignalOutcome, SignalBatchResult
+from database import engine, SessionLocal, AsyncSessionLocal, ensure_schema
 from utils.logger import logger
 import uuid
 import random
-from services.account import AccountService
-from services.position import PositionService
-from models.position import PositionCreate
-from config import get_multiplier, is_futures
+from services.ledger import TradeOutcome, ledger
+from services.trade_processor import trade_processor
 from models.kline import KLineData
+from services.signal_stream import SignalStream, signal_streams
+from utils.pagination import CountCache, keyset_query, keyset_result
 
-Base = declarative_base()
-
-class SignalDB(Base):
-    __tablename__ = "signals"
-
-    id = Column(String, primary_key=True)
-    date = Column(DateTime, nullable=False)
-    symbol = Column(String, nullable=False)
-    type = Column(SQLEnum(SignalType), nullable=False)
-    price = Column(Float, nullable=False)
-    quantity = Column(Integer, nullable=False)
-    status = Column(SQLEnum(SignalStatus), nullable=False, default=SignalStatus.OPEN)
-    reason = Column(String, nullable=False)  # 开平仓原因
-    close_date = Column(DateTime, nullable=True)
-    close_price = Column(Float, nullable=True)
-    profit = Column(Float, nullable=False, default=0.0)
-    created_at = Column(DateTime, default=func.current_timestamp())
-    updated_at = Column(DateTime, default=func.current_timestamp(), onupdate=func.current_timestamp())
+# 信号列表的总数缓存
+_signal_counts = CountCache()
+# 均线信号接口返回的最新信号数
+GENERATED_SIGNALS = 5
 
 class SignalService:
     def __init__(self):
-        self.engine = create_engine(settings.DATABASE_URL or "sqlite:///./trading.db")
-        Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.engine = engine
+        ensure_schema(Base.metadata)
+        self.SessionLocal = SessionLocal
         self.logger = logger
-        self.account_service = AccountService()
         
         # 豆粕相关交易品种
         self.symbols = {
@@ -117,7 +101,7 @@ class SignalService:
                         
                         # 计算手续费并更新账户余额
                         commission = abs(close_price * quantity * 0.0003)
-                        self.account_service.update_balance(profit, commission)
+                        ledger.adjust_balance(profit, commission)
                     
                     # 添加类型前缀到品种名称
                     type_prefix = {
@@ -168,577 +152,238 @@ class SignalService:
         # 在基准价上下10%范围内波动
         return base_price * (1 + random.uniform(-0.1, 0.1))
 
-    def get_signals(self, start_date: datetime, end_date: datetime, signal_type: Optional[str] = None, page: int = 1, page_size: int = 10) -> tuple[List[Signal], int]:
-        """获取指定日期范围内的信号"""
+    async def get_signals_async(self, start_date: datetime, end_date: datetime, signal_type: Optional[str] = None, page: int = 1, page_size: int = 10,
+                                cursor: Optional[str] = None, include_total: bool = True) -> tuple[List[Signal], Optional[int], Optional[str]]:
+        """获取指定日期范围内的信号，按时间倒序，查询走异步会话，不阻塞事件循环
+        给出 cursor 时从上一页末尾继续（键集分页），否则按页码取；
+        总数按查询条件短时缓存，include_total=False 时不统计。返回(信号, 总数, 下一页游标)"""
         try:
-            db = self.SessionLocal()
-            query = db.query(SignalDB).filter(
-                SignalDB.date >= start_date,
-                SignalDB.date <= end_date
-            )
-            
-            # 根据类型筛选
-            if signal_type:
-                if signal_type in ['BUY_OPEN', 'SELL_OPEN', 'BUY_CLOSE', 'SELL_CLOSE']:
-                    query = query.filter(SignalDB.type == signal_type)
-                elif signal_type in ['open', 'closed']:
-                    query = query.filter(SignalDB.status == signal_type)
-            
-            # 获取总记录数
-            total = query.count()
-            
-            # 按日期时间倒序排序并分页
-            signals = query.order_by(SignalDB.date.desc())\
-                .offset((page - 1) * page_size)\
-                .limit(page_size)\
-                .all()
-            
-            # 转换为Pydantic模型
-            return [
-                Signal(
-                    id=s.id,
-                    date=s.date,
-                    symbol=s.symbol,
-                    type=s.type,
-                    price=s.price,
-                    quantity=s.quantity,
-                    status=s.status,
-                    reason=s.reason,
-                    close_date=s.close_date,
-                    close_price=s.close_price,
-                    profit=s.profit,
-                    created_at=s.created_at,
-                    updated_at=s.updated_at
-                ) for s in signals
-            ], total
+            # 账本写库使用同步会话，放到线程中执行
+            await asyncio.to_thread(ledger.flush)
+            filters = self._signal_filters(start_date, end_date, signal_type)
+            async with AsyncSessionLocal() as db:
+                total = None
+                if include_total:
+                    total = await _signal_counts.get_async(
+                        (start_date, end_date, signal_type),
+                        lambda: db.scalar(select(func.count()).select_from(SignalDB).where(*filters))
+                    )
+                rows = (await db.scalars(keyset_query(
+                    select(SignalDB).where(*filters), SignalDB.date, SignalDB.id, cursor, page_size,
+                    offset=0 if cursor else (page - 1) * page_size
+                ))).all()
+            signals, next_cursor = keyset_result(rows, page_size, SignalDB.date, SignalDB.id)
+            return [self._to_signal(s) for s in signals], total, next_cursor
         except Exception as e:
             self.logger.error(f"获取信号失败: {e}")
             raise
-        finally:
-            db.close()
+
+    @staticmethod
+    def _signal_filters(start_date: datetime, end_date: datetime, signal_type: Optional[str]) -> list:
+        """信号列表的查询条件：日期范围，以及按类型或状态筛选"""
+        filters = [SignalDB.date >= start_date, SignalDB.date <= end_date]
+        if signal_type:
+            if signal_type in ['BUY_OPEN', 'SELL_OPEN', 'BUY_CLOSE', 'SELL_CLOSE']:
+                filters.append(SignalDB.type == signal_type)
+            elif signal_type in ['open', 'closed']:
+                filters.append(SignalDB.status == signal_type)
+        return filters
+
+    @staticmethod
+    def _to_signal(s: SignalDB) -> Signal:
+        return Signal(
+            id=s.id,
+            date=s.date,
+            symbol=s.symbol,
+            type=s.type,
+            price=s.price,
+            quantity=s.quantity,
+            status=s.status,
+            reason=s.reason,
+            close_date=s.close_date,
+            close_price=s.close_price,
+            profit=s.profit,
+            created_at=s.created_at,
+            updated_at=s.updated_at
+        )
 
     def _get_signal_by_id(self, signal_id: int) -> Optional[Signal]:
         """根据ID获取信号"""
         return self.SessionLocal().query(SignalDB).filter(SignalDB.id == signal_id).first()
 
-    def calc_trade(self, signal: Signal) -> None:
-        """计算交易盈亏并更新账户"""
-        try:
-            self.logger.info(f"开始计算交易: {signal.id}, 类型: {signal.type}, 状态: {signal.status}")
-            
-            # 获取账户信息
-            account = self.account_service.get_account()
-            if not account:
-                self.logger.error("账户不存在")
-                return
-
-            # 计算手续费 (假设手续费率为0.0003)
-            commission_rate = 0.0003
-            commission = signal.price * signal.quantity * commission_rate
-            self.logger.info(f"计算手续费: {commission}")
-
-            # 计算交易金额
-            trade_amount = signal.price * signal.quantity
-            self.logger.info(f"交易金额: {trade_amount}")
+    def calc_trade(self, signal: Signal) -> Signal:
+        """计算交易盈亏并更新账户，账户和持仓由进程内账本维护，返回计算后的信号"""
+        self.logger.info(f"开始计算交易: {signal.id}, 类型: {signal.type}, 状态: {signal.status}")
+        outcome = trade_processor.apply([signal])[0]
+        if not outcome.applied:
+            self.logger.info(f"{outcome.message}: {signal.id}")
+        return outcome.signal
 
-            # 获取持仓服务
-            position_service = PositionService()
-
-            # 获取该品种的持仓信息
-            position = position_service.get_position(signal.symbol)
-            self.logger.info(f"当前持仓: {position}")
-
-            # 判断是否是期货
-            is_futures_symbol = is_futures(signal.symbol)
-            
-            # 如果是期货，获取交易乘数
-            multiplier = get_multiplier(signal.symbol.split('-')[1]) if is_futures_symbol else 10
-            self.logger.info(f"品种: {signal.symbol}，{signal.symbol.split('-')[1]}, 是否期货: {is_futures_symbol}, 交易乘数: {multiplier}")
-
-            db = self.SessionLocal()
-            try:
-                if signal.type == 'BUY_OPEN':
-                    self.logger.info("处理买入开仓")
-                    # 买入开仓
-                    if position:
-                        # 已有持仓，更新持仓成本
-                        total_cost = position.price * position.quantity + trade_amount
-                        total_quantity = position.quantity + signal.quantity
-                        position.price = total_cost / total_quantity
-                        position.quantity = total_quantity
-                        position_service.update_position(position)
-                        self.logger.info(f"更新持仓: {position}")
-                    else:
-                        # 新建持仓
-                        position = position_service.create_position(PositionCreate(
-                            symbol=signal.symbol,
-                            price=signal.price,
-                            quantity=signal.quantity,
-                            status='open'
-                        ))
-                        self.logger.info(f"新建持仓: {position}")
-                    
-                    # 更新可用资金
-                    if is_futures_symbol:
-                        # 期货只需要保证金，假设保证金比例为10%
-                        margin = trade_amount * 0.1
-                        account.available_balance -= (margin + commission)
-                        self.logger.info(f"期货保证金: {margin}")
-                    else:
-                        # 股票需要全额资金
-                        account.available_balance -= (trade_amount + commission)
-                        self.logger.info(f"股票全额资金: {trade_amount}")
-                    
-                    account.total_commission += commission
-                    self.logger.info(f"更新账户余额: {account.available_balance}")
-
-                elif signal.type == 'SELL_OPEN':
-                    self.logger.info("处理卖出开仓")
-                    # 卖出开仓
-                    if position:
-                        # 已有持仓，更新持仓成本
-                        total_cost = position.price * position.quantity + trade_amount
-                        total_quantity = position.quantity + signal.quantity
-                        position.price = total_cost / total_quantity
-                        position.quantity = total_quantity
-                        position_service.update_position(position)
-                        self.logger.info(f"更新持仓: {position}")
-                    else:
-                        # 新建持仓
-                        position = position_service.create_position(PositionCreate(
-                            symbol=signal.symbol,
-                            price=signal.price,
-                            quantity=signal.quantity,
-                            status='open'
-                        ))
-                        self.logger.info(f"新建持仓: {position}")
-                    
-                    # 更新可用资金
-                    if is_futures_symbol:
-                        # 期货只需要保证金，假设保证金比例为10%
-                        margin = trade_amount * 0.1
-                        account.available_balance -= (margin + commission)
-                        self.logger.info(f"期货保证金: {margin}")
-                    else:
-                        # 股票需要全额资金
-                        account.available_balance -= (trade_amount + commission)
-                        self.logger.info(f"股票全额资金: {trade_amount}")
-                    
-                    account.total_commission += commission
-                    self.logger.info(f"更新账户余额: {account.available_balance}")
-
-                elif signal.type == 'BUY_CLOSE':
-                    self.logger.info("处理买入平仓")
-                    # 买入平仓（对应卖出开仓）
-                    if position:
-                        # 计算盈亏：卖出开仓，买入平仓，价格下跌是盈利
-                        profit = (position.price - signal.price) * signal.quantity * multiplier
-                        self.logger.info(f"计算盈亏: {profit}, 平仓价: {signal.price}, 持仓价: {position.price}, 乘数: {multiplier}")
-                        
-                        # 更新信号盈亏和状态
-                        db_signal = db.query(SignalDB).filter(SignalDB.id == signal.id).first()
-                        if db_signal:
-                            db_signal.profit = profit
-                            db_signal.close_price = signal.price
-                            db_signal.close_date = signal.date
-                            
-                            # 更新持仓
-                            position.quantity -= signal.quantity
-                            if position.quantity <= 0:
-                                position_service.delete_position(position.id)
-                                db_signal.status = 'closed'
-                                # 找到对应的开仓信号并更新状态
-                                open_signal = db.query(SignalDB).filter(
-                                    SignalDB.symbol == signal.symbol,
-                                    SignalDB.type == 'SELL_OPEN',
-                                    SignalDB.status.in_(['open', 'partial_closed'])
-                                ).first()
-                                if open_signal:
-                                    open_signal.status = 'closed'
-                                    self.logger.info(f"更新开仓信号状态为已平仓: {open_signal.id}")
-                                self.logger.info("完全平仓，删除持仓")
-                            else:
-                                position.status = 'partial_closed'  # 部分平仓
-                                position_service.update_position(position)
-                                db_signal.status = 'partial_closed'
-                                # 找到对应的开仓信号并更新状态
-                                open_signal = db.query(SignalDB).filter(
-                                    SignalDB.symbol == signal.symbol,
-                                    SignalDB.type == 'SELL_OPEN',
-                                    SignalDB.status == 'open'
-                                ).first()
-                                if open_signal:
-                                    open_signal.status = 'partial_closed'
-                                    self.logger.info(f"更新开仓信号状态为部分平仓: {open_signal.id}")
-                                self.logger.info(f"部分平仓，更新持仓: {position}")
-                            
-                            # 更新账户余额
-                            account.available_balance += profit
-                            account.total_commission += commission
-                            self.logger.info(f"更新账户余额: {account.available_balance}")
-                            
-                            # 保存所有更新
-                            db.commit()
-                            self.logger.info(f"更新信号状态和盈亏: {signal.id}")
-                            
-                            # 更新信号对象以反映变更
-                            signal.status = db_signal.status
-                            signal.profit = profit
-                            signal.close_price = signal.price
-                            signal.close_date = signal.date
-
-                elif signal.type == 'SELL_CLOSE':
-                    self.logger.info("处理卖出平仓")
-                    # 卖出平仓（对应买入开仓）
-                    if position:
-                        # 计算盈亏：买入开仓，卖出平仓，价格上涨是盈利
-                        profit = (signal.price - position.price) * signal.quantity * multiplier
-                        self.logger.info(f"计算盈亏: {profit}, 平仓价: {signal.price}, 持仓价: {position.price}, 乘数: {multiplier}")
-                        
-                        # 更新信号盈亏和状态
-                        db_signal = db.query(SignalDB).filter(SignalDB.id == signal.id).first()
-                        if db_signal:
-                            db_signal.profit = profit
-                            db_signal.close_price = signal.price
-                            db_signal.close_date = signal.date
-                            
-                            # 更新持仓
-                            position.quantity -= signal.quantity
-                            if position.quantity <= 0:
-                                position_service.delete_position(position.id)
-                                db_signal.status = 'closed'
-                                # 找到对应的开仓信号并更新状态
-                                open_signal = db.query(SignalDB).filter(
-                                    SignalDB.symbol == signal.symbol,
-                                    SignalDB.type == 'BUY_OPEN',
-                                    SignalDB.status.in_(['open', 'partial_closed'])
-                                ).first()
-                                if open_signal:
-                                    open_signal.status = 'closed'
-                                    self.logger.info(f"更新开仓信号状态为已平仓: {open_signal.id}")
-                                self.logger.info("完全平仓，删除持仓")
-                            else:
-                                position.status = 'partial_closed'  # 部分平仓
-                                position_service.update_position(position)
-                                db_signal.status = 'partial_closed'
-                                # 找到对应的开仓信号并更新状态
-                                open_signal = db.query(SignalDB).filter(
-                                    SignalDB.symbol == signal.symbol,
-                                    SignalDB.type == 'BUY_OPEN',
-                                    SignalDB.status == 'open'
-                                ).first()
-                                if open_signal:
-                                    open_signal.status = 'partial_closed'
-                                    self.logger.info(f"更新开仓信号状态为部分平仓: {open_signal.id}")
-                                self.logger.info(f"部分平仓，更新持仓: {position}")
-                            
-                            # 更新账户余额
-                            account.available_balance += profit
-                            account.total_commission += commission
-                            self.logger.info(f"更新账户余额: {account.available_balance}")
-                            
-                            # 保存所有更新
-                            db.commit()
-                            self.logger.info(f"更新信号状态和盈亏: {signal.id}")
-                            
-                            # 更新信号对象以反映变更
-                            signal.status = db_signal.status
-                            signal.profit = profit
-                            signal.close_price = signal.price
-                            signal.close_date = signal.date
+    def _new_signal(self, signal: SignalCreate) -> Signal:
+        """生成新信号"""
+        # 调整时区，加8小时
+        date = signal.date
+        if date:
+            date = date + timedelta(hours=8)
+        
+        close_date = signal.close_date
+        if close_date:
+            close_date = close_date + timedelta(hours=8)
+        
+        # 对于平仓类型的信号，设置close_date和close_price
+        if signal.type in ['SELL_CLOSE', 'BUY_CLOSE']:
+            close_date = date
+            close_price = signal.price
+        else:
+            close_date = None
+            close_price = None
+        
+        now = datetime.now()
+        return Signal(
+            id=str(uuid.uuid4()),
+            date=date,
+            symbol=signal.symbol,
+            type=signal.type,
+            price=signal.price,
+            quantity=signal.quantity,
+            status=signal.status,
+            reason=signal.reason,
+            close_date=close_date,
+            close_price=close_price,
+            profit=0.0,  # 初始盈亏为0，在calc_trade中计算
+            created_at=now,
+            updated_at=now
+        )
 
-                # 保存账户更新
-                self.account_service.update_account(account)
-                self.logger.info(f"交易计算完成，最终账户余额: {account.available_balance}")
-                
-            except Exception as e:
-                self.logger.error(f"计算交易失败: {e}")
-                db.rollback()
-                raise
-            finally:
-                db.close()
-                
+    async def create_signal_async(self, signal: SignalCreate) -> Signal:
+        """创建新信号，在事件循环中等待交易处理线程的结果"""
+        try:
+            return (await trade_processor.apply_async([self._new_signal(signal)]))[0].signal
         except Exception as e:
-            self.logger.error(f"计算交易失败: {e}")
+            self.logger.error(f"创建信号失败: {e}")
             raise
 
-    def create_signal(self, signal: SignalCreate) -> Signal:
-        """创建新信号"""
+    def _batch_order(self, signals: List[SignalCreate]) -> List[int]:
+        if not signals:
+            raise ValueError("信号列表为空")
+        # 稳定排序，同一时间的信号保持提交顺序
+        return sorted(range(len(signals)), key=lambda i: signals[i].date)
+
+    def _batch_result(self, order: List[int], trades: List[TradeOutcome]) -> SignalBatchResult:
+        outcomes = [
+            SignalOutcome(
+                index=i,
+                signal=trade.signal,
+                applied=trade.applied,
+                message=trade.message,
+                position_quantity=trade.position_quantity
+            ) for i, trade in zip(order, trades)
+        ]
+        account = ledger.get_account()
+        self.logger.info(f"批量信号处理完成: 共{len(outcomes)}条, 未计算{sum(not o.applied for o in outcomes)}条, "
+                         f"可用资金: {account.available_balance}")
+        return SignalBatchResult(
+            outcomes=outcomes,
+            available_balance=account.available_balance,
+            total_commission=account.total_commission
+        )
+
+    async def create_signals_batch_async(self, signals: List[SignalCreate]) -> SignalBatchResult:
+        """批量写入信号并计算交易
+        信号按时间顺序逐条计算，规则与逐条创建相同；整批在账本中原子生效并作为一条日志追加，
+        之后与其他待写变更在同一个事务中写入数据库。在事件循环中等待交易处理线程的结果"""
+        order = self._batch_order(signals)
         try:
-            db = self.SessionLocal()
-            signal_id = str(uuid.uuid4())
-            
-            # 调整时区，加8小时
-            date = signal.date
-            if date:
-                date = date + timedelta(hours=8)
-            
-            close_date = signal.close_date
-            if close_date:
-                close_date = close_date + timedelta(hours=8)
-            
-            # 对于平仓类型的信号，设置close_date和close_price
-            if signal.type in ['SELL_CLOSE', 'BUY_CLOSE']:
-                close_date = date
-                close_price = signal.price
-            else:
-                close_date = None
-                close_price = None
-            
-            db_signal = SignalDB(
-                id=signal_id,
-                date=date,
-                symbol=signal.symbol,
-                type=signal.type,
-                price=signal.price,
-                quantity=signal.quantity,
-                status=signal.status,
-                reason=signal.reason,
-                close_date=close_date,
-                close_price=close_price,
-                profit=0.0  # 初始盈亏为0，在calc_trade中计算
-            )
-            db.add(db_signal)
-            db.commit()
-            db.refresh(db_signal)
-            
-            # 转换为Signal对象
-            signal_obj = Signal(
-                id=db_signal.id,
-                date=db_signal.date,
-                symbol=db_signal.symbol,
-                type=db_signal.type,
-                price=db_signal.price,
-                quantity=db_signal.quantity,
-                status=db_signal.status,
-                reason=db_signal.reason,
-                close_date=db_signal.close_date,
-                close_price=db_signal.close_price,
-                profit=db_signal.profit,
-                created_at=db_signal.created_at,
-                updated_at=db_signal.updated_at
-            )
-            
-            # 计算交易
-            self.calc_trade(signal_obj)
-            
-            # 重新获取更新后的信号
-            db_signal = db.query(SignalDB).filter(SignalDB.id == signal_id).first()
-            
-            return Signal(
-                id=db_signal.id,
-                date=db_signal.date,
-                symbol=db_signal.symbol,
-                type=db_signal.type,
-                price=db_signal.price,
-                quantity=db_signal.quantity,
-                status=db_signal.status,
-                reason=db_signal.reason,
-                close_date=db_signal.close_date,
-                close_price=db_signal.close_price,
-                profit=db_signal.profit,
-                created_at=db_signal.created_at,
-                updated_at=db_signal.updated_at
-            )
+            trades = await trade_processor.apply_async([self._new_signal(signals[i]) for i in order])
         except Exception as e:
-            self.logger.error(f"创建信号失败: {e}")
-            db.rollback()
+            self.logger.error(f"批量处理信号失败: {e}")
             raise
-        finally:
-            db.close()
+        return self._batch_result(order, trades)
 
-    def update_signal(self, signal_id: str, signal: SignalUpdate) -> Signal:
-        """更新信号"""
+    async def update_signal_async(self, signal_id: str, signal: SignalUpdate) -> Signal:
+        """更新信号：信号读写走异步会话，重新计算交易时等待交易处理线程"""
         try:
-            db = self.SessionLocal()
-            db_signal = db.query(SignalDB).filter(SignalDB.id == signal_id).first()
-            if not db_signal:
-                raise ValueError(f"信号不存在: {signal_id}")
-            
-            # 记录原始状态
-            original_status = db_signal.status
-            original_type = db_signal.type
-            original_price = db_signal.price
-            original_quantity = db_signal.quantity
+            await asyncio.to_thread(ledger.flush)
+            async with AsyncSessionLocal() as db:
+                db_signal = await db.get(SignalDB, signal_id)
+                if not db_signal:
+                    raise ValueError(f"信号不存在: {signal_id}")
 
-            # 更新字段
-            if signal.status is not None:
-                db_signal.status = signal.status
-            if signal.close_date is not None:
-                db_signal.close_date = signal.close_date
-            if signal.close_price is not None:
-                db_signal.close_price = signal.close_price
-            if signal.profit is not None:
-                db_signal.profit = signal.profit
-                
-                # 如果是平仓，更新账户余额
-                if signal.status == 'closed':
-                    # 计算手续费（假设为成交金额的0.0003）
-                    commission = abs(signal.close_price * db_signal.quantity * 0.0003)
-                    # 更新账户余额
-                    self.account_service.update_balance(signal.profit, commission)
-            
-            db.commit()
-            db.refresh(db_signal)
-            
-            # 如果状态从open变为closed，重新计算交易
-            if original_status == 'open' and signal.status == 'closed':
-                self.calc_trade(Signal(
-                    id=db_signal.id,
-                    date=db_signal.date,
-                    symbol=db_signal.symbol,
-                    type=db_signal.type,
-                    price=db_signal.price,
-                    quantity=db_signal.quantity,
-                    status=db_signal.status,
-                    reason=db_signal.reason,
-                    close_date=db_signal.close_date,
-                    close_price=db_signal.close_price,
-                    profit=db_signal.profit,
-                    created_at=db_signal.created_at,
-                    updated_at=db_signal.updated_at
-                ))
-            # 如果交易类型、价格或数量发生变化，重新计算
-            elif (original_type != db_signal.type or 
-                  original_price != db_signal.price or 
-                  original_quantity != db_signal.quantity):
-                self.calc_trade(Signal(
-                    id=db_signal.id,
-                    date=db_signal.date,
-                    symbol=db_signal.symbol,
-                    type=db_signal.type,
-                    price=db_signal.price,
-                    quantity=db_signal.quantity,
-                    status=db_signal.status,
-                    reason=db_signal.reason,
-                    close_date=db_signal.close_date,
-                    close_price=db_signal.close_price,
-                    profit=db_signal.profit,
-                    created_at=db_signal.created_at,
-                    updated_at=db_signal.updated_at
-                ))
-            
-            return Signal(
-                id=db_signal.id,
-                date=db_signal.date,
-                symbol=db_signal.symbol,
-                type=db_signal.type,
-                price=db_signal.price,
-                quantity=db_signal.quantity,
-                status=db_signal.status,
-                reason=db_signal.reason,
-                close_date=db_signal.close_date,
-                close_price=db_signal.close_price,
-                profit=db_signal.profit,
-                created_at=db_signal.created_at,
-                updated_at=db_signal.updated_at
-            )
+                original_status = db_signal.status
+                original_type = db_signal.type
+                original_price = db_signal.price
+                original_quantity = db_signal.quantity
+
+                if signal.status is not None:
+                    db_signal.status = signal.status
+                if signal.close_date is not None:
+                    db_signal.close_date = signal.close_date
+                if signal.close_price is not None:
+                    db_signal.close_price = signal.close_price
+                if signal.profit is not None:
+                    db_signal.profit = signal.profit
+
+                    # 如果是平仓，更新账户余额
+                    if signal.status == 'closed':
+                        commission = abs(signal.close_price * db_signal.quantity * 0.0003)
+                        await asyncio.to_thread(ledger.adjust_balance, signal.profit, commission)
+
+                await db.commit()
+                await db.refresh(db_signal)
+                ledger.invalidate_open_signals(db_signal.symbol)
+                updated = self._to_signal(db_signal)
+
+            # 状态从open变为closed，或交易类型、价格、数量发生变化时重新计算
+            if ((original_status == 'open' and signal.status == 'closed') or
+                    original_type != updated.type or
+                    original_price != updated.price or
+                    original_quantity != updated.quantity):
+                await trade_processor.apply_async([updated])
+            return updated
         except Exception as e:
             self.logger.error(f"更新信号失败: {e}")
-            db.rollback()
             raise
-        finally:
-            db.close()
 
-    def delete_signal(self, signal_id: str) -> None:
+    async def delete_signal_async(self, signal_id: str) -> None:
         """删除信号"""
         try:
-            db = self.SessionLocal()
-            db_signal = db.query(SignalDB).filter(SignalDB.id == signal_id).first()
-            if not db_signal:
-                raise ValueError(f"信号不存在: {signal_id}")
-            
-            db.delete(db_signal)
-            db.commit()
+            await asyncio.to_thread(ledger.flush)
+            async with AsyncSessionLocal() as db:
+                db_signal = await db.get(SignalDB, signal_id)
+                if not db_signal:
+                    raise ValueError(f"信号不存在: {signal_id}")
+                symbol = db_signal.symbol
+                await db.delete(db_signal)
+                await db.commit()
+            ledger.invalidate_open_signals(symbol)
         except Exception as e:
             self.logger.error(f"删除信号失败: {str(e)}")
-            db.rollback()
             raise
-        finally:
-            db.close()
 
-    def generate_signals(self, start_date: datetime, end_date: datetime, signal_type: Optional[str] = None, page: int = 1, page_size: int = 10, klines: List[KLineData] = None) -> tuple[List[Signal], int]:
-        """根据均线策略生成交易信号"""
+    def generate_signals(self, start_date: datetime, end_date: datetime, signal_type: Optional[str] = None, page: int = 1, page_size: int = 10,
+                         klines: List[KLineData] = None, cursor: Optional[str] = None,
+                         incremental: bool = False) -> tuple[List[Signal], int, Optional[str]]:
+        """根据均线策略生成交易信号，返回最近的 GENERATED_SIGNALS 个信号、命中总数和增量游标
+        给出 cursor 时 klines 只需包含上次之后新增的K线；incremental=True 时为本次K线创建游标"""
+        if cursor:
+            stream = signal_streams.get(cursor)
+            if stream is None:
+                raise ValueError("信号游标已失效，请重新提交完整K线")
+        else:
+            stream = SignalStream()
         try:
-            if not klines:
-                return [], 0
-                
-            # 将K线数据转换为列表
-            dates = []
-            prices = []
-            lows = []
-            ema5s = []
-            ema20s = []
-            symbols = []
-            for k in klines:
-                dates.append(k.date)
-                symbols.append(k.symbol)
-                prices.append(k.close)
-                lows.append(k.low)
-                ema5s.append(k.ema5)
-                ema20s.append(k.ema20)
+            if not klines and not cursor:
+                return [], 0, None
 
-            # 生成信号
-            signals = []
-            for i in range(len(prices)-1):
-                if i < 20:  # 确保有足够的数据计算均线
-                    continue
-                    
-                # 检查金叉条件
-                if (ema5s[i] > ema20s[i] and  # 短期均线在长期均线上方
-                    ema5s[i-1] <= ema20s[i-1] and  # 前一日短期均线在长期均线下方
-                    ema20s[i] >= ema20s[i-1]):  # 长期均线平或上升
-                    
-                    # 计算前低作为止损点
-                    stop_loss = min(lows[i-5:i])
-                    
-                    # 生成买入开仓信号
-                    current_time = datetime.now()
-                    signal = Signal(
-                        id=str(uuid.uuid4()),
-                        date=dates[i],
-                        symbol=symbols[i],
-                        type=SignalType.BUY_OPEN,
-                        price=prices[i],
-                        quantity=1,
-                        status=SignalStatus.OPEN,
-                        reason=f"金叉信号：短期均线上穿长期均线，止损价：{stop_loss:.2f}",
-                        close_date=None,
-                        close_price=None,
-                        profit=0.0,
-                        created_at=current_time,
-                        updated_at=current_time
-                    )
-                    signals.append(signal)
-                
-                # 检查平仓条件：价格跌破长期均线
-                elif i > 0 and prices[i] < ema20s[i] and prices[i-1] >= ema20s[i-1]:
-                    # 生成卖出平仓信号
-                    current_time = datetime.now()
-                    signal = Signal(
-                        id=str(uuid.uuid4()),
-                        date=dates[i],
-                        symbol=symbols[i],
-                        type=SignalType.SELL_CLOSE,
-                        price=prices[i],
-                        quantity=1,
-                        status=SignalStatus.OPEN,
-                        reason=f"平仓信号：价格跌破长期均线",
-                        close_date=None,
-                        close_price=None,
-                        profit=0.0,
-                        created_at=current_time,
-                        updated_at=current_time
-                    )
-                    signals.append(signal)
-
-            # 返回最近的5个信号
-            total = len(signals)
-            # 按日期排序，确保返回最新的信号
-            signals.sort(key=lambda x: x.date, reverse=True)
-            # 只返回最近的5个信号
-            return signals[:5], total
+            with stream.lock:
+                stream.append(klines or [])
+                signals, total = stream.latest(GENERATED_SIGNALS)
+            if not cursor and incremental:
+                cursor = signal_streams.add(stream)
+            return signals, total, cursor
 
+        except ValueError:
+            raise
         except Exception as e:
             self.logger.error(f"生成信号失败: {str(e)}")
-            return [], 0 
\ No newline at end of file
+            return [], 0, cursor
@@ -1,9 +1,7 @@
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
-from config import settings
+from database import engine, SessionLocal
 from utils.logger import logger
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from models.soybean import (
     SoybeanImportDB, SoybeanImport, PortDetail, CustomsDetail,
     ComparisonData, PortDistributionData, PolicyEvent
@@ -16,8 +14,8 @@ class SoybeanService:
         """初始化大豆进口数据服务"""
         try:
             # 初始化数据库连接
-            self.engine = create_engine(settings.DATABASE_URL or "sqlite:///./trading.db")
-            self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+            self.engine = engine
+            self.SessionLocal = SessionLocal
             logger.info("大豆进口数据库连接初始化完成")
         except Exception as e:
             logger.error(f"大豆进口数据服务初始化失败: {e}")
@@ -0,0 +1,155 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from strategies.dual_ma_strategy import DualMAStrategy
+from strategies.grid_strategy import GridStrategy
+from strategies.obv_adx_ema_strategy import OBVADXEMAStrategy
+from strategies.support_resistance_strategy import SupportResistanceStrategy
+from strategies.trend_follow_strategy import TrendFollowStrategy
+from services.param_sweep import summarize_result
+from utils.indicator_cache import cached_indicator
+
+# 指标需求：(talib指标名, 指标参数)
+IndicatorRequirement = Tuple[str, Dict[str, Any]]
+
+@dataclass
+class StrategySpec:
+    """注册表中的一个策略
+    signals(df, signal_params) 在K线副本上计算信号，多周期策略的高周期K线由该数据合成，
+    backtest(df_with_signals, backtest_params, equity_points) 执行回测，
+    indicators(signal_params) 返回所需的talib指标，批量评估时先统一计算一次；
+    period_params(data_period) 返回由主周期决定的信号参数，主周期不适用时抛出 ValueError；
+    metrics_key、percent_metrics 说明回测结果中核心指标的位置和单位，futures 为 False 的策略不适用于期货数据"""
+    name: str
+    title: str
+    strategy_class: type
+    signals: Callable[[pd.DataFrame, Dict[str, Any]], pd.DataFrame]
+    backtest: Callable[[pd.DataFrame, Dict[str, Any], Optional[int]], Dict]
+    indicators: Callable[[Dict[str, Any]], List[IndicatorRequirement]]
+    signal_params: Dict[str, Any] = field(default_factory=dict)
+    backtest_params: Dict[str, Any] = field(default_factory=dict)
+    period_params: Optional[Callable[[str], Dict[str, Any]]] = None
+    # 核心指标所在的键，为空时在结果顶层
+    metrics_key: Optional[str] = None
+    # 收益率、回撤、胜率是否以百分数表示
+    percent_metrics: bool = False
+    # 按ETF每手100股下单的策略在期货价格下成交股数为0，不参与期货数据的评估
+    futures: bool = True
+
+    def split_params(self, params: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """合并默认参数并拆分为信号参数和回测参数，未知参数报错"""
+        unknown = set(params) - set(self.signal_params) - set(self.backtest_params)
+        if unknown:
+            raise ValueError(f"策略 {self.name} 不支持的参数: {sorted(unknown)}")
+        # 同一参数可同时属于两部分（如 use_atr_tp、grid_levels）
+        signal_params = {k: params.get(k, v) for k, v in self.signal_params.items()}
+        backtest_params = {k: params.get(k, v) for k, v in self.backtest_params.items()}
+        return signal_params, backtest_params
+
+    def summarize(self, result: Dict) -> Dict[str, Any]:
+        """提取核心指标并统一口径：收益率、胜率为小数，最大回撤为正数"""
+        metrics = result.get(self.metrics_key, {}) if self.metrics_key else result
+        summary = summarize_result({**metrics, 'trades': result.get('trades', [])})
+        scale = 0.01 if self.percent_metrics else 1.0
+        for key in ('total_returns', 'annual_returns', 'max_drawdown', 'win_rate'):
+            if summary[key] is not None:
+                summary[key] *= scale
+        if summary['max_drawdown'] is not None:
+            summary['max_drawdown'] = abs(summary['max_drawdown'])
+        return summary
+
+STRATEGY_REGISTRY: Dict[str, StrategySpec] = {}
+
+def register_strategy(spec: StrategySpec) -> StrategySpec:
+    STRATEGY_REGISTRY[spec.name] = spec
+    return spec
+
+def get_strategy(name: str) -> StrategySpec:
+    spec = STRATEGY_REGISTRY.get(name)
+    if spec is None:
+        raise ValueError(f"不支持的策略: {name}，可选: {list(STRATEGY_REGISTRY)}")
+    return spec
+
+def compute_indicators(df: pd.DataFrame, requirements: List[IndicatorRequirement]) -> int:
+    """按去重后的指标需求预先计算指标，结果进入进程内指标缓存，
+    策略内部按相同输入和参数调用 cached_indicator 时直接命中。返回实际计算的指标个数"""
+    unique = {(name, tuple(sorted(params.items()))): (name, params) for name, params in requirements}
+    for name, params in unique.values():
+        cached_indicator(df, name, **params)
+    return len(unique)
+
+def _fill_gaps(df: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """与各策略路由一致：去掉无穷值后前后向填充缺失值"""
+    columns = [c for c in (columns or df.columns) if c in df.columns]
+    filled = df[columns].replace([np.inf, -np.inf], np.nan).ffill().bfill()
+    df[columns] = filled
+    return df
+
+def _trend_follow_period_params(data_period: str) -> Dict[str, Any]:
+    """趋势跟随在60分钟K线上判断趋势，60分钟K线由主周期K线按根数合成"""
+    minutes = data_period[:-3]
+    if not (data_period.endswith('min') and minutes.isdigit() and 0 < int(minutes) <= 60 and 60 % int(minutes) == 0):
+        raise ValueError(f"趋势跟随策略需要能合成60分钟K线的分钟周期（如15min），不支持: {data_period}")
+    return {'higher_factor': 60 // int(minutes)}
+
+register_strategy(StrategySpec(
+    name='dual_ma',
+    title='双均线策略',
+    strategy_class=DualMAStrategy,
+    signals=lambda df, p: DualMAStrategy.calculate_signals(df, **p),
+    backtest=lambda df, p, points: DualMAStrategy.run_backtest(df, equity_points=points, **p),
+    indicators=lambda p: [('EMA', {'timeperiod': p['fast_period']}), ('EMA', {'timeperiod': p['slow_period']})]
+                         + ([('ATR', {'timeperiod': p['atr_period']})] if p['use_atr_tp'] else []),
+    signal_params={'use_atr_tp': False, 'fast_period': 8, 'slow_period': 21, 'atr_period': 10, 'atr_multiplier': 1.1},
+    backtest_params={'use_atr_tp': False},
+    futures=False,
+))
+
+register_strategy(StrategySpec(
+    name='grid',
+    title='网格策略',
+    strategy_class=GridStrategy,
+    signals=lambda df, p: GridStrategy.calculate_signals(_fill_gaps(df), **p),
+    backtest=lambda df, p, points: GridStrategy.run_backtest(df, equity_points=points, **p),
+    indicators=lambda p: [('ATR', {'timeperiod': p['atr_period']}), ('SMA', {'timeperiod': 20})],
+    signal_params={'grid_levels': 10, 'atr_period': 14},
+    backtest_params={'grid_levels': 10},
+    futures=False,
+))
+
+register_strategy(StrategySpec(
+    name='obv_adx_ema',
+    title='OBV、ADX与EMA组合策略',
+    strategy_class=OBVADXEMAStrategy,
+    signals=lambda df, p: OBVADXEMAStrategy.calculate_signals(df),
+    backtest=lambda df, p, points: OBVADXEMAStrategy.run_backtest(df, equity_points=points),
+    indicators=lambda p: [('EMA', {'timeperiod': 20}), ('OBV', {})],
+    percent_metrics=True,
+))
+
+register_strategy(StrategySpec(
+    name='support_resistance',
+    title='支撑阻力策略',
+    strategy_class=SupportResistanceStrategy,
+    signals=lambda df, p: SupportResistanceStrategy.calculate_signals(
+        _fill_gaps(df, ['open', 'close', 'high', 'low', 'vol', 'amount'])),
+    backtest=lambda df, p, points: SupportResistanceStrategy().run_backtest(df, equity_points=points),
+    indicators=lambda p: [],
+    metrics_key='metrics',
+))
+
+register_strategy(StrategySpec(
+    name='trend_follow',
+    title='趋势跟随策略',
+    strategy_class=TrendFollowStrategy,
+    signals=lambda df, p: TrendFollowStrategy.calculate_signals(df, **p),
+    backtest=lambda df, p, points: TrendFollowStrategy.run_backtest(df, equity_points=points, **p),
+    indicators=lambda p: [('ATR', {'timeperiod': p['atr_period']}), ('ADX', {'timeperiod': p['adx_period']}),
+                          ('EMA', {'timeperiod': p['fast_period']}), ('EMA', {'timeperiod': p['slow_period']})],
+    signal_params={'atr_period': 70, 'adx_period': 14, 'fast_period': 12, 'slow_period': 26},
+    period_params=_trend_follow_period_params,
+    backtest_params={'take_profit_multiple': 1.5, 'stop_loss_multiple': 1.5, 'adx_threshold': 20},
+))
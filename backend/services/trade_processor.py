@@ -0,0 +1,109 @@
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import List, NamedTuple, Optional
+
+from models.signals import Signal
+from services.ledger import Ledger, TradeOutcome, ledger
+from utils.logger import logger
+
+# 交易线程每轮最多合并处理的请求数
+TRADE_PROCESSOR_BATCH = 256
+
+class _TradeRequest(NamedTuple):
+    signals: List[Signal]
+    future: Future
+
+class TradeProcessor:
+    """账户的交易处理线程：各请求把信号放入队列并等待结果，
+    由单个线程按到达顺序逐个请求计算，账户的读-改-写不会互相覆盖。
+    每轮取出队列中已有的全部请求（最多 TRADE_PROCESSOR_BATCH 个）依次计算，
+    每个请求仍单独原子生效，本轮的日志只落盘一次后再返回结果。
+    账户表只有一行，因此只有一个处理线程"""
+
+    def __init__(self, account_ledger: Ledger, max_batch: int = TRADE_PROCESSOR_BATCH):
+        self.ledger = account_ledger
+        self.max_batch = max_batch
+        self.logger = logger
+        self._queue: 'queue.Queue[Optional[_TradeRequest]]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+
+    def submit(self, signals: List[Signal]) -> 'Future[List[TradeOutcome]]':
+        """提交一组信号，返回计算结果的Future"""
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("交易处理线程已停止")
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='trade-processor', daemon=True)
+                self._worker.start()
+            self._queue.put(_TradeRequest(signals, future))
+        return future
+
+    def apply(self, signals: List[Signal]) -> List[TradeOutcome]:
+        """提交并阻塞等待结果"""
+        return self.submit(signals).result()
+
+    async def apply_async(self, signals: List[Signal]) -> List[TradeOutcome]:
+        """提交并在事件循环中等待结果，不占用接口线程"""
+        return await asyncio.wrap_future(self.submit(signals))
+
+    def _run(self) -> None:
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            requests = [request]
+            stop = False
+            while len(requests) < self.max_batch:
+                try:
+                    request = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                requests.append(request)
+            self._process(requests)
+            if stop:
+                return
+
+    def _process(self, requests: List[_TradeRequest]) -> None:
+        results = []
+        for request in requests:
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            try:
+                results.append((request.future, self.ledger.apply_signals(request.signals, sync=False), None))
+            except Exception as e:
+                self.logger.error(f"交易计算失败: {e}", exc_info=True)
+                results.append((request.future, None, e))
+        try:
+            self.ledger.sync_journal()
+        except Exception as e:
+            # 本轮的信号已在账本中生效，之后照常写库，落盘失败只影响崩溃后的重放，仍按成功返回
+            self.logger.error(f"账本日志落盘失败，本轮{len(results)}个请求的变更已生效，等待写库: {e}", exc_info=True)
+        for future, outcomes, error in results:
+            if error is None:
+                future.set_result(outcomes)
+            else:
+                future.set_exception(error)
+        if len(requests) > 1:
+            self.logger.debug(f"交易处理线程合并处理{len(requests)}个请求")
+
+    def close(self) -> None:
+        """处理完队列中已有的请求后停止"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker
+        if worker is not None:
+            self._queue.put(None)
+            worker.join()
+
+# 进程内共享的交易处理线程
+trade_processor = TradeProcessor(ledger)
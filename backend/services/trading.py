@@ -1,10 +1,10 @@
-from sqlalchemy import create_engine, Column, String, Date, DateTime
+from sqlalchemy import Column, String, Date, DateTime
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from datetime import datetime, timedelta
 from typing import Optional
 from models.trading import DailyStrategyAnalysis
 from config import settings
+from database import engine, SessionLocal, ensure_schema
 from utils.logger import logger
 import pandas as pd
 import tushare as ts
@@ -22,9 +22,9 @@ class StrategyAnalysisDB(Base):
 
 class TradingService:
     def __init__(self):
-        self.engine = create_engine(settings.DATABASE_URL or "sqlite:///./trading.db")
-        Base.metadata.create_all(self.engine)
-        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.engine = engine
+        ensure_schema(Base.metadata)
+        self.SessionLocal = SessionLocal
         self.logger = logger
         # 初始化tushare API
         try:
@@ -0,0 +1,138 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional, Set
+
+import numpy as np
+
+from config import is_futures
+from models.account import AccountValuation, PositionValuation
+from services.ledger import FUTURES_MARGIN_RATE, Ledger, ledger, trade_multiplier
+from services.quotes import QuoteCache, quote_cache
+from utils.logger import logger
+
+# 有订阅者时刷新行情并推送估值的间隔（秒）
+VALUATION_REFRESH_INTERVAL = 3.0
+
+class ValuationService:
+    """持仓逐日盯市：汇总账本中的全部持仓，经共享行情缓存一次批量取回行情，
+    按数组计算浮动盈亏、保证金占用和敞口。名义价值按 价格*数量*乘数 计算，
+    与浮动盈亏口径一致；期货保证金为名义价值乘保证金比例，股票为全额名义价值。
+    有订阅者时后台按间隔刷新，每次刷新后把估值推送给所有订阅者，接口不再各自计算"""
+
+    def __init__(self, account_ledger: Ledger, quotes: QuoteCache, interval: float = VALUATION_REFRESH_INTERVAL):
+        self.ledger = account_ledger
+        self.quotes = quotes
+        self.interval = interval
+        self.logger = logger
+        self._latest: Optional[AccountValuation] = None
+        self._latest_at = float('-inf')
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def compute(self) -> AccountValuation:
+        """按最新行情计算一次估值（同步，会访问行情接口）"""
+        account = self.ledger.get_account()
+        positions = self.ledger.get_positions()
+        sides = self.ledger.get_position_sides()
+        quotes = self.quotes.get_many([p.symbol for p in positions])
+
+        n = len(positions)
+        quantity = np.fromiter((p.quantity for p in positions), float, n)
+        cost = np.fromiter((p.price for p in positions), float, n)
+        side = np.fromiter((sides.get(p.symbol, 1) for p in positions), float, n)
+        multiplier = np.fromiter((trade_multiplier(p.symbol) for p in positions), float, n)
+        margin_rate = np.fromiter((FUTURES_MARGIN_RATE if is_futures(p.symbol) else 1.0 for p in positions), float, n)
+        # 没有行情的持仓记为 NaN，不计入合计
+        last = np.fromiter((quotes[p.symbol].price if p.symbol in quotes else np.nan for p in positions), float, n)
+
+        market_value = last * quantity * multiplier
+        unrealized = side * (last - cost) * quantity * multiplier
+        margin = market_value * margin_rate
+
+        unrealized_total = float(np.nansum(unrealized))
+        margin_total = float(np.nansum(margin))
+        equity = account.current_balance + unrealized_total
+
+        def value(x: float) -> Optional[float]:
+            return None if np.isnan(x) else float(x)
+
+        return AccountValuation(
+            time=datetime.now(),
+            available_balance=account.available_balance,
+            current_balance=account.current_balance,
+            realized_profit=account.total_profit,
+            unrealized_pnl=unrealized_total,
+            equity=equity,
+            margin_used=margin_total,
+            margin_ratio=margin_total / equity if equity > 0 else None,
+            gross_exposure=float(np.nansum(market_value)),
+            net_exposure=float(np.nansum(side * market_value)),
+            positions=[
+                PositionValuation(
+                    symbol=p.symbol,
+                    side=int(side[i]),
+                    quantity=p.quantity,
+                    cost_price=p.price,
+                    last_price=value(last[i]),
+                    quote_time=quotes[p.symbol].time if p.symbol in quotes else None,
+                    multiplier=multiplier[i],
+                    market_value=value(market_value[i]),
+                    unrealized_pnl=value(unrealized[i]),
+                    margin=value(margin[i])
+                ) for i, p in enumerate(positions)
+            ],
+            missing_quotes=[p.symbol for p in positions if p.symbol not in quotes]
+        )
+
+    async def refresh(self) -> AccountValuation:
+        """刷新估值并推送给订阅者"""
+        valuation = await asyncio.to_thread(self.compute)
+        self._latest, self._latest_at = valuation, time.monotonic()
+        for queue in list(self._subscribers):
+            # 订阅者只需要最新的估值，来不及消费的旧估值直接丢弃
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(valuation)
+        return valuation
+
+    async def latest(self) -> AccountValuation:
+        """返回最近一次估值，超过刷新间隔时先刷新"""
+        if self._latest is None or time.monotonic() - self._latest_at >= self.interval:
+            return await self.refresh()
+        return self._latest
+
+    def subscribe(self) -> 'asyncio.Queue[AccountValuation]':
+        """订阅估值推送，返回的队列中始终只保留最新一次估值；需在事件循环中调用"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        if self._latest is not None:
+            queue.put_nowait(self._latest)
+        self._subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    async def _run(self) -> None:
+        self.logger.info("持仓估值推送开始")
+        while self._subscribers:
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.logger.error(f"持仓估值失败: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+        self.logger.info("持仓估值推送结束：没有订阅者")
+
+    async def close(self) -> None:
+        self._subscribers.clear()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+# 进程内共享的持仓估值服务
+valuation_service = ValuationService(ledger, quote_cache)
@@ -0,0 +1,223 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.param_sweep import (
+    ParamSweepService,
+    RANK_METRICS,
+    calculate_strategy_signals,
+    rank_results,
+    run_strategy_backtest,
+    split_params,
+    summarize_result,
+    worker_context,
+)
+from utils.equity_curve import EQUITY_CURVE_POINTS, downsample_curve
+from utils.logger import logger
+
+# 各策略信号数据所在的主时间轴
+PRIMARY_FRAME = {
+    'dual_ma': 'bars',
+    'grid': 'bars',
+    'trend_follow': '15min',
+}
+
+def build_windows(dates: pd.Series, in_sample_bars: int, out_of_sample_bars: int, anchored: bool = False) -> List[Dict[str, Any]]:
+    """按K线数量切分滚动的样本内/样本外窗口，样本外窗口首尾相接"""
+    dates = pd.Series(pd.to_datetime(dates)).sort_values().reset_index(drop=True)
+    windows = []
+    start = 0
+    while start + in_sample_bars + out_of_sample_bars <= len(dates):
+        is_start = 0 if anchored else start
+        is_end = start + in_sample_bars
+        oos_end = is_end + out_of_sample_bars
+        windows.append({
+            'in_sample': (dates[is_start], dates[is_end - 1]),
+            'out_of_sample': (dates[is_end], dates[oos_end - 1]),
+        })
+        start += out_of_sample_bars
+    return windows
+
+def slice_signals(df_with_signals: pd.DataFrame, start: pd.Timestamp, end: pd.Timestamp) -> pd.DataFrame:
+    """按时间截取信号数据，兼容date为列或为索引两种情况"""
+    if 'date' in df_with_signals.columns:
+        mask = (df_with_signals['date'] >= start) & (df_with_signals['date'] <= end)
+        return df_with_signals[mask]
+    return df_with_signals.loc[start:end]
+
+def _relative_curve(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """窗口的逐K线资金曲线换算为相对窗口初始资金的倍数，便于各窗口首尾相接"""
+    curve = result.get('equity_curve') or []
+    total_returns = result.get('total_returns')
+    if not curve or total_returns is None or not np.isfinite(total_returns) or total_returns <= -1:
+        return []
+    # 回测的总收益即曲线末点相对初始资金的收益，由此还原初始资金
+    initial = curve[-1]['equity'] / (1 + total_returns)
+    if initial <= 0:
+        return []
+    return [{'date': point['date'], 'equity': point['equity'] / initial} for point in curve]
+
+def _evaluate_windows(task: Tuple[Dict[str, Any], List[Dict[str, Any]], List[Tuple], bool]) -> List[Dict[str, Any]]:
+    """子进程任务：同一组信号参数只计算一次指标和信号，在所有窗口和回测参数上复用。
+    keep_details 为真时（样本外回测）另外返回成交记录和完整的逐K线相对资金曲线"""
+    signal_params, backtest_param_list, ranges, keep_details = task
+    strategy, frames = worker_context()
+    try:
+        df_with_signals = calculate_strategy_signals(strategy, frames, signal_params)
+    except Exception as e:
+        return [{'params': {**signal_params, **bp}, 'windows': [None] * len(ranges), 'error': str(e)} for bp in backtest_param_list]
+
+    outputs = []
+    for backtest_params in backtest_param_list:
+        window_results = []
+        for start, end in ranges:
+            try:
+                if keep_details:
+                    result = run_strategy_backtest(strategy, slice_signals(df_with_signals, start, end),
+                                                   {**backtest_params, 'equity_points': None})
+                else:
+                    result = run_strategy_backtest(strategy, slice_signals(df_with_signals, start, end), backtest_params)
+                summary = summarize_result(result)
+                if keep_details:
+                    summary['trade_list'] = result.get('trades', [])
+                    summary['equity_curve'] = _relative_curve(result)
+                window_results.append(summary)
+            except Exception:
+                window_results.append(None)  # 窗口内数据不足等情况视为无效
+        outputs.append({'params': {**signal_params, **backtest_params}, 'windows': window_results, 'error': None})
+    return outputs
+
+def _group_by_signal_params(strategy: str, combos: List[Dict[str, Any]]) -> Dict[Tuple, Tuple[Dict, List[Dict]]]:
+    groups: Dict[Tuple, Tuple[Dict, List[Dict]]] = {}
+    for params in combos:
+        signal_params, backtest_params = split_params(strategy, params)
+        key = tuple(sorted(signal_params.items()))
+        groups.setdefault(key, (signal_params, []))[1].append(backtest_params)
+    return groups
+
+def _format_range(value: Tuple[pd.Timestamp, pd.Timestamp]) -> Dict[str, str]:
+    return {'start': value[0].strftime('%Y-%m-%d %H:%M'), 'end': value[1].strftime('%Y-%m-%d %H:%M')}
+
+class WalkForwardService:
+    """滚动样本内优化、样本外检验的前向分析服务"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.sweep_service = ParamSweepService(max_workers=max_workers)
+        self.logger = logger
+
+    def run(self, strategy: str, frames: Dict[str, pd.DataFrame], param_ranges: Dict[str, Any],
+            in_sample_bars: int, out_of_sample_bars: int, rank_by: str = 'sharpe_ratio',
+            anchored: bool = False, equity_points: Optional[int] = EQUITY_CURVE_POINTS) -> Dict[str, Any]:
+        """执行前向分析
+        Args:
+            strategy: 策略名称 dual_ma/grid/trend_follow
+            frames: 回测数据，格式同参数扫描
+            param_ranges: 参数名 -> 取值范围
+            in_sample_bars: 样本内窗口K线数
+            out_of_sample_bars: 样本外窗口K线数（同时也是窗口滚动步长）
+            rank_by: 样本内优化指标
+            anchored: 是否固定样本内起点（扩张窗口）
+            equity_points: 拼接后的样本外资金曲线降采样后的最大点数，为空时返回全部K线
+        """
+        if rank_by not in RANK_METRICS:
+            raise ValueError(f"不支持的排序指标: {rank_by}，可选: {RANK_METRICS}")
+        if in_sample_bars <= 0 or out_of_sample_bars <= 0:
+            raise ValueError("样本内和样本外窗口长度必须大于0")
+
+        combos = self.sweep_service.iter_param_grid(strategy, param_ranges)
+        windows = build_windows(frames[PRIMARY_FRAME[strategy]]['date'], in_sample_bars, out_of_sample_bars, anchored)
+        if not windows:
+            raise ValueError(f"数据长度不足以切分窗口: 需要至少 {in_sample_bars + out_of_sample_bars} 根K线")
+        self.logger.info(f"开始前向分析: 策略={strategy}, 参数组合={len(combos)}, 窗口数={len(windows)}")
+
+        # 第一轮：所有参数组合在全部样本内窗口上回测，每组信号参数只计算一次信号
+        groups = _group_by_signal_params(strategy, combos)
+        is_ranges = [w['in_sample'] for w in windows]
+        tasks = [(signal_params, backtest_list, is_ranges, False) for signal_params, backtest_list in groups.values()]
+        in_sample = [item for chunk in self.sweep_service.map_params(strategy, frames, tasks, _evaluate_windows) for item in chunk]
+
+        # 每个窗口选出样本内最优参数
+        best_by_window = []
+        for i in range(len(windows)):
+            candidates = [{'params': r['params'], **r['windows'][i]} for r in in_sample if r['windows'][i] is not None]
+            ranked = rank_results(candidates, rank_by)
+            best_by_window.append(ranked[0] if ranked and ranked[0][rank_by] is not None else None)
+
+        # 第二轮：只对被选中的参数在对应样本外窗口上回测
+        selected: Dict[Tuple, Tuple[Dict, List[int]]] = {}
+        for i, best in enumerate(best_by_window):
+            if best is not None:
+                selected.setdefault(tuple(sorted(best['params'].items())), (best['params'], []))[1].append(i)
+        tasks = []
+        task_windows = []
+        for params, window_ids in selected.values():
+            signal_params, backtest_params = split_params(strategy, params)
+            tasks.append((signal_params, [backtest_params], [windows[i]['out_of_sample'] for i in window_ids], True))
+            task_windows.append(window_ids)
+        out_of_sample: Dict[int, Optional[Dict]] = {}
+        if tasks:
+            for window_ids, chunk in zip(task_windows, self.sweep_service.map_params(strategy, frames, tasks, _evaluate_windows)):
+                for i, summary in zip(window_ids, chunk[0]['windows']):
+                    out_of_sample[i] = summary
+
+        return self._stitch(strategy, rank_by, windows, best_by_window, out_of_sample, equity_points)
+
+    def _stitch(self, strategy: str, rank_by: str, windows: List[Dict], best_by_window: List[Optional[Dict]],
+                out_of_sample: Dict[int, Optional[Dict]],
+                equity_points: Optional[int] = EQUITY_CURVE_POINTS) -> Dict[str, Any]:
+        """拼接各样本外窗口的结果：每个窗口的逐K线资金曲线按此前累计的资金缩放后首尾相接，
+        生成连续的样本外资金曲线；没有样本外结果的窗口资金不变"""
+        equity = 1.0
+        curve_dates: List[str] = []
+        curve_values: List[float] = []
+        trades = []
+        window_reports = []
+        is_scores = []
+        oos_scores = []
+        for i, window in enumerate(windows):
+            best = best_by_window[i]
+            oos = out_of_sample.get(i)
+            oos_return = oos['total_returns'] if oos and oos['total_returns'] is not None else 0.0
+            window_curve = oos.pop('equity_curve', []) if oos else []
+            if window_curve:
+                curve_dates.extend(point['date'] for point in window_curve)
+                curve_values.extend(equity * point['equity'] for point in window_curve)
+            else:
+                curve_dates.append(window['out_of_sample'][1].strftime('%Y-%m-%d %H:%M'))
+                curve_values.append(equity * (1 + oos_return))
+            equity *= 1 + oos_return
+            if oos:
+                trades.extend(dict(t, window=i) for t in oos.pop('trade_list', []))
+            if best and best[rank_by] is not None and oos and oos[rank_by] is not None:
+                is_scores.append(best[rank_by])
+                oos_scores.append(oos[rank_by])
+            window_reports.append({
+                'window': i,
+                'in_sample': _format_range(window['in_sample']),
+                'out_of_sample': _format_range(window['out_of_sample']),
+                'best_params': best['params'] if best else None,
+                'in_sample_metrics': {k: v for k, v in best.items() if k != 'params'} if best else None,
+                'out_of_sample_metrics': oos,
+            })
+
+        oos_total_trades = sum(r['out_of_sample_metrics']['trades'] for r in window_reports if r['out_of_sample_metrics'])
+        is_mean = sum(is_scores) / len(is_scores) if is_scores else None
+        oos_mean = sum(oos_scores) / len(oos_scores) if oos_scores else None
+        self.logger.info(f"前向分析完成: 策略={strategy}, 样本外累计收益={equity - 1:.2%}")
+        return {
+            'strategy': strategy,
+            'rank_by': rank_by,
+            'windows': window_reports,
+            'summary': {
+                'window_count': len(windows),
+                'total_returns': equity - 1,
+                'total_trades': oos_total_trades,
+                'in_sample_mean': is_mean,
+                'out_of_sample_mean': oos_mean,
+                # 样本外/样本内指标均值之比，衡量参数的样本外稳定性
+                'walk_forward_efficiency': oos_mean / is_mean if is_mean and is_mean > 0 and oos_mean is not None else None,
+            },
+            'equity_curve': downsample_curve(pd.to_datetime(curve_dates).values, np.array(curve_values), equity_points),
+            'trades': trades,
+        }
@@ -1,27 +1,33 @@
 import pandas as pd
 import numpy as np
-import talib
-from typing import List, Dict
+from utils.indicator_cache import cached_indicator
+from typing import List, Dict, Optional
+from utils.equity_curve import EQUITY_CURVE_POINTS, bar_dates, build_equity_curve
 from utils.logger import logger
 
 class DualMAStrategy:
     """双均线策略 - EMA8和EMA21"""
 
     @staticmethod
-    def calculate_signals(df: pd.DataFrame, use_atr_tp: bool = False) -> pd.DataFrame:
+    def calculate_signals(df: pd.DataFrame, use_atr_tp: bool = False, fast_period: int = 8, slow_period: int = 21,
+                          atr_period: int = 10, atr_multiplier: float = 1.1) -> pd.DataFrame:
         """计算交易信号
         Args:
             df: 行情数据
             use_atr_tp: 是否使用ATR止盈
+            fast_period: 短期EMA周期
+            slow_period: 长期EMA周期
+            atr_period: ATR周期
+            atr_multiplier: ATR止盈倍数
         """
         logger.info("开始计算交易信号")
         
         # 确保时间索引对齐
         df = df.set_index('date')
         
-        # 计算EMA8和EMA21
-        df['ema8'] = talib.EMA(df['close'], timeperiod=8)
-        df['ema21'] = talib.EMA(df['close'], timeperiod=21)
+        # 计算EMA8和EMA21（列名保持不变，周期可调）
+        df['ema8'] = cached_indicator(df, 'EMA', timeperiod=fast_period)
+        df['ema21'] = cached_indicator(df, 'EMA', timeperiod=slow_period)
         
         # 计算金叉死叉
         df['cross_over'] = (df['ema8'] > df['ema21']) & (df['ema8'].shift(1) <= df['ema21'].shift(1))
@@ -29,8 +35,8 @@ class DualMAStrategy:
         
         # 如果开启ATR止盈，计算ATR
         if use_atr_tp:
-            df['atr'] = talib.ATR(df['high'], df['low'], df['close'], timeperiod=10)
-            df['tp_price'] = df['close'] + df['atr'] * 1.1  # 1.1倍ATR止盈价可以达到100%胜率
+            df['atr'] = cached_indicator(df, 'ATR', timeperiod=atr_period)
+            df['tp_price'] = df['close'] + df['atr'] * atr_multiplier  # 1.1倍ATR止盈价可以达到100%胜率
         
         # 生成交易信号
         df['trade_signal'] = 0
@@ -41,11 +47,13 @@ class DualMAStrategy:
         return df
 
     @staticmethod
-    def run_backtest(df: pd.DataFrame, use_atr_tp: bool = False) -> Dict:
+    def run_backtest(df: pd.DataFrame, use_atr_tp: bool = False,
+                     equity_points: Optional[int] = EQUITY_CURVE_POINTS) -> Dict:
         """执行回测
         Args:
             df: 行情数据
             use_atr_tp: 是否使用ATR止盈
+            equity_points: 返回的资金曲线点数（保留极值的降采样），为空时返回逐K线曲线
         """
         logger.info("开始执行回测")
         
@@ -61,7 +69,9 @@ class DualMAStrategy:
         returns = []
         monthly_profits = {}
         
-        for date, row in df.iterrows():
+        # 逐行访问改为遍历字典记录，避免iterrows为每一行构造Series
+        columns = ['close', 'high', 'trade_signal'] + (['tp_price'] if use_atr_tp else [])
+        for date, row in zip(df.index, df[columns].to_dict('records')):
             if position == 0:  # 没有持仓
                 if row['trade_signal'] == 1:  # 金叉开多
                     position = 1
@@ -116,7 +126,7 @@ class DualMAStrategy:
         
         # 计算月度盈亏
         for trade in trades:
-            month_key = pd.to_datetime(trade['exit_date']).strftime('%Y-%m')
+            month_key = trade['exit_date'][:7]  # exit_date格式为%Y-%m-%d %H:%M，直接截取年月
             if month_key not in monthly_profits:
                 monthly_profits[month_key] = 0
             monthly_profits[month_key] += trade['pnl']
@@ -146,56 +156,10 @@ class DualMAStrategy:
                 'exit_type': 'last_position'
             })
         
-        # 计算回测指标
+        # 由逐K线盯市资金曲线计算收益、夏普比率和最大回撤，持仓期间的浮动亏损计入回撤
         returns = np.array(returns)
-        total_returns = float(np.prod(1 + returns) - 1)  # 使用几何平均计算总收益
-        
-        # 根据数据周期确定年化因子
-        if len(df) > 0:
-            # 计算数据的时间跨度（年）
-            time_span = (df.index[-1] - df.index[0]).days / 365.0
-            
-            # 计算年化收益率
-            if time_span > 0:
-                annual_returns = float((1 + total_returns) ** (1 / time_span) - 1)
-            else:
-                annual_returns = 0.0
-        else:
-            annual_returns = 0.0
-
-        # 计算夏普比率 (假设无风险利率为0)
-        risk_free_rate = 0.0
-        excess_returns = returns - risk_free_rate
-
-        # 根据数据周期确定年化因子
-        if len(df) > 0:
-            # 计算数据的时间跨度（年）
-            time_span = (df.index[-1] - df.index[0]).days / 365.0
-            
-            # 计算年化因子
-            if time_span > 0:
-                # 计算平均每个交易日的收益率数量
-                daily_returns_count = len(returns) / (time_span * 252)  # 252是每年的交易日数
-                annualization_factor = np.sqrt(daily_returns_count * 252)
-            else:
-                annualization_factor = 1.0
-        else:
-            annualization_factor = 1.0
-
-        # 计算夏普比率
-        if len(returns) > 0:
-            sharpe_ratio = float(np.mean(excess_returns) / np.std(excess_returns) * annualization_factor)
-        else:
-            sharpe_ratio = 0.0
-        
-        # 计算最大回撤
-        portfolio_values = [initial_capital]
-        for ret in returns:
-            portfolio_values.append(portfolio_values[-1] * (1 + ret))
-        portfolio_values = np.array(portfolio_values)
-        peak = np.maximum.accumulate(portfolio_values)
-        drawdowns = (peak - portfolio_values) / peak
-        max_drawdown = float(np.max(drawdowns)) if len(drawdowns) > 0 else 0.0
+        curve = build_equity_curve(bar_dates(df), df['close'].to_numpy(dtype=np.float64), trades,
+                                   initial_capital, max_points=equity_points)
         
         # 计算总收益和手续费
         total_profit = float(sum(trade['pnl'] for trade in trades))
@@ -213,17 +177,18 @@ class DualMAStrategy:
             trade['commission'] = float(trade['commission'])
             trade['shares'] = int(trade['shares'])  # 股数保持为整数
         
-        logger.info(f"回测完成，总交易次数: {len(trades)}, 总收益率: {total_returns:.2%}")
+        logger.info(f"回测完成，总交易次数: {len(trades)}, 总收益率: {curve['total_returns']:.2%}")
         
         return {
-            'total_returns': total_returns,
-            'annual_returns': annual_returns,
-            'sharpe_ratio': sharpe_ratio,
-            'max_drawdown': max_drawdown,
+            'total_returns': curve['total_returns'],
+            'annual_returns': curve['annual_returns'],
+            'sharpe_ratio': curve['sharpe_ratio'],
+            'max_drawdown': curve['max_drawdown'],
             'win_rate': float(np.sum(returns > 0) / len(returns)) if len(returns) > 0 else 0.0,
             'total_profit': total_profit,
             'commission': commission,
             'net_profit': net_profit,
             'monthly_profits': monthly_profits,
+            'equity_curve': curve['equity_curve'],
             'trades': trades
         } 
\ No newline at end of file
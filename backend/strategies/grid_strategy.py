@@ -1,12 +1,18 @@
 import pandas as pd
 import numpy as np
-import talib
-from typing import List, Dict
+from utils.indicator_cache import cached_indicator
+from typing import List, Dict, Optional
+from utils.equity_curve import EQUITY_CURVE_POINTS, bar_dates, build_equity_curve
 from utils.logger import logger
 
 class GridStrategy:
     """豆粕网格交易策略"""
 
+    @staticmethod
+    def grid_prices(bb_lower: np.ndarray, grid_height: np.ndarray, grid_levels: int) -> np.ndarray:
+        """网格价位矩阵：第i列为 bb_lower + i * grid_height，共 grid_levels + 1 列"""
+        return bb_lower[:, None] + np.arange(grid_levels + 1) * grid_height[:, None]
+
     @staticmethod
     def calculate_signals(df: pd.DataFrame, grid_levels: int = 10, atr_period: int = 14) -> pd.DataFrame:
         """计算网格交易信号
@@ -18,11 +24,15 @@ class GridStrategy:
         try:
             logger.info("开始计算网格交易信号")
             
+            # 网格价位和持仓盈亏逐行计算，价格列统一转为float64，避免float32标量参与运算损失精度
+            for col in ['open', 'high', 'low', 'close']:
+                df[col] = df[col].astype(np.float64)
+            
             # 计算ATR用于动态调整网格范围
-            df['atr'] = talib.ATR(df['high'].values, df['low'].values, df['close'].values, timeperiod=atr_period)
+            df['atr'] = cached_indicator(df, 'ATR', timeperiod=atr_period)
             
             # 计算布林带作为网格范围的参考
-            df['sma20'] = talib.SMA(df['close'].values, timeperiod=20)
+            df['sma20'] = cached_indicator(df, 'SMA', timeperiod=20)
             df['std20'] = df['close'].rolling(window=20).std()
             df['bb_upper'] = df['sma20'] + 2 * df['std20']
             df['bb_lower'] = df['sma20'] - 2 * df['std20']
@@ -33,28 +43,23 @@ class GridStrategy:
             # 计算网格
             df['grid_height'] = (df['bb_upper'] - df['bb_lower']) / grid_levels
             
-            # 生成网格价位
-            df['grids'] = df.apply(
-                lambda x: [float(x['bb_lower'] + i * x['grid_height']) for i in range(grid_levels + 1)],
-                axis=1
-            )
-            
-            # 计算当前价格所在的网格位置
-            df['current_grid'] = df.apply(
-                lambda x: min(max(0, int(np.digitize(x['close'], x['grids']) - 1)), grid_levels - 1),
-                axis=1
-            )
+            # 网格价位矩阵（K线数 × 网格价位数）及当前价格所在的网格
+            grids = GridStrategy.grid_prices(df['bb_lower'].to_numpy(), df['grid_height'].to_numpy(), grid_levels)
+            close = df['close'].to_numpy()
+            rows = np.arange(len(df))
+            # 与 np.digitize 一致：不高于收盘价的网格价位个数 - 1，限制在 [0, grid_levels-1]
+            current_grid = np.clip((grids <= close[:, None]).sum(axis=1) - 1, 0, grid_levels - 1)
+            df['current_grid'] = current_grid
+            df['grid_price'] = grids[rows, current_grid]
             
             # 生成交易信号
             df['trade_signal'] = 0
             
             # 计算价格相对于当前网格的位置
-            df['grid_position'] = df.apply(
-                lambda x: (x['close'] - x['grids'][x['current_grid']]) / x['grid_height']
-                if not pd.isna(x['grid_height']) and x['grid_height'] != 0
-                else 0.5,
-                axis=1
-            )
+            grid_height = df['grid_height'].to_numpy()
+            valid = ~np.isnan(grid_height) & (grid_height != 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                df['grid_position'] = np.where(valid, (close - df['grid_price'].to_numpy()) / grid_height, 0.5)
             
             # 当价格接近上方网格时做空，接近下方网格时做多
             df.loc[df['grid_position'] > 0.8, 'trade_signal'] = -1  # 接近上方网格，做空
@@ -72,11 +77,13 @@ class GridStrategy:
             raise ValueError(error_msg)
 
     @staticmethod
-    def run_backtest(df: pd.DataFrame, grid_levels: int = 10) -> Dict:
+    def run_backtest(df: pd.DataFrame, grid_levels: int = 10,
+                     equity_points: Optional[int] = EQUITY_CURVE_POINTS) -> Dict:
         """执行回测
         Args:
             df: 行情数据
             grid_levels: 网格数量
+            equity_points: 返回的资金曲线点数（保留极值的降采样），为空时返回逐K线曲线
         """
         logger.info("开始执行网格策略回测")
         
@@ -85,168 +92,122 @@ class GridStrategy:
         position_size = current_assets * 0.95 / grid_levels  # 每个网格使用的资金
         
         trades: List[Dict] = []
-        positions = {}  # 记录每个网格的持仓情况
         total_pnl = 0
         returns = []
         monthly_profits = {}
         
-        for _, row in df.iterrows():
-            # 获取当前网格价位
-            current_grid = row['current_grid']
-            grid_prices = row['grids']
-            
-            # 检查是否需要在当前网格位置开仓
-            if row['trade_signal'] != 0:
-                # 计算开仓数量（基于资金管理和趋势强度）
-                position_multiplier = min(abs(row['trend_strength']), 2.0)  # 最大加倍2倍
-                shares_per_lot = 100  # ETF每手100股
-                max_lots = int(position_size * position_multiplier / (row['close'] * shares_per_lot))
-                num_shares = max_lots * shares_per_lot
-                
-                if num_shares > 0:
-                    grid_key = f"grid_{current_grid}"
-                    
-                    # 开仓
-                    if row['trade_signal'] == 1 and grid_key not in positions:  # 做多
-                        entry_price = row['close']
-                        positions[grid_key] = {
-                            'type': 'long',
-                            'price': entry_price,
-                            'shares': num_shares,
-                            'date': row['date']
-                        }
-                        
-                    elif row['trade_signal'] == -1 and grid_key not in positions:  # 做空
-                        entry_price = row['close']
-                        positions[grid_key] = {
-                            'type': 'short',
-                            'price': entry_price,
-                            'shares': num_shares,
-                            'date': row['date']
-                        }
-            
-            # 检查是否需要平仓
-            grids_to_remove = []
-            for grid_key, position in positions.items():
-                grid_num = int(grid_key.split('_')[1])
-                
-                # 计算止盈价位
-                if position['type'] == 'long':
-                    take_profit = grid_prices[grid_num + 1] if grid_num < len(grid_prices) - 1 else None
-                    if take_profit and row['high'] >= take_profit:
-                        # 平多仓
-                        exit_price = take_profit
-                        pnl = (exit_price - position['price']) * position['shares']
-                        total_pnl += pnl
-                        current_assets += pnl
-                        returns.append(pnl / position_size)
-                        
-                        trades.append({
-                            'entry_date': position['date'].strftime('%Y-%m-%d %H:%M'),
-                            'entry_price': float(position['price']),
-                            'exit_date': row['date'].strftime('%Y-%m-%d %H:%M'),
-                            'exit_price': float(exit_price),
-                            'position': 'long',
-                            'shares': position['shares'],
-                            'pnl': float(pnl),
-                            'grid': grid_num
-                        })
-                        
-                        grids_to_remove.append(grid_key)
-                        
-                else:  # short position
-                    take_profit = grid_prices[grid_num - 1] if grid_num > 0 else None
-                    if take_profit and row['low'] <= take_profit:
-                        # 平空仓
-                        exit_price = take_profit
-                        pnl = (position['price'] - exit_price) * position['shares']
-                        total_pnl += pnl
-                        current_assets += pnl
-                        returns.append(pnl / position_size)
-                        
-                        trades.append({
-                            'entry_date': position['date'].strftime('%Y-%m-%d %H:%M'),
-                            'entry_price': float(position['price']),
-                            'exit_date': row['date'].strftime('%Y-%m-%d %H:%M'),
-                            'exit_price': float(exit_price),
-                            'position': 'short',
-                            'shares': position['shares'],
-                            'pnl': float(pnl),
-                            'grid': grid_num
-                        })
-                        
-                        grids_to_remove.append(grid_key)
-            
-            # 移除已平仓的网格
-            for grid_key in grids_to_remove:
-                del positions[grid_key]
+        n = len(df)
+        close = df['close'].to_numpy(dtype=np.float64)
+        high = df['high'].to_numpy(dtype=np.float64)
+        low = df['low'].to_numpy(dtype=np.float64)
+        bb_lower = df['bb_lower'].to_numpy(dtype=np.float64)
+        grid_height = df['grid_height'].to_numpy(dtype=np.float64)
+        signal = df['trade_signal'].to_numpy()
+        current_grid = df['current_grid'].to_numpy()
+        trend_strength = df['trend_strength'].to_numpy(dtype=np.float64)
+        labels = pd.DatetimeIndex(bar_dates(df)).strftime('%Y-%m-%d %H:%M')
+        
+        # 各网格止盈价位被触及的K线下标，按需计算：多头在上一格价位止盈（最高价触及），空头在下一格价位止盈（最低价触及）
+        hit_cache: Dict[tuple, np.ndarray] = {}
+        
+        def next_exit(side: int, grid_num: int, start: int) -> int:
+            """持仓从 start 起第一根触及止盈价位的K线下标，没有时为n（持有到最后）"""
+            target = grid_num + side
+            if target < 0 or target > grid_levels:
+                return n
+            key = (side, target)
+            hits = hit_cache.get(key)
+            if hits is None:
+                take_profit = bb_lower + target * grid_height
+                touched = high >= take_profit if side == 1 else low <= take_profit
+                hits = hit_cache[key] = np.flatnonzero(touched & (take_profit != 0))
+            pos = np.searchsorted(hits, start)
+            return int(hits[pos]) if pos < len(hits) else n
         
-        # 处理未平仓的持仓
-        last_row = df.iloc[-1]
-        for grid_key, position in positions.items():
-            exit_price = last_row['close']
-            if position['type'] == 'long':
-                pnl = (exit_price - position['price']) * position['shares']
+        # 固定大小的持仓簿：每个网格一个槽位，记录方向、开仓价、股数、开仓和平仓K线下标；
+        # 平仓K线不早于当前K线的网格视为仍有持仓（同一根K线先开仓后检查止盈）
+        book_side = np.zeros(grid_levels, dtype=np.int8)
+        book_price = np.zeros(grid_levels)
+        book_shares = np.zeros(grid_levels, dtype=np.int64)
+        book_entry = np.full(grid_levels, -1, dtype=np.int64)
+        book_exit = np.full(grid_levels, -1, dtype=np.int64)
+        closed = []  # (平仓下标, 开仓下标, 网格, 方向, 开仓价, 股数)
+        
+        def release(grid_num: int) -> None:
+            if book_entry[grid_num] >= 0:
+                closed.append((int(book_exit[grid_num]), int(book_entry[grid_num]), grid_num,
+                               int(book_side[grid_num]), book_price[grid_num], int(book_shares[grid_num])))
+        
+        shares_per_lot = 100  # ETF每手100股
+        for i in np.flatnonzero(signal != 0):
+            grid_num = int(current_grid[i])
+            if book_exit[grid_num] >= i:
+                continue
+            # 计算开仓数量（基于资金管理和趋势强度）
+            position_multiplier = min(abs(trend_strength[i]), 2.0)  # 最大加倍2倍
+            max_lots = int(position_size * position_multiplier / (close[i] * shares_per_lot))
+            num_shares = max_lots * shares_per_lot
+            if num_shares <= 0:
+                continue
+            release(grid_num)
+            side = 1 if signal[i] == 1 else -1
+            book_side[grid_num] = side
+            book_price[grid_num] = close[i]
+            book_shares[grid_num] = num_shares
+            book_entry[grid_num] = i
+            book_exit[grid_num] = next_exit(side, grid_num, i)
+        for grid_num in range(grid_levels):
+            release(grid_num)
+        
+        # 按平仓K线、同一K线内按开仓先后生成成交记录，未平仓的持仓按最后收盘价平仓
+        closed.sort()
+        for exit_idx, entry_idx, grid_num, side, entry_price, shares in closed:
+            if exit_idx < n:
+                exit_price = bb_lower[exit_idx] + (grid_num + side) * grid_height[exit_idx]
+                exit_label = labels[exit_idx]
             else:
-                pnl = (position['price'] - exit_price) * position['shares']
-            
+                exit_price = close[-1]
+                exit_label = labels[-1]
+            pnl = (exit_price - entry_price) * shares if side == 1 else (entry_price - exit_price) * shares
             total_pnl += pnl
             current_assets += pnl
             returns.append(pnl / position_size)
             
             trades.append({
-                'entry_date': position['date'].strftime('%Y-%m-%d %H:%M'),
-                'entry_price': float(position['price']),
-                'exit_date': last_row['date'].strftime('%Y-%m-%d %H:%M'),
+                'entry_date': labels[entry_idx],
+                'entry_price': float(entry_price),
+                'exit_date': exit_label,
                 'exit_price': float(exit_price),
-                'position': position['type'],
-                'shares': position['shares'],
+                'position': 'long' if side == 1 else 'short',
+                'shares': shares,
                 'pnl': float(pnl),
-                'grid': int(grid_key.split('_')[1])
+                'grid': grid_num
             })
         
+
         # 计算月度盈亏
         for trade in trades:
-            month_key = pd.to_datetime(trade['exit_date']).strftime('%Y-%m')
+            month_key = trade['exit_date'][:7]  # exit_date格式为%Y-%m-%d %H:%M，直接截取年月
             if month_key not in monthly_profits:
                 monthly_profits[month_key] = 0
             monthly_profits[month_key] += trade['pnl']
         
-        # 计算回测指标
+        # 由逐K线盯市资金曲线计算收益、夏普比率和最大回撤，持仓期间的浮动亏损计入回撤
         returns = np.array(returns)
-        total_returns = float(np.prod(1 + returns) - 1)  # 使用几何平均计算总收益
-        
-        # 计算年化收益率
-        if len(df) > 0:
-            time_span = (df['date'].max() - df['date'].min()).days / 365.0
-            annual_returns = float((1 + total_returns) ** (1 / time_span) - 1) if time_span > 0 else 0.0
-        else:
-            annual_returns = 0.0
-        
-        # 计算夏普比率
-        risk_free_rate = 0.0
-        if len(returns) > 0:
-            excess_returns = returns - risk_free_rate
-            sharpe_ratio = float(np.mean(excess_returns) / np.std(excess_returns) * np.sqrt(252))
-        else:
-            sharpe_ratio = 0.0
-        
-        # 计算最大回撤
-        portfolio_values = np.array([initial_capital] + [initial_capital * (1 + ret) for ret in returns])
-        peak = np.maximum.accumulate(portfolio_values)
-        drawdowns = (peak - portfolio_values) / peak
-        max_drawdown = float(np.max(drawdowns)) if len(drawdowns) > 0 else 0.0
+        curve = build_equity_curve(bar_dates(df), df['close'].to_numpy(dtype=np.float64), trades,
+                                   initial_capital, max_points=equity_points)
         
-        logger.info(f"回测完成，总交易次数: {len(trades)}, 总收益率: {total_returns:.2%}")
+        logger.info(f"回测完成，总交易次数: {len(trades)}, 总收益率: {curve['total_returns']:.2%}")
         
         return {
-            'total_returns': total_returns,
-            'annual_returns': annual_returns,
-            'sharpe_ratio': sharpe_ratio,
-            'max_drawdown': max_drawdown,
+            'total_returns': curve['total_returns'],
+            'annual_returns': curve['annual_returns'],
+            'sharpe_ratio': curve['sharpe_ratio'],
+            'max_drawdown': curve['max_drawdown'],
             'win_rate': float(np.sum(returns > 0) / len(returns)) if len(returns) > 0 else 0.0,
             'total_profit': float(total_pnl),
             'final_assets': float(current_assets),
             'monthly_profits': {k: float(v) for k, v in monthly_profits.items()},
+            'equity_curve': curve['equity_curve'],
             'trades': trades
         } 
\ No newline at end of file
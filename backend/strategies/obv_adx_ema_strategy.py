@@ -1,7 +1,8 @@
 import pandas as pd
 import numpy as np
-import talib
-from typing import List, Dict
+from utils.indicator_cache import cached_indicator
+from typing import List, Dict, Optional
+from utils.equity_curve import EQUITY_CURVE_POINTS, bar_dates, build_equity_curve
 from utils.logger import logger
 
 class OBVADXEMAStrategy:
@@ -16,10 +17,10 @@ class OBVADXEMAStrategy:
         df_60min = df_60min.set_index('date')
         
         # 计算EMA指标
-        df_60min['ema20'] = talib.EMA(df_60min['close'], timeperiod=20)
+        df_60min['ema20'] = cached_indicator(df_60min, 'EMA', timeperiod=20)
         
         # 计算OBV指标
-        df_60min['obv'] = talib.OBV(df_60min['close'], df_60min['volume'])
+        df_60min['obv'] = cached_indicator(df_60min, 'OBV')
         
         # 计算OBV变化率
         df_60min['obv_change'] = df_60min['obv'].diff()
@@ -55,8 +56,12 @@ class OBVADXEMAStrategy:
         return df_60min
 
     @staticmethod
-    def run_backtest(df_60min: pd.DataFrame) -> Dict:
-        """执行回测"""
+    def run_backtest(df_60min: pd.DataFrame, equity_points: Optional[int] = EQUITY_CURVE_POINTS) -> Dict:
+        """执行回测
+        Args:
+            df_60min: 带信号的60分钟数据
+            equity_points: 返回的资金曲线点数（保留极值的降采样），为空时返回逐K线曲线
+        """
         logger.info("开始执行OBV与EMA组合策略回测")
         
         FIXED_POINTS = 15  # 固定止盈止损点数
@@ -192,12 +197,16 @@ class OBVADXEMAStrategy:
                 monthly_profits[month_key] = 0
             monthly_profits[month_key] += trade['pnl']
         
-        # 计算回测指标
+        # 由逐K线盯市资金曲线计算收益、夏普比率和最大回撤，资金按首根K线价格下1手不加杠杆的名义价值计
         returns = np.array(returns)
-        total_returns = float(np.sum(returns))
-        annual_returns = float(total_returns * (252 / len(df_60min)))  # 假设每天交易4小时
-        sharpe_ratio = float(np.mean(returns) / np.std(returns) * np.sqrt(252)) if len(returns) > 0 else 0
-        max_drawdown = float(np.min(np.minimum.accumulate(np.cumprod(1 + returns)) - 1)) if len(returns) > 0 else 0
+        lot_size = 10  # 每手10吨
+        closes = df_60min['close'].to_numpy(dtype=np.float64)
+        curve = build_equity_curve(bar_dates(df_60min), closes, trades, closes[0] * lot_size,
+                                   multiplier=lot_size, max_points=equity_points)
+        total_returns = curve['total_returns']
+        annual_returns = curve['annual_returns']
+        sharpe_ratio = curve['sharpe_ratio']
+        max_drawdown = -curve['max_drawdown']
         win_rate = float(np.sum(returns > 0) / len(returns)) if len(returns) > 0 else 0
         
         # 计算总收益和手续费
@@ -217,5 +226,6 @@ class OBVADXEMAStrategy:
             'commission': float(commission),      # 手续费（元）
             'net_profit': float(net_profit),      # 净收益（元）
             'monthly_profits': monthly_profits,   # 月度盈亏统计
+            'equity_curve': curve['equity_curve'],
             'trades': trades
         } 
\ No newline at end of file
@@ -1,7 +1,8 @@
 import pandas as pd
 import numpy as np
 import talib
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from utils.equity_curve import EQUITY_CURVE_POINTS, bar_dates, build_equity_curve
 from utils.logger import logger
 
 class SupportResistanceStrategy:
@@ -53,14 +54,18 @@ class SupportResistanceStrategy:
         logger.info("交易信号计算完成")
         return df
 
-    def run_backtest(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """执行回测"""
+    def run_backtest(self, df: pd.DataFrame, equity_points: Optional[int] = EQUITY_CURVE_POINTS) -> Dict[str, Any]:
+        """执行回测
+        Args:
+            df: 带信号的行情数据
+            equity_points: 返回的资金曲线点数（保留极值的降采样），为空时返回逐K线曲线
+        """
         logger.info("开始执行回测")
         
         # 初始化回测结果
         position = 0
         trades = []
-        equity = []
+        round_trips = []  # 开平仓配对后的完整交易，用于盯市资金曲线
         initial_capital = 100000.0
         current_capital = initial_capital
         
@@ -90,6 +95,7 @@ class SupportResistanceStrategy:
                 if current_row['signal'] == 1:  # 开多
                     position = 1
                     entry_price = float(current_row['close'])
+                    entry_date = current_row['date']
                     trades.append({
                         'date': current_row['date'],
                         'type': 'buy',
@@ -99,6 +105,7 @@ class SupportResistanceStrategy:
                 elif current_row['signal'] == -1:  # 开空
                     position = -1
                     entry_price = float(current_row['close'])
+                    entry_date = current_row['date']
                     trades.append({
                         'date': current_row['date'],
                         'type': 'sell',
@@ -111,6 +118,8 @@ class SupportResistanceStrategy:
                     profit = float(current_row['close'] - entry_price)
                     current_capital += profit
                     position = 0
+                    round_trips.append({'entry_date': entry_date, 'entry_price': entry_price, 'exit_date': current_row['date'],
+                                        'exit_price': float(current_row['close']), 'position': 'long'})
                     trades.append({
                         'date': current_row['date'],
                         'type': 'sell',
@@ -123,19 +132,21 @@ class SupportResistanceStrategy:
                     profit = float(entry_price - current_row['close'])
                     current_capital += profit
                     position = 0
+                    round_trips.append({'entry_date': entry_date, 'entry_price': entry_price, 'exit_date': current_row['date'],
+                                        'exit_price': float(current_row['close']), 'position': 'short'})
                     trades.append({
                         'date': current_row['date'],
                         'type': 'buy',
                         'price': float(current_row['close']),
                         'profit': profit
                     })
-            
-            # 记录权益
-            equity_point = {
-                'date': current_row['date'],
-                'equity': float(current_capital)
-            }
-            equity.append(equity_point)
+        
+        # 未平仓的持仓按最后一根K线收盘价盯市计入资金曲线
+        if position != 0:
+            round_trips.append({'entry_date': entry_date, 'entry_price': entry_price, 'exit_date': df['date'].iloc[-1],
+                                'exit_price': float(df['close'].iloc[-1]), 'position': 'long' if position == 1 else 'short'})
+        curve = build_equity_curve(bar_dates(df), df['close'].to_numpy(dtype=np.float64), round_trips,
+                                   initial_capital, max_points=equity_points)
         
         # 计算回测指标
         total_profit = float(current_capital - initial_capital)
@@ -156,13 +167,17 @@ class SupportResistanceStrategy:
         
         return {
             'trades': trades,
-            'equity_curve': equity,
+            'equity_curve': curve['equity_curve'],
             'metrics': {
                 'total_trades': len(trades),
                 'win_rate': win_rate,
                 'total_profit': total_profit,
                 'average_profit': average_profit,
                 'average_loss': average_loss,
-                'profit_factor': profit_factor
+                'profit_factor': profit_factor,
+                'total_returns': curve['total_returns'],
+                'annual_returns': curve['annual_returns'],
+                'sharpe_ratio': curve['sharpe_ratio'],
+                'max_drawdown': curve['max_drawdown']
             }
         } 
\ No newline at end of file
@@ -1,24 +1,47 @@
 import pandas as pd
 import numpy as np
-import talib
-from typing import List, Dict
+from utils.indicator_cache import cached_indicator
+from typing import List, Dict, Optional
+from utils.equity_curve import EQUITY_CURVE_POINTS, bar_dates, build_equity_curve
+from utils.multi_timeframe import align_indices, higher_timeframe, take_aligned
 from utils.logger import logger
 
 class TrendFollowStrategy:
     """豆粕均线趋势跟随策略"""
 
     @staticmethod
-    def calculate_signals(df_15min: pd.DataFrame, df_60min: pd.DataFrame) -> pd.DataFrame:
-        """计算交易信号"""
+    def calculate_signals(df_15min: pd.DataFrame, df_60min: Optional[pd.DataFrame] = None, atr_period: int = 70,
+                          adx_period: int = 14, fast_period: int = 12, slow_period: int = 26,
+                          higher_factor: int = 4) -> pd.DataFrame:
+        """计算交易信号
+        Args:
+            df_15min: 15分钟行情数据
+            df_60min: 60分钟行情数据，为空时由15分钟数据按 higher_factor 合成（经多周期缓存）
+            atr_period: ATR周期
+            adx_period: ADX周期
+            fast_period: 15分钟短期EMA周期
+            slow_period: 15分钟长期EMA周期
+            higher_factor: 合成60分钟K线使用的15分钟K线根数
+        """
         logger.info("开始计算交易信号")
         
+        # 60分钟K线及其在15分钟K线上的对齐下标：每根15分钟K线只取其收盘时已收盘的60分钟K线
+        if df_60min is None:
+            timeframe = higher_timeframe(df_15min, higher_factor)
+            df_60min = timeframe.frame()
+            aligned = timeframe.index
+        else:
+            aligned = align_indices(bar_dates(df_15min), bar_dates(df_60min))
+        
         # 确保时间索引对齐
         df_15min = df_15min.set_index('date')
         df_60min = df_60min.set_index('date')
+        if 'ema60' not in df_60min.columns:
+            df_60min['ema60'] = cached_indicator(df_60min, 'EMA', timeperiod=60)
         
-        # 使用talib计算ATR和ADX
-        df_15min['atr'] = talib.ATR(df_15min['high'], df_15min['low'], df_15min['close'], timeperiod=70)
-        df_15min['adx'] = talib.ADX(df_15min['high'], df_15min['low'], df_15min['close'], timeperiod=14)
+        # 计算ATR和ADX（经指标缓存）
+        df_15min['atr'] = cached_indicator(df_15min, 'ATR', timeperiod=atr_period)
+        df_15min['adx'] = cached_indicator(df_15min, 'ADX', timeperiod=adx_period)
         
         # 在60分钟数据中计算趋势方向
         df_60min['above_ema60'] = df_60min['close'] > df_60min['ema60']
@@ -61,16 +84,16 @@ class TrendFollowStrategy:
         # 最后处理震荡，覆盖之前的趋势判断
         df_60min.loc[is_oscillating, 'trend'] = 0
         
-        # 使用talib计算15分钟EMA
-        df_15min['ema12'] = talib.EMA(df_15min['close'], timeperiod=12)
-        df_15min['ema26'] = talib.EMA(df_15min['close'], timeperiod=26)
+        # 计算15分钟EMA（经指标缓存）
+        df_15min['ema12'] = cached_indicator(df_15min, 'EMA', timeperiod=fast_period)
+        df_15min['ema26'] = cached_indicator(df_15min, 'EMA', timeperiod=slow_period)
         
         # 计算EMA斜率
         df_15min['ema12_slope'] = df_15min['ema12'].diff()
         df_15min['ema26_slope'] = df_15min['ema26'].diff()
         
         # 将60分钟趋势信息合并到15分钟数据中
-        df_15min['trend'] = df_60min['trend'].reindex(df_15min.index, method='ffill')
+        df_15min['trend'] = take_aligned(df_60min['trend'].to_numpy(), aligned)
         
         # 计算15分钟数据的震荡指标
         df_15min['ema_diff'] = df_15min['ema12'] - df_15min['ema26']
@@ -122,13 +145,21 @@ class TrendFollowStrategy:
         return df_15min
 
     @staticmethod
-    def run_backtest(df_15min: pd.DataFrame) -> Dict:
-        """执行回测"""
+    def run_backtest(df_15min: pd.DataFrame, take_profit_multiple: float = 1.5, stop_loss_multiple: float = 1.5,
+                     adx_threshold: float = 20, equity_points: Optional[int] = EQUITY_CURVE_POINTS) -> Dict:
+        """执行回测
+        Args:
+            df_15min: 带信号的15分钟数据
+            take_profit_multiple: 初始ATR止盈倍数
+            stop_loss_multiple: ATR止损倍数
+            adx_threshold: ADX强趋势阈值
+            equity_points: 返回的资金曲线点数（保留极值的降采样），为空时返回逐K线曲线
+        """
         logger.info("开始执行回测")
         
-        TAKE_PROFIT_MULTIPLE = 1.5  # 初始ATR止盈倍数
-        STOP_LOSS_MULTIPLE = 1.5    # ATR止损倍数
-        ADX_THRESHOLD = 20          # ADX强趋势阈值
+        TAKE_PROFIT_MULTIPLE = take_profit_multiple  # 初始ATR止盈倍数
+        STOP_LOSS_MULTIPLE = stop_loss_multiple      # ATR止损倍数
+        ADX_THRESHOLD = adx_threshold                # ADX强趋势阈值
         
         trades: List[Dict] = []
         position = 0
@@ -144,7 +175,9 @@ class TrendFollowStrategy:
         current_take_profit_multiple = TAKE_PROFIT_MULTIPLE  # 当前止盈倍数
         take_profit_level = 0  # 记录当前止盈等级
         
-        for date, row in df_15min.iterrows():
+        # 逐行访问改为遍历字典记录，避免iterrows为每一行构造Series
+        columns = ['trend', 'trade_signal', 'high', 'low', 'close', 'atr', 'adx']
+        for date, row in zip(df_15min.index, df_15min[columns].to_dict('records')):
             # 检查趋势是否改变
             if last_trend != row['trend']:
                 trend_trade_count = 0  # 趋势改变，重置交易次数
@@ -176,7 +209,7 @@ class TrendFollowStrategy:
                         if row['adx'] > ADX_THRESHOLD and take_profit_level < 3:
                             # 渐进式调整止盈倍数
                             take_profit_level += 1
-                            current_take_profit_multiple = 1.5 + (take_profit_level * 0.5)  # 1.5 -> 2.0 -> 2.5 -> 3.0
+                            current_take_profit_multiple = TAKE_PROFIT_MULTIPLE + (take_profit_level * 0.5)  # 1.5 -> 2.0 -> 2.5 -> 3.0
                             # 更新止盈价位
                             take_profit = entry_price + (entry_atr * current_take_profit_multiple)
                         else:
@@ -232,7 +265,7 @@ class TrendFollowStrategy:
                         if row['adx'] > ADX_THRESHOLD and take_profit_level < 3:
                             # 渐进式调整止盈倍数
                             take_profit_level += 1
-                            current_take_profit_multiple = 1.5 + (take_profit_level * 0.5)  # 1.5 -> 2.0 -> 2.5 -> 3.0
+                            current_take_profit_multiple = TAKE_PROFIT_MULTIPLE + (take_profit_level * 0.5)  # 1.5 -> 2.0 -> 2.5 -> 3.0
                             # 更新止盈价位
                             take_profit = entry_price - (entry_atr * current_take_profit_multiple)
                         else:
@@ -280,17 +313,21 @@ class TrendFollowStrategy:
         
         # 计算月度盈亏
         for trade in trades:
-            month_key = pd.to_datetime(trade['exit_date']).strftime('%Y-%m')
+            month_key = trade['exit_date'][:7]  # exit_date格式为%Y-%m-%d %H:%M，直接截取年月
             if month_key not in monthly_profits:
                 monthly_profits[month_key] = 0
             monthly_profits[month_key] += trade['pnl']
         
-        # 计算回测指标
+        # 由逐K线盯市资金曲线计算收益、夏普比率和最大回撤，资金按首根K线价格下1手不加杠杆的名义价值计
         returns = np.array(returns)
-        total_returns = float(np.sum(returns))
-        annual_returns = float(total_returns * (252 / len(df_15min)) * (24 / 4))  # 假设每天交易6小时，4个15分钟
-        sharpe_ratio = float(np.mean(returns) / np.std(returns) * np.sqrt(252 * 24 / 4)) if len(returns) > 0 else 0
-        max_drawdown = float(np.min(np.minimum.accumulate(np.cumprod(1 + returns)) - 1)) if len(returns) > 0 else 0
+        lot_size = 10  # 每手10吨
+        closes = df_15min['close'].to_numpy(dtype=np.float64)
+        curve = build_equity_curve(bar_dates(df_15min), closes, trades, closes[0] * lot_size,
+                                   multiplier=lot_size, max_points=equity_points)
+        total_returns = curve['total_returns']
+        annual_returns = curve['annual_returns']
+        sharpe_ratio = curve['sharpe_ratio']
+        max_drawdown = -curve['max_drawdown']
         win_rate = float(np.sum(returns > 0) / len(returns)) if len(returns) > 0 else 0
         
         # 计算总收益和手续费
@@ -310,5 +347,6 @@ class TrendFollowStrategy:
             'commission': float(commission),      # 手续费（元）
             'net_profit': float(net_profit),      # 净收益（元）
             'monthly_profits': monthly_profits,   # 月度盈亏统计
+            'equity_curve': curve['equity_curve'],
             'trades': trades
         } 
\ No newline at end of file
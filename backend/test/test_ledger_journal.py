@@ -0,0 +1,78 @@
+import os
+import sys
+import tempfile
+import uuid
+from datetime import datetime
+
+import pytest
+
+# 测试使用独立的临时数据库，需在导入后端模块之前设置
+_tmp_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_tmp_dir, 'trading.db')}"
+for key in ('DEEPSEEK_API_KEY', 'OPENAI_API_KEY', 'OPENAI_BASE_URL'):
+    os.environ.setdefault(key, 'test')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import BACKEND_DIR, SessionLocal
+from models.account import AccountDB
+from models.position import PositionDB
+from models.signals import Signal, SignalDB, SignalStatus, SignalType
+from services.ledger import LEDGER_JOURNAL_DIR, Ledger
+
+def _signal(signal_type: SignalType, price: float, quantity: int) -> Signal:
+    now = datetime.now()
+    return Signal(id=str(uuid.uuid4()), date=now, symbol='futures-M2501', type=signal_type, price=price,
+                  quantity=quantity, status=SignalStatus.OPEN, reason='test', created_at=now, updated_at=now)
+
+def test_journal_dir_is_resolved_against_backend_dir():
+    assert os.path.isabs(LEDGER_JOURNAL_DIR)
+    assert LEDGER_JOURNAL_DIR.startswith(BACKEND_DIR)
+
+def test_unflushed_trades_are_replayed_by_a_fresh_ledger():
+    journal_dir = os.path.join(_tmp_dir, 'journal')
+    crashed = Ledger(journal_dir)
+    # 模拟写库前崩溃：不启动后台写库线程，也不调用 close
+    crashed._stopped.set()
+    signals = [_signal(SignalType.BUY_OPEN, 3000.0, 2), _signal(SignalType.SELL_CLOSE, 3100.0, 1)]
+    crashed.apply_signals(signals)
+    expected = crashed.get_account()
+    # 进程退出时操作系统释放账本目录锁
+    crashed._release_owner_lock()
+
+    db = SessionLocal()
+    try:
+        assert db.query(SignalDB).count() == 0
+    finally:
+        db.close()
+
+    recovered = Ledger(journal_dir)
+    account = recovered.get_account()
+    assert account.available_balance == expected.available_balance
+    assert account.total_profit == expected.total_profit
+
+    db = SessionLocal()
+    try:
+        assert db.query(AccountDB).first().available_balance == expected.available_balance
+        position = db.query(PositionDB).filter(PositionDB.symbol == 'futures-M2501').one()
+        assert position.quantity == 1
+        rows = {row.id: row for row in db.query(SignalDB)}
+        assert set(rows) == {s.id for s in signals}
+        assert rows[signals[1].id].profit == 1000.0
+    finally:
+        db.close()
+    assert not any(name.startswith('journal') for name in os.listdir(journal_dir))
+    recovered.close()
+
+def test_second_owner_fails_fast():
+    journal_dir = os.path.join(_tmp_dir, 'owned')
+    owner = Ledger(journal_dir)
+    owner.get_account()
+    try:
+        with pytest.raises(RuntimeError):
+            Ledger(journal_dir).get_account()
+    finally:
+        owner.close()
+    # 释放后其他账本可以接管
+    successor = Ledger(journal_dir)
+    successor.get_account()
+    successor.close()
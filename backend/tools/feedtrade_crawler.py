@@ -8,12 +8,13 @@ import asyncio
 import sys
 import os
 from loguru import logger
-import sqlite3
+from sqlalchemy import text
 
 # 添加父目录到系统路径，以便导入backend模块
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models.news import NewsArticle
+from database import engine
 
 class FeedTradeCrawler:
     def __init__(self):
@@ -34,10 +35,8 @@ class FeedTradeCrawler:
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
-        # 数据库路径
-        self.db_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "trading.db")
         logger.info(f"初始化爬虫，基础URL数量: {len(self.base_urls)}")
-        logger.info(f"数据库路径: {self.db_path}")
+        logger.info(f"数据库: {engine.url}")
 
     async def fetch_page(self, url: str) -> Optional[str]:
         logger.info(f"开始获取页面: {url}")
@@ -162,34 +161,31 @@ class FeedTradeCrawler:
             return None
 
     def save_to_db(self, article: NewsArticle) -> bool:
-        """直接保存到数据库"""
+        """直接保存到数据库，与后端服务共用数据库引擎"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # 检查是否已存在相同标题的新闻
-            cursor.execute("SELECT id FROM news_article WHERE title = ?", (article.title,))
-            existing = cursor.fetchone()
-            
-            if existing:
-                logger.info(f"新闻已存在，跳过: {article.title}")
-                return False
+            with engine.begin() as conn:
+                # 检查是否已存在相同标题的新闻
+                existing = conn.execute(
+                    text("SELECT id FROM news_article WHERE title = :title"), {"title": article.title}
+                ).first()
                 
-            # 插入新新闻
-            cursor.execute(
-                "INSERT INTO news_article (datetime, title, content, analysis, remarks) VALUES (?, ?, ?, ?, ?)",
-                (article.datetime, article.title, article.content, article.analysis, article.remarks)
-            )
+                if existing:
+                    logger.info(f"新闻已存在，跳过: {article.title}")
+                    return False
+                    
+                # 插入新新闻
+                conn.execute(
+                    text("INSERT INTO news_article (datetime, title, content, analysis, remarks) "
+                         "VALUES (:datetime, :title, :content, :analysis, :remarks)"),
+                    {"datetime": article.datetime, "title": article.title, "content": article.content,
+                     "analysis": article.analysis, "remarks": article.remarks}
+                )
             
-            conn.commit()
             logger.info(f"成功保存新闻到数据库: {article.title}")
             return True
         except Exception as e:
             logger.error(f"保存新闻到数据库失败: {str(e)}")
             return False
-        finally:
-            if 'conn' in locals():
-                conn.close()
 
     async def get_latest_news(self) -> List[Dict]:
         logger.info("开始获取最新新闻")
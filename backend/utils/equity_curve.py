@@ -0,0 +1,116 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# 回测结果中资金曲线的默认点数
+EQUITY_CURVE_POINTS = 1000
+# 资金曲线点数的上下限
+EQUITY_CURVE_MIN_POINTS = 10
+EQUITY_CURVE_MAX_POINTS = 20000
+
+def bar_dates(df: pd.DataFrame) -> np.ndarray:
+    """取K线时间（date列或时间索引），统一为datetime64[ns]"""
+    dates = df['date'] if 'date' in df.columns else df.index
+    return pd.DatetimeIndex(pd.to_datetime(dates)).values.astype('datetime64[ns]')
+
+def trade_bar_indices(dates: np.ndarray, trade_dates: Sequence[Any]) -> np.ndarray:
+    """把成交时间映射为K线下标，找不到精确时间时取之后最近的一根K线"""
+    if len(trade_dates) == 0:
+        return np.zeros(0, dtype=np.int64)
+    idx = np.searchsorted(dates, pd.to_datetime(list(trade_dates)).values.astype('datetime64[ns]'))
+    return np.minimum(idx, len(dates) - 1)
+
+def position_pnl(closes: np.ndarray, entry_idx: np.ndarray, exit_idx: np.ndarray, qty: np.ndarray,
+                 entry_price: np.ndarray, exit_price: np.ndarray) -> np.ndarray:
+    """逐K线累计盈亏 = 已实现盈亏 + 按收盘价计算的持仓浮动盈亏
+    qty 为带方向的持仓量（已乘合约乘数），持仓区间 [entry, exit) 内计入浮动盈亏，
+    用差分数组一次累加，复杂度与K线数和成交笔数成线性"""
+    n = len(closes)
+    realized = np.zeros(n)
+    slope = np.zeros(n + 1)     # 持仓量之和，浮动盈亏 = slope * close + offset
+    offset = np.zeros(n + 1)
+    if len(qty):
+        np.add.at(realized, exit_idx, qty * (exit_price - entry_price))
+        np.add.at(slope, entry_idx, qty)
+        np.add.at(slope, exit_idx, -qty)
+        np.add.at(offset, entry_idx, -qty * entry_price)
+        np.add.at(offset, exit_idx, qty * entry_price)
+    return np.cumsum(realized) + np.cumsum(slope)[:n] * closes + np.cumsum(offset)[:n]
+
+def trades_pnl(dates: np.ndarray, closes: np.ndarray, trades: List[Dict[str, Any]],
+               multiplier: float = 1.0) -> np.ndarray:
+    """由成交记录（entry_date/exit_date/entry_price/exit_price/position，可选shares）还原逐K线累计盈亏
+    未记录 shares 的成交按1手计，multiplier 为每手的数量（如期货每手10吨）"""
+    if not trades:
+        return np.zeros(len(dates))
+    sign = np.array([-1.0 if t.get('position') == 'short' else 1.0 for t in trades])
+    shares = np.array([t.get('shares', 1) for t in trades], dtype=np.float64)
+    return position_pnl(
+        closes,
+        trade_bar_indices(dates, [t['entry_date'] for t in trades]),
+        trade_bar_indices(dates, [t['exit_date'] for t in trades]),
+        sign * shares * multiplier,
+        np.array([t['entry_price'] for t in trades], dtype=np.float64),
+        np.array([t['exit_price'] for t in trades], dtype=np.float64),
+    )
+
+def equity_metrics(dates: np.ndarray, equity: np.ndarray, initial_capital: float) -> Dict[str, float]:
+    """由逐K线资金曲线计算总收益、年化收益、夏普比率（按每年K线数年化）和最大回撤"""
+    if len(equity) == 0:
+        return {'total_returns': 0.0, 'annual_returns': 0.0, 'sharpe_ratio': 0.0, 'max_drawdown': 0.0}
+    total_returns = float(equity[-1] / initial_capital - 1)
+    years = (dates[-1] - dates[0]) / np.timedelta64(1, 'D') / 365.0 if len(dates) > 1 else 0.0
+
+    values = np.concatenate(([initial_capital], equity))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.diff(values) / values[:-1]
+    returns = returns[np.isfinite(returns)]
+    std = returns.std() if len(returns) > 1 else 0.0
+    periods_per_year = len(equity) / years if years > 0 else 252.0
+    # 起点资金计入历史最高
+    peak = np.maximum.accumulate(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdowns = np.where(peak > 0, (peak - values) / peak, 0.0)
+
+    return {
+        'total_returns': total_returns,
+        'annual_returns': float((1 + total_returns) ** (1 / years) - 1) if years > 0 and total_returns > -1 else 0.0,
+        'sharpe_ratio': float(returns.mean() / std * np.sqrt(periods_per_year)) if std > 0 else 0.0,
+        'max_drawdown': float(drawdowns.max()),
+    }
+
+def downsample_indices(values: np.ndarray, max_points: Optional[int] = EQUITY_CURVE_POINTS) -> np.ndarray:
+    """把序列等分成若干桶，每桶保留最低点和最高点的下标，另保留首尾两点；
+    点数不超过 max_points，且不丢失资金的峰值和回撤的谷底。max_points 为空时保留全部"""
+    n = len(values)
+    if max_points is None or n <= max_points:
+        return np.arange(n)
+    buckets = max(1, (max_points - 2) // 2)
+    size = -(-n // buckets)
+    buckets = -(-n // size)
+    # 最后一桶不足的部分用该桶第一个值补齐，不影响极值位置（argmin/argmax取首次出现）
+    padded = np.empty(buckets * size)
+    padded[:n] = values
+    padded[n:] = values[(buckets - 1) * size]
+    blocks = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lows = offsets + blocks.argmin(axis=1)
+    highs = offsets + blocks.argmax(axis=1)
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+def downsample_curve(dates: np.ndarray, equity: np.ndarray,
+                     max_points: Optional[int] = EQUITY_CURVE_POINTS) -> List[Dict[str, Any]]:
+    """资金曲线降采样为 [{'date', 'equity'}]"""
+    idx = downsample_indices(equity, max_points)
+    labels = pd.DatetimeIndex(dates[idx]).strftime('%Y-%m-%d %H:%M')
+    return [{'date': d, 'equity': float(v)} for d, v in zip(labels, equity[idx])]
+
+def build_equity_curve(dates: np.ndarray, closes: np.ndarray, trades: List[Dict[str, Any]],
+                       initial_capital: float, multiplier: float = 1.0,
+                       max_points: Optional[int] = EQUITY_CURVE_POINTS) -> Dict[str, Any]:
+    """由成交记录生成逐K线盯市资金曲线，返回基于曲线的指标和降采样后的曲线"""
+    equity = initial_capital + trades_pnl(dates, closes, trades, multiplier)
+    result: Dict[str, Any] = equity_metrics(dates, equity, initial_capital)
+    result['equity_curve'] = downsample_curve(dates, equity, max_points)
+    return result
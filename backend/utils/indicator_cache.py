@@ -0,0 +1,135 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import talib
+
+# 指标缓存默认内存上限
+INDICATOR_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# 指标名 -> 默认输入列（与talib函数的位置参数顺序一致）
+INDICATOR_INPUTS = {
+    'EMA': ('close',),
+    'SMA': ('close',),
+    'RSI': ('close',),
+    'MACD': ('close',),
+    'BBANDS': ('close',),
+    'ATR': ('high', 'low', 'close'),
+    'ADX': ('high', 'low', 'close'),
+    'OBV': ('close', 'vol'),
+}
+
+IndicatorValue = Union[np.ndarray, Tuple[np.ndarray, ...]]
+
+def file_fingerprint(path: Union[str, Path]) -> str:
+    """文件指纹：路径+修改时间+大小，文件被改写后自动失效"""
+    stat = Path(path).stat()
+    return f"{Path(path).resolve()}:{stat.st_mtime_ns}:{stat.st_size}"
+
+def array_fingerprint(*arrays: np.ndarray) -> str:
+    """按内容计算输入序列的哈希"""
+    digest = hashlib.blake2b(digest_size=16)
+    for arr in arrays:
+        digest.update(f"{arr.dtype.str}{arr.shape}".encode())
+        digest.update(memoryview(np.ascontiguousarray(arr)).cast('B'))
+    return digest.hexdigest()
+
+def _freeze(value: Any) -> IndicatorValue:
+    """把talib输出转为只读数组，多输出指标（MACD、BBANDS）返回只读数组元组"""
+    if isinstance(value, tuple):
+        return tuple(_freeze(v) for v in value)
+    arr = np.asarray(value, dtype=np.float64)
+    arr.setflags(write=False)
+    return arr
+
+def _nbytes(value: IndicatorValue) -> int:
+    if isinstance(value, tuple):
+        return sum(v.nbytes for v in value)
+    return value.nbytes
+
+class IndicatorCache:
+    """线程安全的指标LRU缓存，按占用字节数淘汰，返回的数组均为只读"""
+
+    def __init__(self, max_bytes: int = INDICATOR_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Hashable, IndicatorValue]' = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, dataset_key: str, name: str, inputs: Sequence[np.ndarray], **params) -> IndicatorValue:
+        """获取指标，未命中时调用同名talib函数计算
+        Args:
+            dataset_key: 输入序列的标识，需保证相同key对应完全相同的输入
+            name: talib指标名，如EMA/ATR/ADX/OBV
+            inputs: 传给talib的输入序列
+            params: 指标参数，如timeperiod
+        """
+        key = (dataset_key, name, tuple(sorted(params.items())))
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return value
+            self._misses += 1
+
+        # 计算放在锁外，避免慢指标阻塞其他请求；并发重复计算的结果一致，后写入者覆盖即可
+        value = _freeze(getattr(talib, name)(*inputs, **params))
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return value
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= _nbytes(previous)
+            self._entries[key] = value
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _nbytes(evicted)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+            }
+
+# 进程内共享的缓存实例，路由和策略都使用它
+indicator_cache = IndicatorCache()
+
+def cached_indicator(df: pd.DataFrame, name: str, columns: Optional[Sequence[str]] = None,
+                     dataset_key: Optional[str] = None, **params) -> IndicatorValue:
+    """从DataFrame取输入列计算指标并缓存
+    Args:
+        df: 行情数据
+        name: talib指标名
+        columns: 输入列，默认取 INDICATOR_INPUTS 中的配置
+        dataset_key: 数据集标识（如 file_fingerprint 的结果），为空时按输入列内容哈希
+        params: 指标参数
+    Returns:
+        只读的numpy数组，与df按位置对齐
+    """
+    columns = tuple(columns or INDICATOR_INPUTS[name])
+    inputs = [np.ascontiguousarray(df[col].to_numpy(dtype=np.float64)) for col in columns]
+    if dataset_key is None:
+        dataset_key = array_fingerprint(*inputs)
+    else:
+        dataset_key = f"{dataset_key}:{len(df)}:{','.join(columns)}"
+    return indicator_cache.get(dataset_key, name, inputs, **params)
@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils.equity_curve import bar_dates
+from utils.indicator_cache import array_fingerprint
+
+# 相邻K线间隔超过该值视为新的交易时段（午休2小时15分以内仍属同一时段，夜盘与日盘之间间隔更长）
+DEFAULT_SESSION_GAP = np.timedelta64(3, 'h')
+# 集合竞价K线的时间：商品期货夜盘、日盘开盘前的集合竞价成交单独记为一根K线
+AUCTION_TIMES = ('21:00', '09:00')
+# 多周期缓存保留的数据集个数
+TIMEFRAME_CACHE_ENTRIES = 32
+
+class HigherTimeframe(NamedTuple):
+    """由基础周期合成的高周期K线及对齐下标（均为只读数组）
+    bars: 高周期各列，date 为收盘时间（与基础数据一样按K线结束时间标注）
+    index: 每根基础K线收盘时已收盘的最近一根高周期K线的下标，没有时为-1"""
+    bars: Dict[str, np.ndarray]
+    index: np.ndarray
+
+    def frame(self) -> pd.DataFrame:
+        """高周期K线的可写DataFrame副本"""
+        return pd.DataFrame({k: np.array(v) for k, v in self.bars.items()})
+
+def session_starts(dates: np.ndarray, session_gap: np.timedelta64 = DEFAULT_SESSION_GAP) -> np.ndarray:
+    """每根K线是否为交易时段的第一根"""
+    starts = np.ones(len(dates), dtype=bool)
+    starts[1:] = np.diff(dates) > session_gap
+    return starts
+
+def resample_bars(df: pd.DataFrame, factor: int, session_gap: np.timedelta64 = DEFAULT_SESSION_GAP,
+                  auction_times: Sequence[str] = AUCTION_TIMES) -> Dict[str, np.ndarray]:
+    """按K线根数把基础周期合成高周期，如15分钟 factor=4 得到60分钟
+    在每个交易时段内从头按 factor 根一组合成，时段末尾不足一组的单独成一根；
+    时段第一根K线的时间在 auction_times 中时视为集合竞价K线，单独成一根，
+    与行情源的分钟线划分一致。基础数据需按K线结束时间标注并按时间升序排列"""
+    if factor < 1:
+        raise ValueError(f"合成倍数必须为正整数: {factor}")
+    dates = bar_dates(df)
+    n = len(dates)
+    if n == 0:
+        raise ValueError("基础周期数据为空")
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
+
+    new_session = session_starts(dates, session_gap)
+    minutes = (dates - dates.astype('datetime64[D]')) // np.timedelta64(1, 'm')
+    auction_minutes = [int(t[:2]) * 60 + int(t[3:]) for t in auction_times]
+    auction = new_session & np.isin(minutes, auction_minutes)
+    # 时段内的序号，集合竞价K线之后从0重新计数
+    restart = new_session.copy()
+    restart[1:] |= auction[:-1]
+    first = np.flatnonzero(restart)
+    position = np.arange(n) - first[np.cumsum(restart) - 1]
+    starts = np.flatnonzero(restart | (position % factor == 0))
+    ends = np.append(starts[1:], n) - 1
+
+    bars = {
+        'date': dates[ends],
+        'open': df['open'].to_numpy(dtype=np.float64)[starts],
+        'high': np.maximum.reduceat(high, starts),
+        'low': np.minimum.reduceat(low, starts),
+        'close': df['close'].to_numpy(dtype=np.float64)[ends],
+    }
+    for column in ('vol', 'amount'):
+        if column in df.columns:
+            bars[column] = np.add.reduceat(df[column].to_numpy(dtype=np.float64), starts)
+    if 'oi' in df.columns:
+        bars['oi'] = df['oi'].to_numpy(dtype=np.float64)[ends]
+    return bars
+
+def align_indices(base_dates: np.ndarray, higher_dates: np.ndarray) -> np.ndarray:
+    """基础K线映射到其收盘时已收盘的最近一根高周期K线（两者都按结束时间标注），
+    不会引用尚未走完的高周期K线；之前没有已收盘的高周期K线时为-1"""
+    return np.searchsorted(higher_dates, base_dates, side='right') - 1
+
+def take_aligned(values: np.ndarray, index: np.ndarray) -> np.ndarray:
+    """按对齐下标取高周期的值，下标为-1处为NaN"""
+    result = np.asarray(values, dtype=np.float64)[np.maximum(index, 0)]
+    result[index < 0] = np.nan
+    return result
+
+class TimeframeCache:
+    """按基础数据内容缓存合成的高周期K线和对齐下标，
+    参数扫描等对同一数据反复计算信号时只合成一次"""
+
+    def __init__(self, max_entries: int = TIMEFRAME_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, HigherTimeframe]' = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, df: pd.DataFrame, factor: int, session_gap: np.timedelta64 = DEFAULT_SESSION_GAP,
+            auction_times: Sequence[str] = AUCTION_TIMES) -> HigherTimeframe:
+        """df 为基础周期K线（date列或时间索引），返回高周期K线和对齐下标"""
+        dates = bar_dates(df)
+        inputs = [dates.view(np.int64)] + [np.ascontiguousarray(df[c].to_numpy(dtype=np.float64))
+                                          for c in ('open', 'high', 'low', 'close')]
+        key = (array_fingerprint(*inputs), factor, int(session_gap / np.timedelta64(1, 's')), tuple(auction_times))
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return value
+            self._misses += 1
+
+        frame = df.reset_index() if 'date' not in df.columns else df
+        bars = resample_bars(frame, factor, session_gap, auction_times)
+        index = align_indices(dates, bars['date'])
+        for arr in list(bars.values()) + [index]:
+            arr.setflags(write=False)
+        value = HigherTimeframe(bars, index)
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self._hits, 'misses': self._misses}
+
+# 进程内共享的多周期缓存
+timeframe_cache = TimeframeCache()
+
+def higher_timeframe(df: pd.DataFrame, factor: int, session_gap: Optional[np.timedelta64] = None) -> HigherTimeframe:
+    """获取基础数据合成的高周期K线（经缓存）"""
+    return timeframe_cache.get(df, factor, DEFAULT_SESSION_GAP if session_gap is None else session_gap)
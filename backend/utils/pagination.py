@@ -0,0 +1,96 @@
+import base64
+import threading
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+
+# 总数缓存的有效期（秒），列表翻页时不必每页都重新 COUNT
+COUNT_CACHE_TTL = 10.0
+COUNT_CACHE_ENTRIES = 256
+
+def encode_cursor(time_value: datetime, row_id: Any) -> str:
+    """把一页最后一行的(时间, id)编码为游标"""
+    return base64.urlsafe_b64encode(f"{time_value.isoformat()}|{row_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        time_text, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+        return datetime.fromisoformat(time_text), row_id
+    except Exception:
+        raise ValueError(f"无效的分页游标: {cursor}")
+
+def keyset_query(query, time_column, id_column, cursor: Optional[str], limit: int, id_type: Callable = str,
+                 offset: int = 0):
+    """给 Query 或 select() 加上键集分页条件：按(时间, id)倒序、从游标之后多取一条用于判断是否还有下一页。
+    offset 仅用于兼容按页码跳页的调用，给出游标时应为0"""
+    if cursor:
+        time_value, row_id = decode_cursor(cursor)
+        try:
+            row_id = id_type(row_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"无效的分页游标: {cursor}")
+        query = query.filter(or_(time_column < time_value, and_(time_column == time_value, id_column < row_id)))
+    query = query.order_by(time_column.desc(), id_column.desc())
+    if offset:
+        query = query.offset(offset)
+    return query.limit(limit + 1)
+
+def keyset_result(rows: Sequence, limit: int, time_column, id_column) -> Tuple[list, Optional[str]]:
+    """截取本页记录，返回(本页记录, 下一页游标)，没有下一页时游标为 None"""
+    if len(rows) <= limit:
+        return list(rows), None
+    rows = list(rows[:limit])
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, time_column.key), getattr(last, id_column.key))
+
+def keyset_page(query, time_column, id_column, cursor: Optional[str], limit: int, id_type: Callable = str,
+                offset: int = 0):
+    """按(时间, id)倒序的键集分页：从游标之后取 limit 条，返回(本页记录, 下一页游标)"""
+    rows = keyset_query(query, time_column, id_column, cursor, limit, id_type, offset).all()
+    return keyset_result(rows, limit, time_column, id_column)
+
+class CountCache:
+    """按查询条件短时缓存总数"""
+
+    def __init__(self, ttl: float = COUNT_CACHE_TTL, max_entries: int = COUNT_CACHE_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, key: Hashable, now: float) -> Optional[int]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                return entry[1]
+        return None
+
+    def get(self, key: Hashable, count: Callable[[], int]) -> int:
+        now = time.monotonic()
+        value = self._cached(key, now)
+        if value is None:
+            value = count()
+            self._store(key, now, value)
+        return value
+
+    async def get_async(self, key: Hashable, count: Callable[[], Awaitable[int]]) -> int:
+        now = time.monotonic()
+        value = self._cached(key, now)
+        if value is None:
+            value = await count()
+            self._store(key, now, value)
+        return value
+
+    def _store(self, key: Hashable, now: float, value: int) -> None:
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: v for k, v in self._entries.items() if now - v[0] < self.ttl}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (now, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,546 @@
+import math
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+import numpy as np
+import pandas as pd
+import talib
+
+# 与talib的TA_IS_ZERO判断保持一致
+_ZERO = 1e-14
+
+Value = Union[float, Tuple[float, ...]]
+
+def _true_range(high: float, low: float, prev_close: float) -> float:
+    tr = high - low
+    tr = max(tr, abs(high - prev_close))
+    return max(tr, abs(low - prev_close))
+
+class _Window:
+    """定长滑动窗口，记录最近一次写入以便替换未收盘K线时O(1)回退"""
+
+    def __init__(self, size: int, values: Sequence[float] = (), pushes: int = 0, evicted: Optional[float] = None):
+        self.size = size
+        self.values = deque(values, maxlen=size)
+        self.pushes = pushes
+        self.evicted = evicted
+
+    def push(self, value: float) -> Optional[float]:
+        self.evicted = self.values[0] if len(self.values) == self.size else None
+        self.values.append(value)
+        self.pushes += 1
+        return self.evicted
+
+    def undo(self) -> None:
+        self.values.pop()
+        if self.evicted is not None:
+            self.values.appendleft(self.evicted)
+        self.evicted = None
+        self.pushes -= 1
+
+    def full(self) -> bool:
+        return len(self.values) == self.size
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'size': self.size, 'values': list(self.values), 'pushes': self.pushes, 'evicted': self.evicted}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> '_Window':
+        return cls(data['size'], data['values'], data['pushes'], data['evicted'])
+
+class StreamingIndicator:
+    """增量指标基类：每根新K线O(1)更新，算法与talib一致，可序列化保存状态
+
+    子类在 STATE 中列出标量状态字段，在 WINDOWS 中列出滑动窗口字段，实现 _step 即可
+    """
+
+    NAME = ''
+    INPUTS: Tuple[str, ...] = ('close',)
+    STATE: Tuple[str, ...] = ()
+    WINDOWS: Tuple[str, ...] = ()
+
+    def __init__(self, **params):
+        self.params = params
+        self.count = 0
+        self.value: Value = self._empty()
+        self._undo: Optional[Dict[str, Any]] = None
+
+    def _empty(self) -> Value:
+        return math.nan
+
+    def _step(self, *inputs: float) -> Value:
+        raise NotImplementedError
+
+    def _snapshot(self) -> Dict[str, Any]:
+        state = {name: getattr(self, name) for name in self.STATE}
+        state['count'] = self.count
+        state['value'] = self.value
+        state['pushes'] = {name: getattr(self, name).pushes for name in self.WINDOWS}
+        return state
+
+    def _restore(self, snapshot: Dict[str, Any]) -> None:
+        for name in self.STATE:
+            setattr(self, name, snapshot[name])
+        self.count = snapshot['count']
+        self.value = snapshot['value']
+        for name, pushes in snapshot['pushes'].items():
+            window = getattr(self, name)
+            if window.pushes > pushes:
+                window.undo()
+
+    def update(self, *inputs: float, replace_last: bool = False) -> Value:
+        """输入一根K线并返回最新指标值
+        Args:
+            inputs: 按 INPUTS 顺序给出的数值
+            replace_last: 为True时替换最近一根K线（未收盘K线刷新），而不是追加
+        """
+        if replace_last:
+            if self._undo is None:
+                raise ValueError("没有可替换的K线")
+            self._restore(self._undo)
+        self._undo = self._snapshot()
+        self.value = self._step(*[float(v) for v in inputs])
+        self.count += 1
+        return self.value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为可JSON序列化的状态"""
+        state = {name: getattr(self, name) for name in self.STATE}
+        state.update({name: getattr(self, name).to_dict() for name in self.WINDOWS})
+        undo = None
+        if self._undo is not None:
+            undo = dict(self._undo, value=_dump_value(self._undo['value']))
+        return {
+            'type': self.NAME,
+            'params': self.params,
+            'count': self.count,
+            'value': _dump_value(self.value),
+            'state': state,
+            'undo': undo,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'StreamingIndicator':
+        indicator = cls(**data['params'])
+        indicator.count = data['count']
+        indicator.value = _load_value(data['value'])
+        for name in cls.STATE:
+            setattr(indicator, name, data['state'][name])
+        for name in cls.WINDOWS:
+            setattr(indicator, name, _Window.from_dict(data['state'][name]))
+        if data.get('undo') is not None:
+            indicator._undo = dict(data['undo'], value=_load_value(data['undo']['value']))
+        return indicator
+
+    @classmethod
+    def seed(cls, *inputs: Sequence[float], **params) -> Tuple['StreamingIndicator', Value]:
+        """用历史数据初始化，返回(指标对象, talib计算的完整历史序列)
+        最后一根K线单独输入，初始化后仍可用 replace_last 刷新它
+        """
+        arrays = [np.asarray(v, dtype=np.float64) for v in inputs]
+        history = getattr(talib, cls.NAME)(*arrays, **params)
+        length = len(arrays[0])
+        head = [a[:-1] for a in arrays]
+        head_history = tuple(h[:-1] for h in history) if isinstance(history, tuple) else history[:-1]
+        indicator = cls._from_talib(head, head_history, **params) if length > 1 else None
+        if indicator is None:
+            # 无法从talib输出恢复内部状态时逐根回放
+            indicator = cls(**params)
+            for row in zip(*head):
+                indicator.update(*row)
+        if length:
+            indicator.update(*[a[-1] for a in arrays])
+        return indicator, history
+
+    @classmethod
+    def _from_talib(cls, arrays: List[np.ndarray], history: Any, **params) -> Optional['StreamingIndicator']:
+        """根据talib输出直接构造状态，子类可重写；返回None表示需要回放"""
+        return None
+
+def _dump_value(value: Value) -> Any:
+    if isinstance(value, tuple):
+        return [None if math.isnan(v) else v for v in value]
+    return None if math.isnan(value) else value
+
+def _load_value(value: Any) -> Value:
+    if isinstance(value, list):
+        return tuple(math.nan if v is None else v for v in value)
+    return math.nan if value is None else value
+
+class SMA(StreamingIndicator):
+    NAME = 'SMA'
+    STATE = ('total',)
+    WINDOWS = ('window',)
+
+    def __init__(self, timeperiod: int = 30):
+        super().__init__(timeperiod=timeperiod)
+        self.total = 0.0
+        self.window = _Window(timeperiod)
+
+    def _step(self, close: float) -> float:
+        evicted = self.window.push(close)
+        self.total += close - (evicted or 0.0)
+        return self.total / self.window.size if self.window.full() else math.nan
+
+    @classmethod
+    def _from_talib(cls, arrays, history, timeperiod: int = 30):
+        close = arrays[0]
+        indicator = cls(timeperiod)
+        tail = close[-timeperiod:]
+        indicator.window = _Window(timeperiod, tail, pushes=len(close))
+        indicator.total = float(tail.sum())
+        indicator.count = len(close)
+        indicator.value = float(history[-1])
+        return indicator
+
+class EMA(StreamingIndicator):
+    NAME = 'EMA'
+    STATE = ('total', 'ema')
+
+    def __init__(self, timeperiod: int = 30):
+        super().__init__(timeperiod=timeperiod)
+        self.k = 2.0 / (timeperiod + 1)
+        self.total = 0.0
+        self.ema = math.nan
+
+    def _step(self, close: float) -> float:
+        period = self.params['timeperiod']
+        if self.count < period:
+            # 前N根用简单均值作为初始值
+            self.total += close
+            if self.count == period - 1:
+                self.ema = self.total / period
+            return self.ema
+        self.ema = (close - self.ema) * self.k + self.ema
+        return self.ema
+
+    @classmethod
+    def _from_talib(cls, arrays, history, timeperiod: int = 30):
+        if len(arrays[0]) < timeperiod:
+            return None
+        indicator = cls(timeperiod)
+        indicator.count = len(arrays[0])
+        indicator.ema = indicator.value = float(history[-1])
+        return indicator
+
+class ATR(StreamingIndicator):
+    NAME = 'ATR'
+    INPUTS = ('high', 'low', 'close')
+    STATE = ('prev_close', 'total', 'atr')
+
+    def __init__(self, timeperiod: int = 14):
+        super().__init__(timeperiod=timeperiod)
+        self.prev_close = math.nan
+        self.total = 0.0
+        self.atr = math.nan
+
+    def _step(self, high: float, low: float, close: float) -> float:
+        period = self.params['timeperiod']
+        if self.count == 0:
+            self.prev_close = close
+            return math.nan
+        tr = _true_range(high, low, self.prev_close)
+        self.prev_close = close
+        if self.count <= period:
+            # 第1到第N根真实波幅的均值作为初始ATR
+            self.total += tr
+            if self.count == period:
+                self.atr = self.total / period
+            return self.atr
+        self.atr = (self.atr * (period - 1) + tr) / period
+        return self.atr
+
+    @classmethod
+    def _from_talib(cls, arrays, history, timeperiod: int = 14):
+        close = arrays[2]
+        if len(close) <= timeperiod:
+            return None
+        indicator = cls(timeperiod)
+        indicator.count = len(close)
+        indicator.prev_close = float(close[-1])
+        indicator.atr = indicator.value = float(history[-1])
+        return indicator
+
+class OBV(StreamingIndicator):
+    NAME = 'OBV'
+    INPUTS = ('close', 'vol')
+    STATE = ('prev_close', 'obv')
+
+    def __init__(self):
+        super().__init__()
+        self.prev_close = math.nan
+        self.obv = 0.0
+
+    def _step(self, close: float, volume: float) -> float:
+        if self.count == 0:
+            self.obv = volume
+        elif close > self.prev_close:
+            self.obv += volume
+        elif close < self.prev_close:
+            self.obv -= volume
+        self.prev_close = close
+        return self.obv
+
+    @classmethod
+    def _from_talib(cls, arrays, history):
+        indicator = cls()
+        indicator.count = len(arrays[0])
+        indicator.prev_close = float(arrays[0][-1])
+        indicator.obv = indicator.value = float(history[-1])
+        return indicator
+
+class RSI(StreamingIndicator):
+    NAME = 'RSI'
+    STATE = ('prev_close', 'gain', 'loss')
+
+    def __init__(self, timeperiod: int = 14):
+        super().__init__(timeperiod=timeperiod)
+        self.prev_close = math.nan
+        self.gain = 0.0
+        self.loss = 0.0
+
+    def _step(self, close: float) -> float:
+        period = self.params['timeperiod']
+        if self.count == 0:
+            self.prev_close = close
+            return math.nan
+        diff = close - self.prev_close
+        self.prev_close = close
+        if self.count <= period:
+            if diff < 0:
+                self.loss -= diff
+            else:
+                self.gain += diff
+            if self.count < period:
+                return math.nan
+            self.gain /= period
+            self.loss /= period
+        else:
+            self.gain *= period - 1
+            self.loss *= period - 1
+            if diff < 0:
+                self.loss -= diff
+            else:
+                self.gain += diff
+            self.gain /= period
+            self.loss /= period
+        total = self.gain + self.loss
+        return 100.0 * (self.gain / total) if abs(total) >= _ZERO else 0.0
+
+class ADX(StreamingIndicator):
+    NAME = 'ADX'
+    INPUTS = ('high', 'low', 'close')
+    STATE = ('prev_high', 'prev_low', 'prev_close', 'plus_dm', 'minus_dm', 'tr', 'sum_dx', 'adx')
+
+    def __init__(self, timeperiod: int = 14):
+        super().__init__(timeperiod=timeperiod)
+        self.prev_high = self.prev_low = self.prev_close = math.nan
+        self.plus_dm = self.minus_dm = self.tr = 0.0
+        self.sum_dx = 0.0
+        self.adx = math.nan
+
+    def _dx(self) -> Optional[float]:
+        if abs(self.tr) < _ZERO:
+            return None
+        minus_di = 100.0 * (self.minus_dm / self.tr)
+        plus_di = 100.0 * (self.plus_dm / self.tr)
+        total = minus_di + plus_di
+        if abs(total) < _ZERO:
+            return None
+        return 100.0 * (abs(minus_di - plus_di) / total)
+
+    def _step(self, high: float, low: float, close: float) -> float:
+        period = self.params['timeperiod']
+        if self.count == 0:
+            self.prev_high, self.prev_low, self.prev_close = high, low, close
+            return math.nan
+
+        diff_p = high - self.prev_high
+        diff_m = self.prev_low - low
+        tr = _true_range(high, low, self.prev_close)
+        self.prev_high, self.prev_low, self.prev_close = high, low, close
+
+        if self.count >= period:
+            # 前N-1根累加，之后按Wilder方式平滑
+            self.minus_dm -= self.minus_dm / period
+            self.plus_dm -= self.plus_dm / period
+            self.tr -= self.tr / period
+        if diff_m > 0 and diff_p < diff_m:
+            self.minus_dm += diff_m
+        elif diff_p > 0 and diff_p > diff_m:
+            self.plus_dm += diff_p
+        self.tr += tr
+
+        if self.count < period:
+            return math.nan
+        dx = self._dx()
+        if self.count < 2 * period - 1:
+            self.sum_dx += dx or 0.0
+            return math.nan
+        if self.count == 2 * period - 1:
+            self.sum_dx += dx or 0.0
+            self.adx = self.sum_dx / period
+        elif dx is not None:
+            self.adx = (self.adx * (period - 1) + dx) / period
+        return self.adx
+
+class BBANDS(StreamingIndicator):
+    """布林带，仅支持简单均线（matype=0），标准差为总体标准差，与talib一致"""
+
+    NAME = 'BBANDS'
+    STATE = ('total', 'total_sq')
+    WINDOWS = ('window',)
+
+    def __init__(self, timeperiod: int = 5, nbdevup: float = 2.0, nbdevdn: float = 2.0, matype: int = 0):
+        if matype != 0:
+            raise ValueError("增量布林带仅支持简单均线(matype=0)")
+        super().__init__(timeperiod=timeperiod, nbdevup=nbdevup, nbdevdn=nbdevdn, matype=matype)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.window = _Window(timeperiod)
+
+    def _empty(self) -> Value:
+        return (math.nan, math.nan, math.nan)
+
+    def _step(self, close: float) -> Value:
+        evicted = self.window.push(close)
+        self.total += close - (evicted or 0.0)
+        self.total_sq += close * close - (evicted or 0.0) ** 2
+        if not self.window.full():
+            return self._empty()
+        period = self.window.size
+        middle = self.total / period
+        variance = self.total_sq / period - middle * middle
+        std = math.sqrt(variance) if variance >= _ZERO else 0.0
+        return (middle + self.params['nbdevup'] * std, middle, middle - self.params['nbdevdn'] * std)
+
+    @classmethod
+    def _from_talib(cls, arrays, history, timeperiod: int = 5, nbdevup: float = 2.0, nbdevdn: float = 2.0, matype: int = 0):
+        close = arrays[0]
+        indicator = cls(timeperiod, nbdevup, nbdevdn, matype)
+        tail = close[-timeperiod:]
+        indicator.window = _Window(timeperiod, tail, pushes=len(close))
+        indicator.total = float(tail.sum())
+        indicator.total_sq = float((tail * tail).sum())
+        indicator.count = len(close)
+        indicator.value = tuple(float(h[-1]) for h in history)
+        return indicator
+
+class MACD(StreamingIndicator):
+    """MACD，与talib相同：快慢EMA都从第slow根开始输出，快线以截至该根的快周期均值为初值"""
+
+    NAME = 'MACD'
+    STATE = ('slow_total', 'fast_ema', 'slow_ema', 'signal_total', 'signal_ema')
+    WINDOWS = ('fast_window',)
+
+    def __init__(self, fastperiod: int = 12, slowperiod: int = 26, signalperiod: int = 9):
+        if slowperiod < fastperiod:
+            fastperiod, slowperiod = slowperiod, fastperiod
+        super().__init__(fastperiod=fastperiod, slowperiod=slowperiod, signalperiod=signalperiod)
+        self.k_fast = 2.0 / (fastperiod + 1)
+        self.k_slow = 2.0 / (slowperiod + 1)
+        self.k_signal = 2.0 / (signalperiod + 1)
+        self.slow_total = 0.0
+        self.fast_ema = self.slow_ema = math.nan
+        self.signal_total = 0.0
+        self.signal_ema = math.nan
+        self.fast_window = _Window(fastperiod)
+
+    def _empty(self) -> Value:
+        return (math.nan, math.nan, math.nan)
+
+    def _step(self, close: float) -> Value:
+        fast, slow, signal = self.params['fastperiod'], self.params['slowperiod'], self.params['signalperiod']
+        if self.count < slow:
+            self.slow_total += close
+            self.fast_window.push(close)
+            if self.count < slow - 1:
+                return self._empty()
+            self.slow_ema = self.slow_total / slow
+            self.fast_ema = sum(self.fast_window.values) / fast
+        else:
+            self.slow_ema = (close - self.slow_ema) * self.k_slow + self.slow_ema
+            self.fast_ema = (close - self.fast_ema) * self.k_fast + self.fast_ema
+
+        macd = self.fast_ema - self.slow_ema
+        signal_index = self.count - (slow - 1)
+        if signal_index < signal:
+            self.signal_total += macd
+            if signal_index < signal - 1:
+                return self._empty()
+            self.signal_ema = self.signal_total / signal
+        else:
+            self.signal_ema = (macd - self.signal_ema) * self.k_signal + self.signal_ema
+        return (macd, self.signal_ema, macd - self.signal_ema)
+
+INDICATOR_TYPES: Dict[str, Type[StreamingIndicator]] = {
+    cls.NAME: cls for cls in (SMA, EMA, ATR, OBV, RSI, ADX, BBANDS, MACD)
+}
+
+def indicator_from_dict(data: Dict[str, Any]) -> StreamingIndicator:
+    """根据 to_dict 的结果恢复指标对象"""
+    return INDICATOR_TYPES[data['type']].from_dict(data)
+
+class IndicatorStream:
+    """按K线时间维护一组增量指标的输出序列
+
+    数据源每次返回最近一段K线（如新浪分钟线），只有新增K线和最后一根未收盘K线需要重新计算；
+    时间轴对不上（数据源重置、缺口）时用talib重新初始化
+    """
+
+    def __init__(self, specs: Dict[str, Tuple[str, Dict[str, Any]]]):
+        """
+        Args:
+            specs: 输出列名 -> (指标名, 参数)，如 {'ema5': ('EMA', {'timeperiod': 5})}
+        """
+        for name, _ in specs.values():
+            if name in ('BBANDS', 'MACD'):
+                raise ValueError(f"IndicatorStream只支持单输出指标: {name}")
+        self.specs = specs
+        self.indicators: Dict[str, StreamingIndicator] = {}
+        self.times: List[pd.Timestamp] = []
+        self.history: Dict[str, List[float]] = {}
+
+    def _reseed(self, df: pd.DataFrame, times: pd.Series) -> None:
+        self.indicators = {}
+        self.history = {}
+        for column, (name, params) in self.specs.items():
+            cls = INDICATOR_TYPES[name]
+            inputs = [df[col].to_numpy(dtype=np.float64) for col in cls.INPUTS]
+            indicator, history = cls.seed(*inputs, **params)
+            self.indicators[column] = indicator
+            self.history[column] = list(history)
+        self.times = list(times)
+
+    def sync(self, df: pd.DataFrame, time_column: str = 'date') -> Dict[str, np.ndarray]:
+        """与最新的K线数据同步，返回与df逐行对齐的指标序列"""
+        times = pd.to_datetime(df[time_column]).reset_index(drop=True)
+        if len(times) == 0:
+            return {column: np.array([], dtype=np.float64) for column in self.specs}
+
+        last = self.times[-1] if self.times else None
+        matches = np.flatnonzero(times.to_numpy() == np.datetime64(last)) if last is not None else []
+        start = int(matches[0]) if len(matches) else -1
+        # 数据源窗口的起点必须在已维护的序列之内，否则无法对齐
+        aligned = start >= 0 and len(self.times) > start and self.times[-1 - start] == times.iloc[0]
+        if not aligned:
+            self._reseed(df, times)
+        else:
+            for i in range(start, len(times)):
+                replace = i == start
+                row = df.iloc[i]
+                for column, indicator in self.indicators.items():
+                    value = indicator.update(*[row[col] for col in indicator.INPUTS], replace_last=replace)
+                    if replace:
+                        self.history[column][-1] = value
+                    else:
+                        self.history[column].append(value)
+                if not replace:
+                    self.times.append(times.iloc[i])
+
+        # 只保留与当前数据窗口等长的历史，避免无限增长
+        keep = len(times)
+        self.times = self.times[-keep:]
+        for column in self.history:
+            self.history[column] = self.history[column][-keep:]
+        return {column: np.asarray(values, dtype=np.float64) for column, values in self.history.items()}
@@ -67,7 +67,7 @@ export const getSignals = async (
 
 export const createSignal = async (signal: SignalCreate): Promise<Signal> => {
   try {
-    const response = await axios.post(`${API_BASE_URL}/signals`, signal);
+    const response = await axios.post(`${API_BASE_URL}/signals/create`, signal);
     return response.data;
   } catch (error) {
     console.error('创建信号失败:', error);